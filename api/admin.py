@@ -2,16 +2,22 @@ from ast import operator
 from django.contrib import admin
 from django.urls import path, reverse
 from django.utils.html import format_html
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.template.response import TemplateResponse
 from django.contrib.auth.models import Group, User as DjangoUser
 from django import forms
 from django.db import models
+from django.utils import timezone
 from django.http import HttpResponseForbidden
 
 from .models import (
     User, VanOperator, ChargingVan,
-    UserVehicle, Request, Booking, Payment, Feedback
+    UserVehicle, Request, Booking, Payment, Feedback,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment, Job,
 )
+from . import search, rollups, metrics, jobs, uploads
+from .profiling import ProfileStore
+from .admin_filters import RegistrationDateFilter, VehicleCountFilter, ActivityFilter
 
 
 # CUSTOM ADMIN SITE
@@ -32,6 +38,8 @@ class ChargeNowAdminSite(admin.AdminSite):
             "total_bookings": Booking.objects.count(),
             "total_payments": Payment.objects.count(),
             "total_feedbacks": Feedback.objects.count(),
+            "daily_stats": rollups.daily_series(),
+            "top_operators": rollups.top_operators(),
         })
         return super().index(request, extra_context)
 
@@ -72,14 +80,50 @@ def ajax_delete(request):
     return JsonResponse({"success": True})
 
 
+# METRICS VIEW (Prometheus text format)
+def metrics_view(request):
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("Superuser only")
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# PROFILES VIEW (collapsed stacks from api/profiling.py)
+def profiles_view(request, name=None):
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("Superuser only")
+
+    store = ProfileStore()
+    if name is not None:
+        path = store.path(name)
+        if path is None:
+            raise Http404("Profile not found")
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=name,
+                            content_type="text/plain")
+
+    context = dict(
+        admin_site.each_context(request),
+        title="Request profiles",
+        profiles=[
+            {"name": path.name, "size": path.stat().st_size}
+            for path in store.list()
+        ],
+    )
+    return TemplateResponse(request, "admin/profiles.html", context)
+
+
 # BASE ADMIN -DELETE HEADER FIX HERE 
 
 class AjaxDeleteAdmin(admin.ModelAdmin):
     actions = None   #  DEFAULT DELETE DROPDOWN REMOVE
 
     class Media:
+        # jQuery is the copy the admin already ships (django.jQuery);
+        # listing jquery.init.js keeps our script after it
         js = (
-            "https://code.jquery.com/jquery-3.6.0.min.js",
+            "admin/js/jquery.init.js",
             "admin/js/custom_delete.js",
         )
 
@@ -98,6 +142,14 @@ class AjaxDeleteAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
 
+    #  Search through the FTS index instead of LIKE over joined tables
+    def get_search_results(self, request, queryset, search_term):
+        if search_term:
+            results = search.search_queryset(queryset, search_term)
+            if results is not None:
+                return results, False
+        return super().get_search_results(request, queryset, search_term)
+
 
 
 # CHARGING VAN FORM
@@ -138,8 +190,8 @@ class UserAdmin(AjaxDeleteAdmin):
         "created_at",
         "delete_action",
     )
-    list_filter = ("user_email",)
-    search_fields = ("user_name",)
+    list_filter = (RegistrationDateFilter, VehicleCountFilter, ActivityFilter)
+    search_fields = ("user_name", "=user_email")
     readonly_fields = ("role",)
     def has_add_permission(self, request):
         return True
@@ -157,8 +209,10 @@ class VanOperatorAdmin(AjaxDeleteAdmin):
         "operator_email",
         "operator_phone",
         "operator_status",
-        "operator_license", 
+        "license_thumbnail",
         "is_verified",
+        "average_rating",
+        "completed_bookings",
         "created_at",
         "delete_action",
     )
@@ -179,10 +233,41 @@ class VanOperatorAdmin(AjaxDeleteAdmin):
                 "autocomplete": "new-password",
             })
 
+        # Same checks as registration; only runs for a newly chosen file
+        if db_field.name == "operator_license":
+            formfield.validators.append(uploads.validate_license)
+
         return formfield
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if "operator_license" in form.changed_data:
+            uploads.license_changed(obj)
+
+    # Thumbnails are made in the background (api/uploads.py), so the
+    # changelist never opens the documents themselves
+    def license_thumbnail(self, obj):
+        if not obj.operator_license:
+            return "-"
+        if obj.license_preview:
+            return format_html(
+                '<a href="{}" target="_blank"><img src="{}" loading="lazy" alt="License" '
+                'style="max-width:64px;max-height:64px"></a>',
+                obj.operator_license.url,
+                obj.license_preview.url,
+            )
+        return format_html(
+            '<a href="{}" target="_blank">{}</a>',
+            obj.operator_license.url,
+            uploads.preview_label(obj),
+        )
+    license_thumbnail.short_description = "License"
     list_editable = ("is_verified",)
     list_filter = ("is_verified", "operator_status")
-    readonly_fields = ("role","operator_status")
+    readonly_fields = (
+        "role", "operator_status", "license_thumbnail",
+        "rating_sum", "rating_count", "completed_bookings", "total_earnings",
+    )
    
     search_fields = (
         "operator_name",
@@ -215,6 +300,7 @@ class ChargingVanAdmin(AjaxDeleteAdmin):
     list_editable = ("operator",)
     exclude = ('vanoperator_latitude', 'vanoperator_longitude')
     list_filter = ("operator",)
+    list_select_related = ("operator",)
 
     search_fields = (
         "van_number",
@@ -266,6 +352,7 @@ class UserVehicleAdmin(AjaxDeleteAdmin):
     )
     search_fields = ("vehicle_number",)
     list_filter = ("vehicle_company",) 
+    list_select_related = ("user",)
    
 
 class RequestAdmin(AjaxDeleteAdmin):
@@ -287,6 +374,7 @@ class RequestAdmin(AjaxDeleteAdmin):
     )
 
     list_filter = ("request_status",)
+    list_select_related = ("user", "operator", "vehicle")
 
 
 class BookingAdmin(AjaxDeleteAdmin):
@@ -303,6 +391,7 @@ class BookingAdmin(AjaxDeleteAdmin):
     )
 
     list_filter = ("booking_status",)
+    list_select_related = ("request__user", "operator")
 
     search_fields = (
         "request__user__user_name",
@@ -335,6 +424,7 @@ class PaymentAdmin(AjaxDeleteAdmin):
         'delete_action', 
     )    
     list_filter = ("payment_method","payment_status",) 
+    list_select_related = ("user", "operator", "booking")
     def get_user(self, obj):
         return obj.user.user_name
 
@@ -356,12 +446,58 @@ class FeedbackAdmin(AjaxDeleteAdmin):
         "delete_action",
     )
     list_filter = ("operator",) 
+    list_select_related = ("user", "operator")
     search_fields = ("user__user_name","operator__operator_name",)
 
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Read-only view of archived history (written only by archive_history)."""
+    list_select_related = ("user", "operator")
+    list_filter = ("operator",)
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedRequestAdmin(ArchiveAdmin):
+    list_display = ("request_id", "user", "operator", "amount", "request_status", "created_at", "archived_at")
+
+
+class ArchivedBookingAdmin(ArchiveAdmin):
+    list_display = ("booking_id", "request_id", "user", "operator", "booking_status", "created_at", "archived_at")
+
+
+class ArchivedPaymentAdmin(ArchiveAdmin):
+    list_display = ("payment_id", "booking_id", "user", "operator", "amount", "payment_status", "created_at", "archived_at")
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "queue", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "queue", "task")
+    readonly_fields = ("locked_by", "locked_at", "last_error", "created_at", "finished_at")
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status=jobs.RUNNING).update(
+            status=jobs.QUEUED, run_at=timezone.now(), attempts=0,
+            locked_by="", locked_at=None, finished_at=None,
+        )
+        self.message_user(request, f"{count} jobs queued again")
+
 # REGISTER AJAX URL
 
 admin_site.get_urls = lambda: [
     path("api/delete/", admin_site.admin_view(ajax_delete)),
+    path("metrics/", admin_site.admin_view(metrics_view), name="metrics"),
+    path("profiles/", admin_site.admin_view(profiles_view), name="profiles"),
+    path("profiles/<str:name>/", admin_site.admin_view(profiles_view), name="profile-download"),
 ] + admin.AdminSite.get_urls(admin_site)
 
 
@@ -373,4 +509,8 @@ admin_site.register(UserVehicle, UserVehicleAdmin)
 admin_site.register(Request, RequestAdmin)
 admin_site.register(Booking, BookingAdmin)
 admin_site.register(Payment, PaymentAdmin)
-admin_site.register(Feedback, FeedbackAdmin)
\ No newline at end of file
+admin_site.register(Feedback, FeedbackAdmin)
+admin_site.register(ArchivedRequest, ArchivedRequestAdmin)
+admin_site.register(ArchivedBooking, ArchivedBookingAdmin)
+admin_site.register(ArchivedPayment, ArchivedPaymentAdmin)
+admin_site.register(Job, JobAdmin)
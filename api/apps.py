@@ -5,3 +5,11 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'ChargeNow API'
+
+    def ready(self):
+        from django.conf import settings
+        from . import signals, tasks  # noqa: F401
+
+        if getattr(settings, 'PERF_METRICS_SAMPLE_RATE', 0) > 0:
+            from .metrics import instrument_serializers
+            instrument_serializers()
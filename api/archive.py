@@ -0,0 +1,195 @@
+"""
+Archival of finished history into cold tables.
+
+Requests (rejected or completed), bookings (completed or cancelled) and
+payments (completed) older than the cutoff are copied into
+``ArchivedRequest``, ``ArchivedBooking`` and ``ArchivedPayment`` and deleted
+from the hot tables in the same transaction, one batch at a time.
+
+Children go first, and a parent only moves once it has no hot children
+left: payments, then bookings without hot payments, then requests without
+hot bookings. The foreign keys on the hot tables therefore never dangle.
+The hot rows are removed with a raw delete, so no delete signals fire:
+operator stats and rollups still count archived history. Search documents
+are dropped explicitly.
+
+``history_page()`` serves the history endpoints. It reads the hot table
+first and only queries the archive when a page reaches past the hot rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import search
+from .models import (
+    Request, Booking, Payment,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment,
+)
+
+
+REQUEST_TERMINAL = (2, 3)
+BOOKING_TERMINAL = (2, 3)
+PAYMENT_COMPLETED = 1
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180))
+
+
+def eligible_payments(cutoff):
+    return Payment.objects.filter(payment_status=PAYMENT_COMPLETED, created_at__lt=cutoff)
+
+
+def eligible_bookings(cutoff):
+    return Booking.objects.filter(
+        booking_status__in=BOOKING_TERMINAL, created_at__lt=cutoff,
+    ).exclude(Exists(Payment.objects.filter(booking=OuterRef('pk'))))
+
+
+def eligible_requests(cutoff):
+    return Request.objects.filter(
+        request_status__in=REQUEST_TERMINAL, created_at__lt=cutoff,
+    ).exclude(Exists(Booking.objects.filter(request=OuterRef('pk'))))
+
+
+# (eligible hot rows, archive model, {archive field: hot field path})
+PLANS = [
+    (eligible_payments, ArchivedPayment, {
+        'payment_id': 'payment_id', 'booking_id': 'booking_id', 'user_id': 'user_id',
+        'operator_id': 'operator_id', 'amount': 'amount', 'payment_method': 'payment_method',
+        'payment_status': 'payment_status', 'created_at': 'created_at',
+    }),
+    (eligible_bookings, ArchivedBooking, {
+        'booking_id': 'booking_id', 'request_id': 'request_id',
+        'user_id': 'request__user_id', 'vehicle_id': 'request__vehicle_id',
+        'requested_at': 'request__created_at', 'operator_id': 'operator_id',
+        'booking_status': 'booking_status', 'created_at': 'created_at',
+        'completed_at': 'completed_at',
+    }),
+    (eligible_requests, ArchivedRequest, {
+        'request_id': 'request_id', 'user_id': 'user_id', 'operator_id': 'operator_id',
+        'vehicle_id': 'vehicle_id', 'user_latitude': 'user_latitude',
+        'user_longitude': 'user_longitude', 'amount': 'amount',
+        'request_status': 'request_status', 'created_at': 'created_at',
+    }),
+]
+
+
+def archive_batch(queryset, archive_model, columns, batch_size):
+    """Move one batch; returns the number of rows moved."""
+    hot_model = queryset.model
+    document = search.get_document(hot_model)
+    with transaction.atomic():
+        sources = list(queryset.order_by('pk').values(*columns.values())[:batch_size])
+        rows = [{field: source[path] for field, path in columns.items()} for source in sources]
+        if not rows:
+            return 0
+        archive_model.objects.bulk_create(
+            [archive_model(**row) for row in rows], ignore_conflicts=True,
+        )
+        pks = [row[hot_model._meta.pk.name] for row in rows]
+        hot = hot_model._base_manager.filter(pk__in=pks)
+        hot._raw_delete(hot.db)
+        if document is not None:
+            backend = search.get_backend()
+            for pk in pks:
+                backend.delete(document, pk)
+    return len(rows)
+
+
+def archive(cutoff=None, batch_size=1000):
+    """Archive everything eligible before ``cutoff``; returns ``{label: rows moved}``."""
+    cutoff = cutoff or default_cutoff()
+    moved = {}
+    for factory, archive_model, columns in PLANS:
+        total = 0
+        while True:
+            count = archive_batch(factory(cutoff), archive_model, columns, batch_size)
+            total += count
+            if count < batch_size:
+                break
+        moved[archive_model._meta.label] = total
+    return moved
+
+
+def pending(cutoff=None):
+    """Rows each plan would move right now, for ``--dry-run``."""
+    cutoff = cutoff or default_cutoff()
+    return {
+        archive_model._meta.label: factory(cutoff).count()
+        for factory, archive_model, columns in PLANS
+    }
+
+
+# ========== HISTORY READS ==========
+
+HISTORY_ORDERING = ('-created_at', '-pk')
+
+
+def history_page(request, hot, archived, serializer_class, archived_serializer_class):
+    """
+    Build the ``{'success', 'data', ...}`` body for a history endpoint.
+
+    Without ``?limit=`` the response is every hot row, as before archival.
+    With ``?limit=&offset=`` it pages newest-first through the hot rows,
+    then continues into the archive; ``next_offset`` is None on the last page.
+    """
+    limit, offset = _page_params(request.query_params)
+    if limit is None:
+        return {'success': True, 'data': serializer_class(hot, many=True).data}
+
+    hot_rows = list(hot.order_by(*HISTORY_ORDERING)[offset:offset + limit + 1])
+    data = serializer_class(hot_rows[:limit], many=True).data
+    if len(hot_rows) > limit:
+        return {'success': True, 'data': data, 'next_offset': offset + limit}
+
+    # The page runs past the hot rows, so continue into the archive
+    hot_count = offset + len(hot_rows) if hot_rows else hot.count()
+    remaining = limit - len(hot_rows)
+    archive_offset = max(offset - hot_count, 0)
+    archived_rows = list(archived.order_by(*HISTORY_ORDERING)[archive_offset:archive_offset + remaining + 1])
+    data = list(data) + list(archived_serializer_class(archived_rows[:remaining], many=True).data)
+    has_more = len(archived_rows) > remaining
+    return {'success': True, 'data': data, 'next_offset': offset + limit if has_more else None}
+
+
+async def ahistory_page(request, hot, archived, serializer_class, archived_serializer_class):
+    """``history_page()`` on the async ORM, for a plain Django ``request``."""
+    limit, offset = _page_params(request.GET)
+    if limit is None:
+        rows = [row async for row in hot]
+        return {'success': True, 'data': serializer_class(rows, many=True).data}
+
+    hot_rows = [row async for row in hot.order_by(*HISTORY_ORDERING)[offset:offset + limit + 1]]
+    data = serializer_class(hot_rows[:limit], many=True).data
+    if len(hot_rows) > limit:
+        return {'success': True, 'data': data, 'next_offset': offset + limit}
+
+    hot_count = offset + len(hot_rows) if hot_rows else await hot.acount()
+    remaining = limit - len(hot_rows)
+    archive_offset = max(offset - hot_count, 0)
+    archived_rows = [
+        row async for row in archived.order_by(*HISTORY_ORDERING)[archive_offset:archive_offset + remaining + 1]
+    ]
+    data = list(data) + list(archived_serializer_class(archived_rows[:remaining], many=True).data)
+    has_more = len(archived_rows) > remaining
+    return {'success': True, 'data': data, 'next_offset': offset + limit if has_more else None}
+
+
+def _page_params(params):
+    """``(limit, offset)`` from the query string; limit is None when not paging."""
+    limit = _int_param(params, 'limit')
+    if limit is None:
+        return None, 0
+    limit = max(1, min(limit, getattr(settings, 'HISTORY_PAGE_MAX', 200)))
+    return limit, max(_int_param(params, 'offset') or 0, 0)
+
+
+def _int_param(params, name):
+    try:
+        return int(params[name])
+    except (KeyError, ValueError):
+        return None
@@ -17,38 +17,76 @@ class JWTAuthentication(BaseAuthentication):
         if not auth_header:
             return None
         
+        # Extract token from "Bearer <token>"
+        parts = auth_header.split()
+        if parts[0].lower() != 'bearer' or len(parts) != 2:
+            return None
+
+        return self.authenticate_token(parts[1])
+
+    def authenticate_token(self, token):
         try:
-            # Extract token from "Bearer <token>"
-            parts = auth_header.split()
-            if parts[0].lower() != 'bearer' or len(parts) != 2:
-                return None
-            
-            token = parts[1]
-            payload = jwt.decode(
-                token,
-                settings.JWT_SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM]
-            )
-            
-            # Return user info and token payload
-            user_data = {
-                'id': payload.get('id'),
-                'email': payload.get('email'),
-                'role': payload.get('role'),
-                'name': payload.get('name')
-            }
-            
-            return (user_data, token)
-            
+            payload = decode_token(token)
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token has expired')
         except jwt.InvalidTokenError:
             raise AuthenticationFailed('Invalid token')
-    
+
+        # Return user info and token payload
+        user_data = {
+            'id': payload.get('id'),
+            'email': payload.get('email'),
+            'role': payload.get('role'),
+            'name': payload.get('name')
+        }
+        return (user_data, token)
+
     def authenticate_header(self, request):
         return 'Bearer'
 
 
+class QueryTokenAuthentication(JWTAuthentication):
+    """JWT from ``?token=``, for clients that cannot set headers (EventSource)"""
+
+    def authenticate(self, request):
+        token = request.GET.get('token')
+        if not token:
+            return None
+        return self.authenticate_token(token)
+
+
+def decode_token(token):
+    return jwt.decode(
+        token,
+        settings.JWT_SECRET_KEY,
+        algorithms=[settings.JWT_ALGORITHM]
+    )
+
+
+def request_identity(request):
+    """
+    Stable key for whoever sent ``request`` ("user:5", "operator:3",
+    "admin:1"), or None if anonymous. Usable before DRF authentication runs.
+    """
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        try:
+            payload = decode_token(parts[1])
+        except jwt.InvalidTokenError:
+            return None
+        return identity_for(payload)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'admin:{user.pk}'
+    return None
+
+
+def identity_for(user):
+    """Identity of a token payload or authenticated ``request.user``, e.g. "user:5"."""
+    role = 'operator' if user.get('role') == 2 else 'user'
+    return f"{role}:{user.get('id')}"
+
+
 def generate_token(user_id, email, role, name):
     """Generate JWT token for authenticated user"""
     payload = {
@@ -0,0 +1,180 @@
+"""
+Process-wide connection pool for Django database backends.
+
+Django opens a fresh DB-API connection whenever a thread needs one and
+closes it at the end of each request (``CONN_MAX_AGE = 0``). Mixing
+``PooledConnectionMixin`` into a backend's ``DatabaseWrapper`` turns that
+open into a checkout from a shared pool, and the close into a return.
+Configure it in ``OPTIONS``::
+
+    "pool": {"size": 10, "max_lifetime": 600, "health_checks": True, "timeout": 30}
+
+Connections are checked (``SELECT 1``) on checkout when ``health_checks`` is
+on, retired after ``max_lifetime`` seconds, and rolled back if returned
+mid-transaction. Time spent waiting for a free connection is added to the
+current request's metrics.
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from .. import metrics
+
+
+class PoolTimeout(OperationalError):
+    """No connection became free within the pool's ``timeout``."""
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, size=10, max_lifetime=600, health_checks=True, timeout=30):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self.timeout = timeout
+        self.opened = 0  # connections alive, idle or checked out
+        self._idle = []  # [(connection, created_at)], most recently returned last
+        self._created = {}  # id(connection) -> created_at
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Return ``(connection, seconds waited)``."""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        while True:
+            with self._condition:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                elif self.opened < self.size:
+                    self.opened += 1
+                    conn = None
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f'No database connection free after {self.timeout}s (pool size {self.size})'
+                        )
+                    self._condition.wait(remaining)
+                    continue
+
+            # Health checks and connects happen outside the lock
+            if conn is not None:
+                if self.usable(conn, created_at):
+                    return conn, time.perf_counter() - start
+                with self._condition:
+                    self._discard(conn)
+                continue
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._condition:
+                    self.opened -= 1
+                    self._condition.notify()
+                raise
+            self._created[id(conn)] = time.monotonic()
+            return conn, time.perf_counter() - start
+
+    def release(self, conn, reuse=True):
+        created_at = self._created.get(id(conn), 0)
+        try:
+            if reuse and getattr(conn, 'in_transaction', False):
+                conn.rollback()
+        except Exception:
+            reuse = False
+        with self._condition:
+            if reuse and time.monotonic() - created_at < self.max_lifetime:
+                self._idle.append((conn, created_at))
+            else:
+                self._discard(conn)
+            self._condition.notify()
+
+    def usable(self, conn, created_at):
+        if time.monotonic() - created_at >= self.max_lifetime:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        # Caller holds the lock
+        self._created.pop(id(conn), None)
+        self.opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked worker must not share the parent's sockets or file handles
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class PooledConnectionMixin:
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pool', None)
+        return kwargs
+
+    def pool_options(self):
+        """The ``OPTIONS["pool"]`` dict, or None when pooling is off."""
+        return self.settings_dict['OPTIONS'].get('pool')
+
+    @property
+    def pool(self):
+        options = self.pool_options()
+        if not options:
+            return None
+        key = (self.alias, str(self.settings_dict['NAME']))
+        pool = _pools.get(key)
+        if pool is None:
+            conn_params = self.get_connection_params()
+            with _pools_lock:
+                pool = _pools.setdefault(key, ConnectionPool(
+                    lambda: self.connect_raw(conn_params), **options
+                ))
+        return pool
+
+    def connect_raw(self, conn_params):
+        """Open a real connection; backends add per-connection setup here."""
+        return super().get_new_connection(conn_params)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return self.connect_raw(conn_params)
+        conn, waited = pool.acquire()
+        stats = metrics.current_stats.get()
+        if stats is not None:
+            stats.pool_wait_seconds += waited
+        return conn
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Closed inside atomic(), Django keeps the wrapper pointing at this
+        # connection, so it can't be handed to another thread
+        pool.release(self.connection, reuse=not self.in_atomic_block)
@@ -0,0 +1,68 @@
+"""
+SQLite backend tuned for a small production deployment.
+
+Same as ``django.db.backends.sqlite3`` plus two extra ``OPTIONS`` keys:
+
+- ``pragmas``: ``{name: value}`` applied to every new connection, e.g.
+  ``journal_mode=WAL`` so readers never block the writer, and
+  ``busy_timeout`` so a writer waits for the lock instead of failing with
+  "database is locked".
+- ``transaction_mode``: ``"IMMEDIATE"`` takes the write lock when
+  ``atomic()`` begins. A deferred transaction that reads first and writes
+  later can't be retried by busy_timeout and fails straight away, so
+  IMMEDIATE avoids those lock errors.
+
+It also accepts the ``pool`` option from ``api.backends.pool``. Pooling is
+skipped for in-memory (test) databases.
+"""
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledConnectionMixin
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -16000,  # negative means KiB, so ~16 MB per connection
+    'temp_store': 'MEMORY',
+}
+
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Not arguments to sqlite3.connect(); handled below
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    @property
+    def pragmas(self):
+        return {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ValueError(f'transaction_mode must be one of {sorted(TRANSACTION_MODES)}')
+        return mode
+
+    def pool_options(self):
+        if self.is_in_memory_db():
+            return None
+        return super().pool_options()
+
+    def connect_raw(self, conn_params):
+        conn = super().connect_raw(conn_params)
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,164 @@
+"""
+In-memory channel layer.
+
+A stand-in for a Django Channels layer (same calls: ``new_channel``,
+``send``, ``receive``, ``group_add``, ``group_discard``, ``group_send``)
+that lives in one process. The WebSocket handlers in api/websocket.py
+receive on it and the rest of the app sends to it. To run several ASGI
+processes, swap it for a shared layer with the same interface
+(e.g. channels_redis).
+
+Each channel belongs to the event loop that created it. Sends may come from
+any thread, e.g. a request thread's ``transaction.on_commit()``, and are
+handed to that loop with ``call_soon_threadsafe``. As with Channels, a
+send to a full channel raises ``ChannelFull`` for direct sends and is
+dropped for group sends. A channel that dropped group messages then
+receives one ``{"type": "channel.overflow"}`` message, so its reader knows
+to reload whatever state the lost messages carried.
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+
+
+# Queued in place of group messages dropped because the channel was full
+OVERFLOW = 'channel.overflow'
+
+
+class ChannelFull(Exception):
+    pass
+
+
+class _Channel:
+
+    def __init__(self, capacity):
+        self.loop = asyncio.get_running_loop()
+        self.capacity = capacity
+        # One slot past capacity is kept for the overflow message
+        self.queue = asyncio.Queue(capacity + 1)
+        self.dropped = 0
+        self.overflowed = False  # an overflow message is queued; only touched on the loop
+
+    def full(self):
+        return self.queue.qsize() >= self.capacity
+
+    def put(self, message, signal_overflow=False):
+        """
+        Queue ``message`` from any thread; returns False if it was full. With
+        ``signal_overflow`` the receiver is told about the dropped message.
+        """
+        if self.full():
+            if signal_overflow:
+                self._call_soon(self._overflow)
+            return False
+        return self._call_soon(self._put, message)
+
+    def _call_soon(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            return False  # the loop has closed
+        return True
+
+    def _put(self, message):
+        if self.full():
+            self._overflow()  # filled up since put() looked
+        else:
+            self.queue.put_nowait(message)
+
+    def _overflow(self):
+        self.dropped += 1
+        if not self.overflowed:
+            self.overflowed = True
+            self.queue.put_nowait({'type': OVERFLOW})
+
+    def _received(self, message):
+        if message['type'] == OVERFLOW:
+            self.overflowed = False
+        return message
+
+    async def get(self):
+        return self._received(await self.queue.get())
+
+    def get_nowait(self):
+        return self._received(self.queue.get_nowait())
+
+
+class InMemoryChannelLayer:
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or getattr(settings, 'CHANNEL_CAPACITY', 100)
+        self._channels = {}
+        self._groups = {}  # group -> set of channel names
+        self._lock = threading.Lock()
+        self._names = itertools.count(1)
+
+    async def new_channel(self, prefix='specific'):
+        name = f'{prefix}.inmemory!{next(self._names)}'
+        with self._lock:
+            self._channels[name] = _Channel(self.capacity)
+        return name
+
+    async def send(self, channel, message):
+        if not self.send_nowait(channel, message):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        with self._lock:
+            target = self._channels[channel]
+        return await target.get()
+
+    def receive_nowait(self, channel):
+        """The next queued message, or None. Only on the channel's own loop."""
+        with self._lock:
+            target = self._channels[channel]
+        try:
+            return target.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    async def group_add(self, group, channel):
+        with self._lock:
+            self._groups.setdefault(group, set()).add(channel)
+
+    async def group_discard(self, group, channel):
+        with self._lock:
+            members = self._groups.get(group, set())
+            members.discard(channel)
+            if not members:
+                self._groups.pop(group, None)
+
+    async def group_send(self, group, message):
+        self.group_send_nowait(group, message)
+
+    async def flush(self):
+        with self._lock:
+            self._channels.clear()
+            self._groups.clear()
+
+    def close_channel(self, channel):
+        """Forget ``channel`` and take it out of every group."""
+        with self._lock:
+            self._channels.pop(channel, None)
+            for group in [g for g, members in self._groups.items() if channel in members]:
+                self._groups[group].discard(channel)
+                if not self._groups[group]:
+                    del self._groups[group]
+
+    # Sync versions of the sends, usable from any thread
+
+    def send_nowait(self, channel, message):
+        with self._lock:
+            target = self._channels.get(channel)
+        return target is not None and target.put(message)
+
+    def group_send_nowait(self, group, message):
+        """Send ``message`` to every member of ``group``; returns how many took it."""
+        with self._lock:
+            targets = [self._channels[name] for name in self._groups.get(group, ()) if name in self._channels]
+        return sum(target.put(message, signal_overflow=True) for target in targets)
+
+
+channel_layer = InMemoryChannelLayer()
@@ -0,0 +1,101 @@
+"""
+Idempotency keys for unsafe API calls.
+
+A client that may retry a write (flaky network, double tap) sends the same
+``Idempotency-Key`` header with every attempt. For views marked
+``idempotent = True``, ``IdempotencyMiddleware`` records the first
+response for each (client, key) pair and replays it for later attempts
+instead of running the view again:
+
+- same key, same method, path and body: the stored response is replayed,
+  with ``Idempotent-Replayed: true``
+- same key while the first attempt is still running: 409
+- same key with a different method, path or body: 422
+
+Responses with a 5xx status are not stored, so the client can retry them.
+Keys expire after ``IDEMPOTENCY_KEY_TTL_HOURS``. Run
+``manage.py prune_idempotency_keys`` to delete the expired ones.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _error(message, status):
+    return JsonResponse({'success': False, 'message': message}, status=status)
+
+
+def begin(identity, key, request):
+    """
+    Claim ``key`` for this request.
+
+    Returns the new ``IdempotencyKey`` when the view should run, or the
+    ``HttpResponse`` to send instead.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters', 400)
+    digest = fingerprint(request)
+
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(identity=identity, key=key, fingerprint=digest)
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(identity=identity, key=key).first()
+        if record is None:
+            continue  # released by a failed attempt in the meantime
+        if record.created_at < expiry_cutoff():
+            record.delete()
+            continue
+        if record.fingerprint != digest:
+            return _error(f'{HEADER} was already used for a different request', 422)
+        if record.status_code is None:
+            return _error(f'A request with this {HEADER} is still in progress', 409)
+        return replay(record)
+    return _error(f'A request with this {HEADER} is still in progress', 409)
+
+
+def finish(record, response):
+    """Store ``response`` for replay, or release the key if it shouldn't be kept."""
+    if response.status_code >= 500 or response.streaming:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return
+    record.status_code = response.status_code
+    record.content_type = response.get('Content-Type', '')
+    record.content = response.content.decode(response.charset or 'utf-8')
+    record.save(update_fields=['status_code', 'content_type', 'content'])
+
+
+def replay(record):
+    response = HttpResponse(record.content, status=record.status_code, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def prune(cutoff=None):
+    """Delete keys older than ``cutoff``; returns how many."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff or expiry_cutoff()).delete()
+    return deleted
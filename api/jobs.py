@@ -0,0 +1,315 @@
+"""
+Background jobs, with the database as the broker.
+
+Register a function as a task and enqueue calls to it::
+
+    @jobs.task(queue='media', max_attempts=5)
+    def make_thumbnail(operator_id):
+        ...
+
+    make_thumbnail.delay(operator.pk)                   # as soon as a worker is free
+    make_thumbnail.enqueue([operator.pk], delay=60)     # not before a minute from now
+
+Each call is one ``Job`` row. It is written in the caller's transaction, so
+a rolled-back request never leaves a job behind, and a worker never picks
+up a job before the rows it refers to are committed. ``manage.py
+run_worker`` claims due jobs with a compare-and-swap UPDATE and runs them
+on a thread pool, optionally in several processes.
+
+- Retries: a job that raises is queued again after an exponential backoff
+  (``JOB_RETRY_BACKOFF_SECONDS`` doubled per attempt, capped at
+  ``JOB_RETRY_BACKOFF_MAX_SECONDS``) until ``max_attempts``, then marked failed.
+- Concurrency: ``JOB_QUEUES`` caps how many jobs of each queue run at
+  once across all workers. The count is checked in the claim transaction,
+  so on SQLite (BEGIN IMMEDIATE) it is exact. On other databases it is
+  best-effort.
+- Leases: while a job runs, its worker renews the lease (``locked_at``)
+  every ``JOB_LEASE_SECONDS`` / 3, however long the job takes. A job whose
+  lease hasn't been renewed for ``JOB_LEASE_SECONDS`` lost its worker
+  (killed, or its host went away) and is queued again, or failed if it is
+  out of attempts.
+- Scheduling: ``JOB_SCHEDULE`` enqueues tasks every N seconds. Each period
+  has a ``dedupe_key``, so it is enqueued once however many workers run.
+
+Jobs must be idempotent: a worker that dies mid-job means the job runs again.
+With ``JOB_ALWAYS_EAGER`` (the default under ``manage.py test``) jobs run
+inline when the transaction commits, and no row is written.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('api.jobs')
+
+QUEUED, RUNNING, DONE, FAILED = 0, 1, 2, 3
+
+_registry = {}
+
+
+class Task:
+
+    def __init__(self, func, name, queue, max_attempts):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, *, delay=0, run_at=None, queue=None, dedupe_key=None):
+        """Queue one call; returns the ``Job`` (None when running eagerly)."""
+        kwargs = kwargs or {}
+        if getattr(settings, 'JOB_ALWAYS_EAGER', False):
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+            return None
+        return Job.objects.create(
+            queue=queue or self.queue,
+            task=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            run_at=run_at or timezone.now() + timedelta(seconds=delay),
+            max_attempts=self.max_attempts,
+            dedupe_key=dedupe_key,
+        )
+
+
+def task(name=None, queue='default', max_attempts=3):
+    """Register the decorated function as a task called ``name`` (default: module.function)."""
+    def register(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__qualname__}', queue, max_attempts)
+        _registry[registered.name] = registered
+        return registered
+    return register
+
+
+def get_task(name):
+    return _registry[name]
+
+
+# ========== CLAIMING AND RUNNING ==========
+
+def queue_limit(queue):
+    """Most jobs of ``queue`` that may run at once (0 means no limit)."""
+    return getattr(settings, 'JOB_QUEUES', {}).get(queue, 0)
+
+
+def claim(queue, worker_id):
+    """Mark the next due job on ``queue`` as running by ``worker_id`` and return it, or None."""
+    now = timezone.now()
+    with transaction.atomic():
+        limit = queue_limit(queue)
+        if limit and Job.objects.filter(queue=queue, status=RUNNING).count() >= limit:
+            return None
+        candidates = Job.objects.filter(queue=queue, status=QUEUED, run_at__lte=now).order_by('run_at', 'pk')
+        for job in candidates[:5]:
+            # Another worker may have taken it since the select
+            if Job.objects.filter(pk=job.pk, status=QUEUED).update(
+                status=RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+            ):
+                job.status, job.locked_by, job.locked_at = RUNNING, worker_id, now
+                job.attempts += 1
+                return job
+    return None
+
+
+def run(job):
+    """Run a claimed job and record the outcome."""
+    try:
+        get_task(job.task).func(*job.args, **job.kwargs)
+    except Exception:
+        logger.warning('job failed', extra={'job': job.pk, 'task': job.task, 'attempt': job.attempts},
+                       exc_info=True)
+        retry_or_fail(job, traceback.format_exc())
+        return False
+    # Only if we still hold it: after a lease expiry the job belongs to someone else
+    Job.objects.filter(pk=job.pk, status=RUNNING, locked_by=job.locked_by).update(
+        status=DONE, finished_at=timezone.now(), last_error='',
+    )
+    return True
+
+
+def backoff(attempt):
+    base = getattr(settings, 'JOB_RETRY_BACKOFF_SECONDS', 10)
+    cap = getattr(settings, 'JOB_RETRY_BACKOFF_MAX_SECONDS', 3600)
+    # Jitter so jobs that failed together don't all retry together
+    return min(base * 2 ** (attempt - 1), cap) * random.uniform(0.8, 1.2)
+
+
+def retry_or_fail(job, error):
+    now = timezone.now()
+    mine = Job.objects.filter(pk=job.pk, status=RUNNING, locked_by=job.locked_by)
+    if job.attempts < job.max_attempts:
+        mine.update(
+            status=QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)),
+            locked_by='', locked_at=None, last_error=error,
+        )
+    else:
+        mine.update(status=FAILED, finished_at=now, last_error=error)
+
+
+# ========== HOUSEKEEPING ==========
+
+def lease_seconds():
+    return getattr(settings, 'JOB_LEASE_SECONDS', 600)
+
+
+def recover_expired(now=None):
+    """Requeue (or fail) jobs whose worker stopped renewing their lease; returns how many."""
+    now = now or timezone.now()
+    expired = Job.objects.filter(status=RUNNING, locked_at__lt=now - timedelta(seconds=lease_seconds()))
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED, finished_at=now, last_error='Worker lost while running the job',
+    )
+    requeued = expired.update(status=QUEUED, run_at=now, locked_by='', locked_at=None)
+    return failed + requeued
+
+
+def enqueue_scheduled(now=None):
+    """Enqueue each ``JOB_SCHEDULE`` entry once per period; returns how many were new."""
+    now = now or timezone.now()
+    created = 0
+    for name, entry in getattr(settings, 'JOB_SCHEDULE', {}).items():
+        every = entry['every']
+        period = int(now.timestamp() // every)
+        registered = get_task(entry['task'])
+        try:
+            with transaction.atomic():
+                registered.enqueue(
+                    entry.get('args', ()), entry.get('kwargs'),
+                    run_at=now, dedupe_key=f'schedule:{name}:{period}',
+                )
+            created += 1
+        except IntegrityError:
+            pass  # another worker got this period first
+    return created
+
+
+def prune(now=None):
+    """Delete finished jobs older than ``JOB_RETENTION_DAYS``; returns how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status__in=(DONE, FAILED), finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def housekeeping():
+    now = timezone.now()
+    recover_expired(now)
+    enqueue_scheduled(now)
+    prune(now)
+
+
+# ========== WORKER ==========
+
+class Worker:
+    """
+    Run jobs from ``queues`` on ``threads`` threads until ``stop`` is set,
+    or, with ``burst``, until no due job is left.
+    """
+
+    def __init__(self, queues, threads=4, poll_interval=1.0, burst=False):
+        self.queues = list(queues)
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stop = threading.Event()
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = self.failed = 0
+        self.running = set()  # pks of the jobs this worker's threads are running
+        self._lock = threading.Lock()
+
+    def run(self):
+        pool = [
+            threading.Thread(target=self.loop, args=(f'{self.name}:{index}', index), daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in pool:
+            thread.start()
+        # Separate from self.stop: leases are renewed until the last job has finished
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(finished,), daemon=True)
+        heartbeat.start()
+        interval = getattr(settings, 'JOB_HOUSEKEEPING_SECONDS', 30)
+        try:
+            while any(thread.is_alive() for thread in pool):
+                if not self.burst:
+                    housekeeping()
+                    connection.close()
+                self.stop.wait(interval if not self.burst else 0.1)
+                if self.stop.is_set():
+                    break
+        finally:
+            self.stop.set()
+            for thread in pool:
+                thread.join()
+            finished.set()
+            heartbeat.join()
+
+    def heartbeat(self, finished):
+        while not finished.wait(lease_seconds() / 3):
+            try:
+                self.renew()
+            finally:
+                connection.close()
+
+    def renew(self):
+        """Extend the lease of every job this worker is running."""
+        with self._lock:
+            running = list(self.running)
+        if running:
+            Job.objects.filter(
+                pk__in=running, status=RUNNING, locked_by__startswith=f'{self.name}:',
+            ).update(locked_at=timezone.now())
+
+    def loop(self, worker_id, offset):
+        try:
+            while not self.stop.is_set():
+                job = self.next_job(worker_id, offset)
+                if job is None:
+                    if self.burst and not self.pending():
+                        return
+                    # Don't hold a pooled connection while idle
+                    connection.close()
+                    self.stop.wait(self.poll_interval)
+                    continue
+                with self._lock:
+                    self.running.add(job.pk)
+                try:
+                    ok = run(job)
+                finally:
+                    with self._lock:
+                        self.running.discard(job.pk)
+                with self._lock:
+                    self.processed += 1
+                    self.failed += not ok
+        finally:
+            connection.close()
+
+    def next_job(self, worker_id, offset):
+        # Threads start at different queues so one busy queue can't starve the rest
+        for index in range(len(self.queues)):
+            queue = self.queues[(offset + index) % len(self.queues)]
+            job = claim(queue, worker_id)
+            if job is not None:
+                return job
+        return None
+
+    def pending(self):
+        return Job.objects.filter(
+            queue__in=self.queues, status__in=(QUEUED, RUNNING), run_at__lte=timezone.now(),
+        ).exists()
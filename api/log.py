@@ -0,0 +1,134 @@
+"""
+Structured logging helpers for ChargeNow.
+
+Wired up through ``settings.LOGGING``:
+
+- ``StructuredFormatter`` renders one JSON object per line, including any
+  ``extra={...}`` fields passed to the log call.
+- ``SamplingFilter`` keeps a fraction of records below WARNING, so hot paths
+  such as GPS pings can log at 1%.
+- ``RateLimitFilter`` caps records per second per logger with a token bucket.
+- ``BackgroundQueueHandler`` only puts the record on a bounded queue; a
+  listener thread formats and writes it. The request thread never blocks on
+  I/O, and records are dropped rather than waiting when the queue is full.
+  A forked child (``run_worker --processes``) gets a fresh queue and
+  listener, since threads don't survive a fork.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.utils.module_loading import import_string
+
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as single-line JSON."""
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through ``rate`` (0..1) of records below WARNING."""
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Allow at most ``per_second`` records per logger (bursts up to ``burst``)."""
+
+    def __init__(self, per_second=100, burst=None, name=''):
+        super().__init__(name)
+        self.per_second = float(per_second)
+        self.burst = float(burst or per_second)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.per_second)
+            allowed = tokens >= 1
+            self._buckets[record.name] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hand records to a listener thread that writes them with ``target``
+    (a handler class path, ``logging.StreamHandler`` by default).
+    """
+
+    def __init__(self, target='logging.StreamHandler', maxsize=10000, **target_kwargs):
+        super().__init__(queue.Queue(maxsize))
+        self.target = import_string(target)(**target_kwargs)
+        self.dropped = 0
+        self.start()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def start(self):
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_after_fork(self):
+        # Only the forking thread survives, so the parent's listener is gone
+        # and anything queued in the child would never be written
+        if self.listener._thread is not None:
+            self.queue = queue.Queue(self.queue.maxsize)
+            self.start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Records stay in-process, so skip the eager format/pickle-proofing
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,39 @@
+"""
+Move finished requests, bookings and payments into the archive tables.
+
+Usage: python manage.py archive_history [--days 180] [--batch-size 1000] [--dry-run]
+
+Safe to run repeatedly (e.g. nightly from cron); each batch is its own
+transaction. See api/archive.py for what qualifies.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = "Archive rejected/completed requests, completed/cancelled bookings and completed payments past the cutoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Archive rows created more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would move")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            for label, count in archive.pending(cutoff).items():
+                self.stdout.write(f"{label}: {count} eligible")
+            self.stdout.write("Requests and bookings with hot children become eligible as the children move.")
+            return
+
+        moved = archive.archive(cutoff, batch_size=options['batch_size'])
+        for label, count in moved.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {sum(moved.values())} rows older than {cutoff:%Y-%m-%d}"))
@@ -0,0 +1,36 @@
+"""
+Delete operator documents and previews that no row uses.
+
+Usage: python manage.py collect_documents [--rehash] [--dry-run]
+
+Deletes normally clean up after themselves; this catches files left
+behind inside the grace period or by a crash. ``--rehash`` first moves
+documents uploaded before content-addressed storage into it, so
+duplicates collapse to one file. See api/storage.py.
+"""
+from django.core.management.base import BaseCommand
+
+from api import storage
+
+
+class Command(BaseCommand):
+    help = "Delete unused operator documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rehash', action='store_true',
+                            help="Move old documents into the content-addressed layout first")
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would change")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['rehash']:
+            moved = storage.rehash(dry_run=dry_run)
+            for old, new in moved.items():
+                self.stdout.write(f"{old} -> {new}")
+            self.stdout.write(f"{'Would move' if dry_run else 'Moved'} {len(moved)} documents")
+
+        deleted = storage.sweep(dry_run=dry_run)
+        for name in deleted:
+            self.stdout.write(f"delete {name}")
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(deleted)} unused files"))
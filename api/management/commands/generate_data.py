@@ -0,0 +1,240 @@
+"""
+Generate realistic volumes of synthetic ChargeNow data with bulk inserts.
+
+Usage: python manage.py generate_data [--scale 1] [--seed 42] [--days 90]
+
+--scale 1 creates roughly 1,000 users, 100 operators/vans, 1,500 vehicles,
+5,000 requests and the bookings, payments and feedback that follow from
+them. Derived data (search index, rollups, operator stats) is rebuilt at the
+end because bulk_create skips signals.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import search, rollups, operator_stats, sequences
+from api.models import (
+    User, VanOperator, ChargingVan, UserVehicle,
+    Request, Booking, Payment, Feedback
+)
+
+
+COMPANIES = {
+    'Tata': ['Nexon EV', 'Tiago EV', 'Punch EV'],
+    'MG': ['ZS EV', 'Comet EV'],
+    'Hyundai': ['Kona', 'Ioniq 5'],
+    'Mahindra': ['XUV400', 'e2o'],
+    'BYD': ['Atto 3', 'Seal'],
+}
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Diya', 'Ananya', 'Ishaan', 'Kavya', 'Rohan', 'Saanvi', 'Arjun']
+LAST_NAMES = ['Patel', 'Shah', 'Mehta', 'Desai', 'Joshi', 'Trivedi', 'Rao', 'Iyer', 'Kapoor', 'Singh']
+COMMENTS = ['Quick and friendly', 'Arrived late', 'Great service', 'Charging was slow', 'Very professional']
+
+# Around Ahmedabad
+BASE_LAT, BASE_LNG = 23.0225, 72.5714
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at values we generate."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Bulk-insert synthetic users, operators, vans, vehicles, requests, bookings, payments and feedback"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=90, help="Spread activity over this many past days")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't rebuild the search index, rollups and operator stats")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        scale = options['scale']
+        self.tag = self.rng.randrange(16 ** 6)  # keeps unique fields unique across runs
+
+        # Hash once; every generated account shares the password "password123"
+        self.password = make_password('password123')
+
+        with explicit_timestamps(User, VanOperator, ChargingVan, UserVehicle,
+                                 Request, Booking, Payment, Feedback):
+            with transaction.atomic():
+                users = self.create_users(int(1000 * scale))
+                operators = self.create_operators(max(int(100 * scale), 1))
+                self.create_vans(operators)
+                vehicles = self.create_vehicles(users, int(1500 * scale))
+                requests = self.create_requests(vehicles, operators, int(5000 * scale))
+                bookings = self.create_bookings(requests)
+                self.create_payments(bookings)
+                self.create_feedback(bookings)
+
+        if not options['skip_derived']:
+            search.rebuild()
+            rollups.rebuild()
+            operator_stats.repair()
+        if self.verbosity:
+            self.stdout.write(self.style.SUCCESS("Synthetic data generated"))
+
+    # ========== HELPERS ==========
+
+    def past(self, after=None):
+        if after is None:
+            return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+        span = max(int((self.now - after).total_seconds()), 1)
+        return after + timedelta(seconds=self.rng.randrange(min(span, 3 * 3600)))
+
+    def coordinate(self, base):
+        return Decimal(str(round(base + self.rng.uniform(-0.2, 0.2), 6)))
+
+    def name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def bulk(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        if self.verbosity:
+            self.stdout.write(f"{model.__name__}: {len(objs)}")
+        # SQLite and PostgreSQL return pks from bulk_create; fall back to a reload otherwise
+        if objs and objs[0].pk is None:
+            return list(model.objects.order_by('-pk')[:len(objs)])[::-1]
+        return objs
+
+    # ========== GENERATORS ==========
+
+    def create_users(self, count):
+        return self.bulk(User, [
+            User(
+                user_name=self.name(),
+                user_email=f"u{self.tag:06x}{i}@example.com",
+                user_password=self.password,
+                user_phone=9000000000 + i,
+                user_address=f"{self.rng.randrange(1, 500)} Ring Road",
+                created_at=self.past(),
+            )
+            for i in range(count)
+        ])
+
+    def create_operators(self, count):
+        return self.bulk(VanOperator, [
+            VanOperator(
+                operator_name=self.name(),
+                operator_email=f"o{self.tag:06x}{i}@example.com",
+                operator_password=self.password,
+                operator_phone=8000000000 + i,
+                operator_license='operator_docs/license.pdf',
+                operator_status=self.rng.choice([0, 1]),
+                is_verified=1,
+                created_at=self.past(),
+            )
+            for i in range(count)
+        ])
+
+    def create_vans(self, operators):
+        return self.bulk(ChargingVan, [
+            ChargingVan(
+                van_number=f"GJ{self.tag:06x}{i}"[:15],
+                operator=operator,
+                vanoperator_latitude=self.coordinate(BASE_LAT),
+                vanoperator_longitude=self.coordinate(BASE_LNG),
+                battery_capacity=f"{self.rng.choice([60, 80, 100])} kWh",
+                created_at=operator.created_at,
+            )
+            for i, operator in enumerate(operators)
+        ])
+
+    def create_vehicles(self, users, count):
+        vehicles = []
+        for i in range(count):
+            # First pass gives everyone a vehicle, the rest go to random users
+            user = users[i] if i < len(users) else self.rng.choice(users)
+            company = self.rng.choice(list(COMPANIES))
+            vehicles.append(UserVehicle(
+                user=user,
+                vehicle_company=company,
+                vehicle_name=self.rng.choice(COMPANIES[company]),
+                vehicle_model=str(self.rng.randrange(2019, 2026)),
+                vehicle_number=f"V{self.tag:06x}{i}",
+                created_at=self.past(user.created_at),
+            ))
+        return self.bulk(UserVehicle, vehicles)
+
+    def create_requests(self, vehicles, operators, count):
+        requests = []
+        for _ in range(count):
+            vehicle = self.rng.choice(vehicles)
+            status = self.rng.choices([0, 1, 2, 3], weights=[10, 15, 20, 55])[0]
+            requests.append(Request(
+                user_id=vehicle.user_id,
+                operator=self.rng.choice(operators),
+                vehicle=vehicle,
+                user_latitude=self.coordinate(BASE_LAT),
+                user_longitude=self.coordinate(BASE_LNG),
+                amount=self.rng.randrange(150, 1500),
+                request_status=status,
+                created_at=self.past(),
+            ))
+        return self.bulk(Request, requests)
+
+    def create_bookings(self, requests):
+        requests = [req for req in requests if req.request_status in (1, 3)]
+        next_id = sequences.reserve('booking', len(requests))
+        bookings = []
+        for req in requests:
+            created_at = self.past(req.created_at)
+            completed = req.request_status == 3
+            bookings.append(Booking(
+                booking_id=next_id,
+                request=req,
+                operator_id=req.operator_id,
+                booking_status=2 if completed else self.rng.choice([0, 1]),
+                created_at=created_at,
+                completed_at=self.past(created_at) if completed else None,
+            ))
+            next_id += 1
+        return self.bulk(Booking, bookings)
+
+    def create_payments(self, bookings):
+        return self.bulk(Payment, [
+            Payment(
+                booking=booking,
+                user_id=booking.request.user_id,
+                operator_id=booking.operator_id,
+                amount=float(booking.request.amount),
+                payment_method=self.rng.choice([0, 1, 2]),
+                payment_status=1,
+                created_at=booking.completed_at,
+            )
+            for booking in bookings if booking.booking_status == 2
+        ])
+
+    def create_feedback(self, bookings):
+        return self.bulk(Feedback, [
+            Feedback(
+                user_id=booking.request.user_id,
+                operator_id=booking.operator_id,
+                rating=self.rng.choices([1, 2, 3, 4, 5], weights=[3, 5, 12, 35, 45])[0],
+                comments=self.rng.choice(COMMENTS),
+                created_at=self.past(booking.completed_at),
+            )
+            for booking in bookings
+            if booking.booking_status == 2 and self.rng.random() < 0.5
+        ])
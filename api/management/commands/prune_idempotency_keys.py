@@ -0,0 +1,19 @@
+"""
+Delete stored Idempotency-Key responses past IDEMPOTENCY_KEY_TTL_HOURS.
+
+Usage: python manage.py prune_idempotency_keys
+
+Expired keys are already ignored when a request comes in; this only keeps
+the table small. Run it daily from cron.
+"""
+from django.core.management.base import BaseCommand
+
+from api import idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys"
+
+    def handle(self, *args, **options):
+        deleted = idempotency.prune()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
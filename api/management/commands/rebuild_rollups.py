@@ -0,0 +1,19 @@
+"""
+Rebuild the dashboard analytics rollups from the raw tables.
+
+Usage: python manage.py rebuild_rollups [--chunk-size 5000]
+"""
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyOperatorStats from Requests, Bookings, Payments and Feedback"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily rollup rows"))
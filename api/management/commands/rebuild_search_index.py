@@ -0,0 +1,21 @@
+"""
+Rebuild the admin search index from scratch.
+
+Usage: python manage.py rebuild_search_index [--chunk-size 1000]
+"""
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the admin search index for every searchable model"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = search.rebuild(chunk_size=options['chunk_size'])
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count} rows indexed")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,19 @@
+"""
+Recompute the denormalized VanOperator stats columns.
+
+Usage: python manage.py repair_operator_stats [--chunk-size 1000]
+"""
+from django.core.management.base import BaseCommand
+
+from api import operator_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute rating, completed booking and earnings totals for every operator"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = operator_stats.repair(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired stats for {count} operators"))
@@ -0,0 +1,80 @@
+"""
+Run background jobs (see api/jobs.py).
+
+Usage: python manage.py run_worker [--queues default,maintenance] [--threads 4]
+                                   [--processes 1] [--burst]
+
+Threads suit the usual I/O-bound jobs (database, files, push requests).
+Use --processes for CPU-bound work such as image processing; each process
+runs its own thread pool. --burst exits once no due jobs are left, which
+is handy in cron or CI. SIGTERM/SIGINT stop claiming new jobs and wait for
+the running ones to finish.
+"""
+import logging
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import jobs
+
+
+def serve(queues, threads, poll_interval, burst):
+    worker = jobs.Worker(queues, threads=threads, poll_interval=poll_interval, burst=burst)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: worker.stop.set())
+    worker.run()
+    return worker
+
+
+def serve_child(*args):
+    try:
+        serve(*args)
+    finally:
+        # Forked children leave with os._exit, which skips atexit; write out queued log records
+        logging.shutdown()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default=','.join(getattr(settings, 'JOB_QUEUES', {'default': 0})),
+                            help="Comma-separated queues to take jobs from")
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run at once per process")
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle thread waits before looking again")
+        parser.add_argument('--burst', action='store_true', help="Exit once no due jobs are left")
+
+    def handle(self, *args, **options):
+        queues = [queue for queue in options['queues'].split(',') if queue]
+        worker_args = (queues, options['threads'], options['poll_interval'], options['burst'])
+        self.stdout.write(
+            f"Worker on {', '.join(queues)}: {options['processes']} x {options['threads']} threads"
+        )
+
+        if options['processes'] <= 1:
+            worker = serve(*worker_args)
+            self.stdout.write(self.style.SUCCESS(f"Processed {worker.processed} jobs ({worker.failed} failed)"))
+            return
+
+        # Children must open their own connections (the pool resets on fork too)
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=serve_child, args=worker_args) for _ in range(options['processes'])]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS("All worker processes exited"))
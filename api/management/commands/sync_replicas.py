@@ -0,0 +1,34 @@
+"""
+Copy the default SQLite database into every replica alias.
+
+Usage: python manage.py sync_replicas
+
+Stands in for real replication when DB_REPLICA_PATHS points at local SQLite
+files: run it once after migrating, and again whenever the replicas should
+catch up. Uses SQLite's online backup API, so it's safe while the app runs.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.routers import replica_aliases
+
+
+class Command(BaseCommand):
+    help = "Copy the default SQLite database into each replica database"
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError("No replicas configured; set DB_REPLICA_PATHS")
+
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError("sync_replicas only copies SQLite databases")
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            replica.close()
+            self.stdout.write(f"{alias}: copied from default")
+        self.stdout.write(self.style.SUCCESS(f"Synced {len(aliases)} replica(s)"))
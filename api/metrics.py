@@ -0,0 +1,211 @@
+"""
+In-process request metrics.
+
+``Histogram`` uses HDR-style log-linear buckets: every power of two above
+``lowest`` is split into ``sub_buckets`` equal slices, so relative error is
+bounded at every scale. Each thread writes into its own shard of counters,
+so recording takes no lock; when the thread ends its shard is folded into a
+base shard, so thread churn doesn't grow memory. The exporter sums the shards when
+``/admin/metrics/`` is scraped and renders Prometheus text format at
+power-of-two ``le`` boundaries.
+"""
+import math
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+
+
+class _ShardOwner:
+    """Kept in a thread's local storage, so it is collected when the thread ends."""
+    __slots__ = ('__weakref__',)
+
+
+class Histogram:
+
+    def __init__(self, lowest, highest, sub_buckets=4):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.octaves = max(1, math.ceil(math.log2(highest / lowest)))
+        self.size = 2 + self.octaves * sub_buckets  # underflow + slices + overflow
+        self._local = threading.local()
+        self._base = [0] * self.size + [0.0]  # shards of finished threads
+        self._shards = {}  # id(owner) -> shard of a live thread
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            # [counts..., sum]; one per thread, folded into the base when it ends
+            shard = [0] * self.size + [0.0]
+            owner = _ShardOwner()
+            self._local.shard, self._local.owner = shard, owner
+            with self._lock:
+                self._shards[id(owner)] = shard
+            weakref.finalize(owner, self._retire, id(owner))
+        return shard
+
+    def _retire(self, key):
+        with self._lock:
+            shard = self._shards.pop(key)
+            for i, value in enumerate(shard):
+                self._base[i] += value
+
+    def index(self, value):
+        if value <= self.lowest:
+            return 0
+        # Slices are (lower, upper], so a value on a boundary stays in the lower slice
+        mantissa, exponent = math.frexp(value / self.lowest)
+        position = ((exponent - 1) + (2 * mantissa - 1)) * self.sub_buckets
+        return min(math.ceil(position), self.size - 1)
+
+    def record(self, value):
+        shard = self._shard()
+        shard[self.index(value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """Return ``(counts, total)`` summed over all thread shards."""
+        # Under the lock, or a shard retired meanwhile would be counted twice
+        with self._lock:
+            counts = self._base[:-1]
+            total = self._base[-1]
+            for shard in self._shards.values():
+                for i in range(self.size):
+                    counts[i] += shard[i]
+                total += shard[-1]
+        return counts, total
+
+    def cumulative_buckets(self):
+        """Yield ``(le, cumulative count)`` at each power-of-two boundary, then +Inf."""
+        counts, total = self.snapshot()
+        running = counts[0]
+        yield self.lowest, running
+        for octave in range(self.octaves):
+            start = 1 + octave * self.sub_buckets
+            running += sum(counts[start:start + self.sub_buckets])
+            yield self.lowest * 2 ** (octave + 1), running
+        yield math.inf, running + counts[-1]
+
+
+class HistogramFamily:
+    """Histograms sharing a name, one per label value."""
+
+    def __init__(self, name, help_text, lowest, highest):
+        self.name = name
+        self.help_text = help_text
+        self.lowest = lowest
+        self.highest = highest
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, view):
+        child = self._children.get(view)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(view, Histogram(self.lowest, self.highest))
+        return child
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help_text}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for view, histogram in sorted(self._children.items()):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            count = 0
+            for le, count in histogram.cumulative_buckets():
+                le_text = '+Inf' if le == math.inf else repr(float(le))
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{le_text}"}} {count}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {histogram.snapshot()[1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {count}')
+        return lines
+
+
+REQUEST_SECONDS = HistogramFamily(
+    'chargenow_request_duration_seconds', 'Wall time per request.', 0.0005, 60)
+DB_QUERIES = HistogramFamily(
+    'chargenow_db_queries', 'Database queries per request.', 1, 4096)
+DB_SECONDS = HistogramFamily(
+    'chargenow_db_duration_seconds', 'Time spent in database queries per request.', 0.0001, 60)
+SERIALIZER_SECONDS = HistogramFamily(
+    'chargenow_serializer_duration_seconds', 'Time spent building serializer data per request.', 0.0001, 60)
+RESPONSE_BYTES = HistogramFamily(
+    'chargenow_response_bytes', 'Response body size.', 64, 64 * 1024 * 1024)
+DB_POOL_WAIT_SECONDS = HistogramFamily(
+    'chargenow_db_pool_wait_seconds', 'Time spent waiting for a pooled database connection per request.', 0.00001, 60)
+
+FAMILIES = [
+    REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS, RESPONSE_BYTES,
+    DB_POOL_WAIT_SECONDS,
+]
+
+
+def render_prometheus():
+    lines = []
+    for family in FAMILIES:
+        lines.extend(family.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ========== PER-REQUEST ACCOUNTING ==========
+
+class RequestStats:
+    """Counters for the request being handled on this context."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        self.pool_wait_seconds = 0.0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+current_stats = ContextVar('chargenow_request_stats', default=None)
+
+
+def record_request(view, seconds, stats, response_bytes):
+    REQUEST_SECONDS.labels(view).record(seconds)
+    DB_QUERIES.labels(view).record(stats.queries)
+    DB_SECONDS.labels(view).record(stats.db_seconds)
+    SERIALIZER_SECONDS.labels(view).record(stats.serializer_seconds)
+    DB_POOL_WAIT_SECONDS.labels(view).record(stats.pool_wait_seconds)
+    if response_bytes is not None:
+        RESPONSE_BYTES.labels(view).record(response_bytes)
+
+
+def instrument_serializers():
+    """
+    Time ``BaseSerializer.data`` for sampled requests. ``Serializer.data`` and
+    ``ListSerializer.data`` both go through it, and nested calls are counted once.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'chargenow_instrumented', False):
+        return
+
+    def data(self):
+        stats = current_stats.get()
+        if stats is None:
+            return original.fget(self)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            stats.serializer_depth -= 1
+            if stats.serializer_depth == 0:
+                stats.serializer_seconds += time.perf_counter() - start
+
+    instrumented = property(data)
+    instrumented.fget.chargenow_instrumented = True
+    BaseSerializer.data = instrumented
@@ -0,0 +1,315 @@
+"""
+Middleware for ChargeNow.
+
+Each class works under WSGI and ASGI (``chargenow/asgi.py``). Under ASGI a
+sync-only middleware would send every request through a worker thread for
+its whole duration, so these implement ``ahandle()`` too and only hop to a
+thread for their own database or cache work.
+"""
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from . import idempotency, metrics, profiling, querylog, routers
+from .staticfiles import StaticFiles
+from .authentication import request_identity
+
+
+class AsyncCapableMiddleware:
+    """
+    Calls ``handle(request)`` under WSGI and ``ahandle(request)`` under ASGI.
+    Under ASGI, ``aprocess_view`` (if defined) replaces ``process_view``,
+    which Django would otherwise run in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            if hasattr(self, 'aprocess_view'):
+                self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class StaticFilesMiddleware(AsyncCapableMiddleware):
+    """
+    Serve STATIC_URL from STATIC_ROOT before the rest of the stack runs:
+    precompressed, and cached for a year when the name is fingerprinted
+    (see api/staticfiles.py).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.static_files = StaticFiles()
+
+    def handle(self, request):
+        response = self.static_files.serve(request)
+        return response if response is not None else self.get_response(request)
+
+    async def ahandle(self, request):
+        response = self.static_files.serve(request)
+        return response if response is not None else await self.get_response(request)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Record wall time, DB query count and time, serializer time and response
+    size per resolved URL name into ``api.metrics``. Only a
+    ``PERF_METRICS_SAMPLE_RATE`` fraction of requests is measured (the
+    histograms' ``_count`` is of sampled requests); at 0 the middleware is a
+    plain pass-through.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'PERF_METRICS_SAMPLE_RATE', 0)
+
+    def sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def handle(self, request):
+        if not self.sampled():
+            return self.get_response(request)
+
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with self.watch(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def ahandle(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        start = time.perf_counter()
+        # The async ORM runs this request's queries in one worker thread;
+        # the wrappers go on that thread's connections
+        stack = await sync_to_async(self.watch)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            metrics.current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def watch(stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+        return stack
+
+    @staticmethod
+    def record(request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        metrics.record_request(view, elapsed, stats, size)
+
+
+class QueryAuditMiddleware(AsyncCapableMiddleware):
+    """
+    Log slow queries and repeated SQL shapes per request (see
+    ``api.querylog``). Off unless ``QUERY_AUDIT_ENABLED``.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'QUERY_AUDIT_ENABLED', False)
+
+    def handle(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        auditor = querylog.QueryAuditor(view=request.path)
+        request._query_auditor = auditor
+        with auditor.watching():
+            response = self.get_response(request)
+        auditor.finish()
+        return response
+
+    async def ahandle(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        auditor = querylog.QueryAuditor(view=request.path)
+        request._query_auditor = auditor
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(auditor.watching())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        auditor.finish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        auditor = getattr(request, '_query_auditor', None)
+        if auditor is not None and request.resolver_match:
+            auditor.view = request.resolver_match.view_name or request.path
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return QueryAuditMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+
+class SamplingProfilerMiddleware(AsyncCapableMiddleware):
+    """
+    Run ``api.profiling`` around requests whose path matches
+    ``PROFILE_URL_PATTERNS``, or that carry ``X-Profile: 1`` from a logged-in
+    superuser. Must come after AuthenticationMiddleware.
+    """
+
+    def handle(self, request):
+        if profiling.should_profile(request):
+            return profiling.profile_request(request, self.get_response)
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        # Only X-Profile makes should_profile() load request.user from the database
+        if request.headers.get('X-Profile') == '1':
+            wanted = await sync_to_async(profiling.should_profile)(request)
+        else:
+            wanted = profiling.should_profile(request)
+        if wanted:
+            return await profiling.aprofile_request(request, self.get_response)
+        return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Send reads for replica-safe GETs to a replica (see ``api.routers``) and
+    pin clients to the primary for a few seconds after they write. Must come
+    after AuthenticationMiddleware so admin users can be identified.
+    """
+
+    def handle(self, request):
+        if not routers.replica_aliases():
+            return self.get_response(request)
+
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                routers.current_read_db.reset(request._replica_token)
+
+        self.pin_after_write(request, response)
+        return response
+
+    async def ahandle(self, request):
+        if not routers.replica_aliases():
+            return await self.get_response(request)
+
+        # process_view runs in a worker thread and its choice is copied back
+        # into this request's own context, so there is nothing to reset
+        request._replica_token = None
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.pin_after_write)(request, response)
+        return response
+
+    @staticmethod
+    def pin_after_write(request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            identity = request_identity(request)
+            if identity is not None:
+                routers.pin_to_primary(identity)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, '_replica_token') or request.method not in ('GET', 'HEAD'):
+            return None
+        if not self.replica_safe(request, view_func):
+            return None
+        identity = request_identity(request)
+        if identity is not None and routers.is_pinned(identity):
+            return None
+        request._replica_token = routers.current_read_db.set(routers.choose_replica())
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, '_replica_token') or request.method not in ('GET', 'HEAD'):
+            return None
+        # is_pinned() reads the cache
+        return await sync_to_async(ReplicaRoutingMiddleware.process_view)(
+            self, request, view_func, view_args, view_kwargs,
+        )
+
+    @staticmethod
+    def replica_safe(request, view_func):
+        from .admin import admin_site
+
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'replica_reads', False):
+            return True
+        match = request.resolver_match
+        return bool(
+            match and match.namespace == admin_site.name
+            and match.url_name and match.url_name.endswith('_changelist')
+        )
+
+
+class IdempotencyMiddleware(AsyncCapableMiddleware):
+    """
+    Replay the stored response when a client retries an unsafe request with
+    the same ``Idempotency-Key`` header. Only applies to views with
+    ``idempotent = True`` (see ``api.idempotency``). Must come after
+    AuthenticationMiddleware.
+    """
+
+    def handle(self, request):
+        request._idempotency_record = None
+        response = self.get_response(request)
+        if request._idempotency_record is not None:
+            idempotency.finish(request._idempotency_record, response)
+        return response
+
+    async def ahandle(self, request):
+        request._idempotency_record = None
+        response = await self.get_response(request)
+        if request._idempotency_record is not None:
+            await sync_to_async(idempotency.finish)(request._idempotency_record, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if not key or request.method in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'view_class', None)
+        if not getattr(view_class, 'idempotent', False):
+            return None
+        identity = request_identity(request)
+        if identity is None:
+            return None  # the view's authentication will turn it away
+        outcome = idempotency.begin(identity, key, request)
+        if isinstance(outcome, HttpResponse):
+            return outcome
+        request._idempotency_record = outcome
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if not request.headers.get(idempotency.HEADER) or request.method in SAFE_METHODS:
+            return None
+        return await sync_to_async(IdempotencyMiddleware.process_view)(
+            self, request, view_func, view_args, view_kwargs,
+        )
@@ -0,0 +1,141 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    replaces = [('api', '0001_initial'), ('api', '0002_alter_vanoperator_operator_password'), ('api', '0003_alter_vanoperator_operator_license_doc'), ('api', '0004_alter_user_user_password'), ('api', '0005_remove_request_user_location_request_user_latitude_and_more'), ('api', '0006_rename_request_id_payment_booking_id'), ('api', '0007_alter_chargingvan_operator_id'), ('api', '0008_alter_user_user_password_and_more'), ('api', '0009_alter_user_user_password_and_more'), ('api', '0010_chargingvan_operator_name'), ('api', '0011_remove_chargingvan_operator_id_and_more'), ('api', '0012_vanoperator_is_verified_alter_booking_booking_status_and_more'), ('api', '0013_alter_vanoperator_is_verified'), ('api', '0014_remove_request_operator_id_request_operator'), ('api', '0015_remove_request_user_id_request_user'), ('api', '0016_remove_request_operator_remove_request_user_and_more'), ('api', '0017_remove_uservehicle_user_id_uservehicle_user'), ('api', '0018_remove_feedback_operator_id_remove_feedback_user_id_and_more'), ('api', '0019_remove_request_operator_id_remove_request_user_id_and_more'), ('api', '0020_remove_booking_operator_id_booking_operator'), ('api', '0021_remove_booking_request_id_booking_request_and_more'), ('api', '0022_remove_booking_request_booking_request_id_and_more'), ('api', '0023_remove_booking_request_id_booking_request'), ('api', '0024_remove_payment_booking_id_remove_payment_operator_id_and_more'), ('api', '0025_rename_payment_time_payment_created_at_and_more'), ('api', '0026_rename_request_time_request_created_at'), ('api', '0027_rename_operator_license_doc_vanoperator_operator_license'), ('api', '0028_chargingvan_vanoperator_latitude_and_more'), ('api', '0029_request_amount'), ('api', '0030_alter_booking_booking_id_and_more'), ('api', '0031_alter_booking_booking_id_and_more'), ('api', '0032_alter_booking_booking_status'), ('api', '0033_alter_chargingvan_vanoperator_latitude_and_more'), ('api', '0034_alter_chargingvan_operator'), ('api', '0035_alter_chargingvan_operator'), ('api', '0036_alter_chargingvan_operator'), ('api', '0037_alter_chargingvan_operator')]
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('user_id', models.AutoField(primary_key=True, serialize=False)),
+                ('user_name', models.CharField(max_length=30)),
+                ('user_email', models.EmailField(max_length=30, unique=True)),
+                ('user_password', models.CharField(max_length=255)),
+                ('user_phone', models.BigIntegerField()),
+                ('user_address', models.CharField(max_length=100)),
+                ('role', models.IntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'user',
+            },
+        ),
+        migrations.CreateModel(
+            name='VanOperator',
+            fields=[
+                ('operator_id', models.AutoField(primary_key=True, serialize=False)),
+                ('operator_name', models.CharField(max_length=30)),
+                ('operator_email', models.EmailField(max_length=30, unique=True)),
+                ('operator_password', models.CharField(max_length=255)),
+                ('operator_phone', models.BigIntegerField()),
+                ('operator_license', models.FileField(upload_to='operator_docs/')),
+                ('operator_status', models.IntegerField(choices=[(0, 'Offline'), (1, 'Online')], default=0)),
+                ('role', models.IntegerField(default=2)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_verified', models.IntegerField(choices=[(0, 'Not Verified'), (1, 'Verified')], default=0)),
+            ],
+            options={
+                'db_table': 'vanoperator',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserVehicle',
+            fields=[
+                ('vehicle_id', models.AutoField(primary_key=True, serialize=False)),
+                ('vehicle_company', models.CharField(max_length=30)),
+                ('vehicle_name', models.CharField(max_length=30)),
+                ('vehicle_model', models.CharField(max_length=30)),
+                ('vehicle_number', models.CharField(max_length=20, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vehicles', to='api.user')),
+            ],
+            options={
+                'db_table': 'uservehicle',
+            },
+        ),
+        migrations.CreateModel(
+            name='Request',
+            fields=[
+                ('request_id', models.AutoField(primary_key=True, serialize=False)),
+                ('request_status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected'), (3, 'Compeletd')], default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('user_longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='operator_requests', to='api.vanoperator')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requests', to='api.user')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vehicle_requests', to='api.uservehicle')),
+                ('amount', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'request',
+            },
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('booking_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('booking_status', models.IntegerField(choices=[(0, 'In Progress'), (1, 'Started'), (2, 'Completed')], default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='operator_booking', to='api.vanoperator')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='api.request')),
+            ],
+            options={
+                'db_table': 'booking',
+            },
+        ),
+        migrations.CreateModel(
+            name='Feedback',
+            fields=[
+                ('feedback_id', models.AutoField(primary_key=True, serialize=False)),
+                ('rating', models.IntegerField()),
+                ('comments', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operator_feedbacks', to='api.vanoperator')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_feedbacks', to='api.user')),
+            ],
+            options={
+                'db_table': 'feedback',
+            },
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('payment_id', models.AutoField(primary_key=True, serialize=False)),
+                ('amount', models.FloatField()),
+                ('payment_method', models.IntegerField(choices=[(0, 'Cash'), (1, 'Card'), (2, 'UPI')], default=0)),
+                ('payment_status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Completed')], default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='api.booking')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operator_payments', to='api.vanoperator')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_payments', to='api.user')),
+            ],
+            options={
+                'db_table': 'payment',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChargingVan',
+            fields=[
+                ('van_id', models.AutoField(primary_key=True, serialize=False)),
+                ('van_number', models.CharField(max_length=15, unique=True)),
+                ('battery_capacity', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.vanoperator')),
+                ('vanoperator_latitude', models.DecimalField(decimal_places=6, default=0, max_digits=9)),
+                ('vanoperator_longitude', models.DecimalField(decimal_places=6, default=0, max_digits=9)),
+            ],
+            options={
+                'db_table': 'chargingvan',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyOperatorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.FloatField(default=0)),
+                ('payments_completed', models.IntegerField(default=0)),
+                ('requests_received', models.IntegerField(default=0)),
+                ('requests_accepted', models.IntegerField(default=0)),
+                ('requests_rejected', models.IntegerField(default=0)),
+                ('bookings_created', models.IntegerField(default=0)),
+                ('request_to_booking_seconds', models.FloatField(default=0)),
+                ('bookings_completed', models.IntegerField(default=0)),
+                ('booking_to_completion_seconds', models.FloatField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.vanoperator')),
+            ],
+            options={
+                'db_table': 'daily_operator_stats',
+                'unique_together': {('date', 'operator')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_daily_operator_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vanoperator',
+            name='completed_bookings',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vanoperator',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vanoperator',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vanoperator',
+            name='total_earnings',
+            field=models.FloatField(default=0, editable=False),
+        ),
+    ]
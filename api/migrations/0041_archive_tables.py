@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_vanoperator_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRequest',
+            fields=[
+                ('request_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('user_latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('user_longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('amount', models.IntegerField()),
+                ('request_status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected'), (3, 'Compeletd')])),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.vanoperator')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.user')),
+                ('vehicle', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.uservehicle')),
+            ],
+            options={
+                'db_table': 'archived_request',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='archived_re_user_id_53890e_idx'), models.Index(fields=['operator', '-created_at'], name='archived_re_operato_d9ce37_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('payment_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('booking_id', models.IntegerField(db_index=True)),
+                ('amount', models.FloatField()),
+                ('payment_method', models.IntegerField(choices=[(0, 'Cash'), (1, 'Card'), (2, 'UPI')])),
+                ('payment_status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Completed')])),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.vanoperator')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.user')),
+            ],
+            options={
+                'db_table': 'archived_payment',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='archived_pa_user_id_0d43d3_idx'), models.Index(fields=['operator', '-created_at'], name='archived_pa_operato_0b6e16_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('booking_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('request_id', models.IntegerField(db_index=True)),
+                ('requested_at', models.DateTimeField()),
+                ('booking_status', models.IntegerField(choices=[(0, 'In Progress'), (1, 'Started'), (2, 'Completed')])),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('operator', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.vanoperator')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.user')),
+                ('vehicle', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.uservehicle')),
+            ],
+            options={
+                'db_table': 'archived_booking',
+                'indexes': [models.Index(fields=['user', '-created_at'], name='archived_bo_user_id_2020a8_idx'), models.Index(fields=['operator', '-created_at'], name='archived_bo_operato_60b600_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0042_booking_ids_and_idempotency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedbooking',
+            name='booking_status',
+            field=models.IntegerField(choices=[(0, 'In Progress'), (1, 'Started'), (2, 'Completed'), (3, 'Cancelled')]),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_status',
+            field=models.IntegerField(choices=[(0, 'In Progress'), (1, 'Started'), (2, 'Completed'), (3, 'Cancelled')], default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0044_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vanoperator',
+            name='license_content_type',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='vanoperator',
+            name='license_preview',
+            field=models.FileField(blank=True, editable=False, upload_to='operator_docs/previews/'),
+        ),
+        migrations.AddField(
+            model_name='vanoperator',
+            name='license_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:10
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0045_operator_license_preview'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vanoperator',
+            name='operator_license',
+            field=models.FileField(db_index=True, storage=api.storage.get_document_storage, upload_to='operator_docs/'),
+        ),
+    ]
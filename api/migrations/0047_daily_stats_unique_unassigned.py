@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+COUNTERS = (
+    'revenue', 'payments_completed', 'requests_received', 'requests_accepted',
+    'requests_rejected', 'bookings_created', 'request_to_booking_seconds',
+    'bookings_completed', 'booking_to_completion_seconds', 'rating_sum', 'rating_count',
+)
+
+
+def merge_unassigned_duplicates(apps, schema_editor):
+    # Racing first writes could create several no-operator rows for one day
+    DailyOperatorStats = apps.get_model('api', 'DailyOperatorStats')
+    rows_by_date = {}
+    for row in DailyOperatorStats.objects.filter(operator__isnull=True).order_by('pk'):
+        rows_by_date.setdefault(row.date, []).append(row)
+    for keep, *duplicates in rows_by_date.values():
+        if not duplicates:
+            continue
+        for row in duplicates:
+            for field in COUNTERS:
+                setattr(keep, field, getattr(keep, field) + getattr(row, field))
+        keep.save(update_fields=COUNTERS)
+        DailyOperatorStats.objects.filter(pk__in=[row.pk for row in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0046_content_addressed_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_unassigned_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyoperatorstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('operator__isnull', True)), fields=('date',), name='daily_stats_unique_unassigned_date'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# User search documents now hold only user_name (user_email is matched
+# exactly and user_phone isn't searchable), so rewrite them.
+
+from django.db import migrations
+
+USER_SLOT = 1
+MODEL_SLOTS = 32
+
+
+def reindex_users(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'search_index' not in connection.introspection.table_names():
+        return
+    schema_editor.execute(f"DELETE FROM search_index WHERE rowid % {MODEL_SLOTS} = {USER_SLOT}")
+    schema_editor.execute(
+        f"INSERT INTO search_index (rowid, content) "
+        f"SELECT user_id * {MODEL_SLOTS} + {USER_SLOT}, user_name FROM user"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0047_daily_stats_unique_unassigned'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_users, migrations.RunPython.noop),
+    ]
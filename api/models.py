@@ -7,6 +7,8 @@ from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
 from django.core.exceptions import ValidationError
 
+from .storage import get_document_storage
+
 
 
 # USER MODEL
@@ -24,6 +26,13 @@ class User(models.Model):
     class Meta:
         db_table = 'user'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded name so a rename can refresh the search documents embedding it
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_user_name = instance.__dict__.get('user_name')
+        return instance
+
     def save(self, *args, **kwargs):
         # Password hash only if not already hashed
         if not self.user_password.startswith('pbkdf2_'):
@@ -56,7 +65,12 @@ class VanOperator(models.Model):
     operator_email = models.EmailField(max_length=30, unique=True)
     operator_password = models.CharField(max_length=255)
     operator_phone = models.BigIntegerField()
-    operator_license = models.FileField(upload_to='operator_docs/')
+    # Stored once per distinct content (see api/storage.py)
+    operator_license = models.FileField(upload_to='operator_docs/', storage=get_document_storage, db_index=True)
+    # Filled in after upload by a background job (see api/uploads.py)
+    license_preview = models.FileField(upload_to='operator_docs/previews/', blank=True, editable=False)
+    license_content_type = models.CharField(max_length=50, blank=True, editable=False)
+    license_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     operator_status = models.IntegerField(
         choices=OperatorStatus.choices,
@@ -71,14 +85,43 @@ class VanOperator(models.Model):
     role = models.IntegerField(default=2)  # 2 = Operator
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized stats, kept current with F() updates (see api/operator_stats.py)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    completed_bookings = models.IntegerField(default=0, editable=False)
+    total_earnings = models.FloatField(default=0, editable=False)
+
+    STATS_FIELDS = ('rating_sum', 'rating_count', 'completed_bookings', 'total_earnings')
+
     class Meta:
         db_table = 'vanoperator'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded document so a replaced one can be released, and
+        # the name so a rename can refresh the search documents embedding it
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_license = instance.__dict__.get('operator_license')
+        instance._loaded_operator_name = instance.__dict__.get('operator_name')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.operator_password.startswith('pbkdf2_'):
             self.operator_password = make_password(self.operator_password)
+        # Never write back stats loaded earlier; they may have moved since
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
     def check_password(self, raw_password):
         return check_password(raw_password, self.operator_password)
 
@@ -183,6 +226,13 @@ class ChargingVan(models.Model):
     class Meta:
         db_table = 'chargingvan'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded operator so a reassignment can uncache both
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_operator_id = instance.__dict__.get('operator_id')
+        return instance
+
     def __str__(self):
         return self.van_number
 
@@ -247,6 +297,13 @@ class Request(models.Model):
     class Meta:
         db_table = 'request'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded status so signals can tell which transition happened
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('request_status')
+        return instance
+
     def __str__(self):
         return f"Request #{self.request_id}"
 
@@ -258,7 +315,8 @@ class Booking(models.Model):
     BOOKING_STATUS = (
         (0,'In Progress'),
         (1,'Started'),
-        (2,'Completed')
+        (2,'Completed'),
+        (3,'Cancelled')
     )
 
     booking_id = models.IntegerField(primary_key=True)
@@ -276,11 +334,22 @@ class Booking(models.Model):
         null=True,
         blank=True
     )
-    booking_status = models.IntegerField(default=0,choices=BOOKING_STATUS) # 0=in progress, 1=completed
+    booking_status = models.IntegerField(default=0,choices=BOOKING_STATUS) # 0=in progress, 1=started, 2=completed, 3=cancelled
     created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'booking'
+        constraints = [
+            # Last line of defence against a request being accepted twice
+            models.UniqueConstraint(fields=['request'], name='booking_one_per_request'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('booking_status')
+        return instance
 
     def __str__(self):
         return f"{self.booking_id}"
@@ -369,6 +438,12 @@ class Payment(models.Model):
     class Meta:
         db_table = 'payment'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('payment_status')
+        return instance
+
     def __str__(self):
         return f"Payment #{self.payment_id} - ₹{self.amount}"
 
@@ -401,3 +476,264 @@ class Feedback(models.Model):
 
     def __str__(self):
         return f"Feedback #{self.feedback_id} - {self.rating}"
+
+
+
+
+# DAILY OPERATOR STATS (ANALYTICS ROLLUP)
+class DailyOperatorStats(models.Model):
+    """
+    One row per operator per day, maintained incrementally from Request,
+    Booking, Payment and Feedback writes (see api/rollups.py).
+    """
+    date = models.DateField()
+
+    operator = models.ForeignKey(
+        VanOperator,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        null=True,
+        blank=True
+    )
+
+    revenue = models.FloatField(default=0)
+    payments_completed = models.IntegerField(default=0)
+
+    requests_received = models.IntegerField(default=0)
+    requests_accepted = models.IntegerField(default=0)
+    requests_rejected = models.IntegerField(default=0)
+
+    bookings_created = models.IntegerField(default=0)
+    request_to_booking_seconds = models.FloatField(default=0)
+    bookings_completed = models.IntegerField(default=0)
+    booking_to_completion_seconds = models.FloatField(default=0)
+
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_operator_stats'
+        unique_together = ('date', 'operator')
+        constraints = [
+            # NULLs are distinct to unique_together, so rows with no operator need their own
+            models.UniqueConstraint(
+                fields=['date'], condition=models.Q(operator__isnull=True),
+                name='daily_stats_unique_unassigned_date',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.operator_id}"
+
+
+
+
+# ARCHIVE (COLD STORAGE)
+# Finished requests, bookings and payments older than ARCHIVE_AFTER_DAYS are
+# moved here by `manage.py archive_history` (see api/archive.py). Relations
+# to live tables are unconstrained so a row can outlive its request or
+# booking; users and operators still cascade via signals.
+class ArchivedRequest(models.Model):
+    request_id = models.IntegerField(primary_key=True)
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    operator = models.ForeignKey(
+        VanOperator,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+
+    vehicle = models.ForeignKey(
+        UserVehicle,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    user_latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    user_longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    amount = models.IntegerField()
+    request_status = models.IntegerField(choices=Request.REQUEST_STATUS)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'archived_request'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['operator', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived Request #{self.request_id}"
+
+
+class ArchivedBooking(models.Model):
+    booking_id = models.IntegerField(primary_key=True)
+    request_id = models.IntegerField(db_index=True)
+
+    # Copied from the request so history needs no join to it
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    vehicle = models.ForeignKey(
+        UserVehicle,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    requested_at = models.DateTimeField()
+
+    operator = models.ForeignKey(
+        VanOperator,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+
+    booking_status = models.IntegerField(choices=Booking.BOOKING_STATUS)
+    created_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'archived_booking'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['operator', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking_id}"
+
+
+class ArchivedPayment(models.Model):
+    payment_id = models.IntegerField(primary_key=True)
+    booking_id = models.IntegerField(db_index=True)
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    operator = models.ForeignKey(
+        VanOperator,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+
+    amount = models.FloatField()
+    payment_method = models.IntegerField(choices=Payment.PAYMENT_METHOD_STATUS)
+    payment_status = models.IntegerField(choices=Payment.PAYMENT_STATUS)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'archived_payment'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['operator', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived Payment #{self.payment_id} - ₹{self.amount}"
+
+
+
+
+# ID SEQUENCES
+# Next free value for primary keys that are not auto-increment, handed out
+# in blocks by api/sequences.py.
+class IdSequence(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'id_sequence'
+
+    def __str__(self):
+        return f"{self.name} -> {self.next_value}"
+
+
+
+
+# IDEMPOTENCY KEYS
+# Responses to unsafe API calls sent with an Idempotency-Key header, replayed
+# when the client retries (see api/idempotency.py).
+class IdempotencyKey(models.Model):
+    identity = models.CharField(max_length=50)  # "user:5", "operator:3"
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None while running
+    content_type = models.CharField(max_length=100, blank=True)
+    content = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'idempotency_key'
+        constraints = [
+            models.UniqueConstraint(fields=['identity', 'key'], name='idempotency_key_per_client'),
+        ]
+        indexes = [models.Index(fields=['created_at'])]
+
+    def __str__(self):
+        return f"{self.identity} {self.key}"
+
+
+
+
+# BACKGROUND JOBS
+# The broker table for api/jobs.py; `manage.py run_worker` executes them.
+class Job(models.Model):
+
+    JOB_STATUS = (
+        (0, 'Queued'),
+        (1, 'Running'),
+        (2, 'Done'),
+        (3, 'Failed'),
+    )
+
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=200)  # registered name, see api.jobs.task
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.IntegerField(choices=JOB_STATUS, default=0)
+    run_at = models.DateTimeField()  # not picked up before this
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    # Set for scheduled runs so each period is only enqueued once
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'job'
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.task}"
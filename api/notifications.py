@@ -0,0 +1,342 @@
+"""
+Notifications for request and booking status changes.
+
+A transition (api/transitions.py) or a new request calls ``notify()``.
+Once the transaction commits, the notification is handed to ``dispatcher``
+and the request thread moves on. The dispatcher thread collects batches of
+up to ``NOTIFICATION_BATCH_SIZE`` notifications, or whatever arrived within
+``NOTIFICATION_BATCH_WAIT_MS``. For each batch it:
+
+1. looks up who a booking event is for, with one query for the whole batch
+2. publishes every notification to ``hub``, which hands it to the live
+   subscribers of its recipient (the SSE stream in
+   api/views/notification_views.py)
+3. queues one ``push_notifications`` job for the batch. A worker passes it
+   to the ``NOTIFICATION_PUSH_BACKEND`` (see ``LogPushBackend`` and
+   ``FilePushBackend`` for the interface)
+
+The hub lives in memory, so subscribers only see notifications dispatched
+by their own process. Push delivery goes through the job table and does
+not have this limit.
+
+Recipients are identities as in ``request_identity()``, e.g. "user:5".
+"""
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.utils import OperationalError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Request
+
+logger = logging.getLogger('api.notifications')
+
+# (model name, action) -> (event, who is told)
+EVENTS = {
+    ('request', 'created'): ('request.created', 'operator'),
+    ('request', 'accept'): ('request.accepted', 'user'),
+    ('request', 'reject'): ('request.rejected', 'user'),
+    ('booking', 'start'): ('booking.started', 'user'),
+    ('booking', 'complete'): ('booking.completed', 'user'),
+    ('booking', 'cancel'): ('booking.cancelled', 'operator'),
+}
+
+_ids = itertools.count(1)
+
+
+def notify(instance, action):
+    """
+    Tell the other side about ``action`` on a Request or Booking, once the
+    current transaction commits. Returns the notification, or None if
+    ``action`` has no event.
+    """
+    model = instance._meta.model_name
+    if (model, action) not in EVENTS:
+        return None
+    event, audience = EVENTS[model, action]
+    notification = {
+        'id': next(_ids),
+        'event': event,
+        'recipient': None,
+        'request_id': instance.request_id,
+        'booking_id': instance.booking_id if model == 'booking' else None,
+        'status': getattr(instance, f'{model}_status'),
+        'at': timezone.now().isoformat(),
+    }
+    if audience == 'operator':
+        notification['recipient'] = f'operator:{instance.operator_id}'
+    elif model == 'request':
+        notification['recipient'] = f'user:{instance.user_id}'
+    # else: a booking's user is looked up by the dispatcher, off the request thread
+    transaction.on_commit(lambda: dispatcher.submit(notification))
+    return notification
+
+
+def resolve_recipients(batch):
+    """Fill in the user of booking notifications, one query per batch."""
+    missing = {n['request_id'] for n in batch if n['recipient'] is None}
+    if not missing:
+        return batch
+    users = dict(Request.objects.filter(pk__in=missing).values_list('request_id', 'user_id'))
+    for notification in batch:
+        if notification['recipient'] is None and notification['request_id'] in users:
+            notification['recipient'] = f"user:{users[notification['request_id']]}"
+    return [n for n in batch if n['recipient'] is not None]
+
+
+# ========== HUB ==========
+
+class Subscription:
+    """One live listener. A slow reader loses its oldest notifications, not new ones."""
+
+    def __init__(self, hub, identity, buffer):
+        self.hub = hub
+        self.identity = identity
+        self.queue = queue.Queue(buffer)
+        self.dropped = 0
+
+    def put(self, notification):
+        while True:
+            try:
+                self.queue.put_nowait(notification)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Next notification, or None after ``timeout`` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """A listener on an event loop (ASGI). Must be created on that loop."""
+
+    def __init__(self, hub, identity, buffer):
+        super().__init__(hub, identity, buffer)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(buffer)
+
+    def put(self, notification):
+        # Called from the dispatcher thread
+        try:
+            self.loop.call_soon_threadsafe(self._put, notification)
+        except RuntimeError:
+            self.close()  # the loop is gone
+
+    def _put(self, notification):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(notification)
+
+    def get(self, timeout=None):
+        raise TypeError("Use 'await subscription.aget()'")
+
+    async def aget(self, timeout=None):
+        """Next notification, or None after ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Hub:
+    """In-process fan-out from recipients to their subscriptions."""
+
+    def __init__(self):
+        self._subscribers = {}  # identity -> set of Subscription
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, identity, subscription_class=Subscription):
+        subscription = subscription_class(
+            self, identity, getattr(settings, 'NOTIFICATION_SUBSCRIBER_BUFFER', 100),
+        )
+        with self._lock:
+            self._subscribers.setdefault(identity, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.identity, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.identity, None)
+
+    def publish(self, notification):
+        """Hand ``notification`` to its recipient's subscriptions; returns how many."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(notification['recipient'], ()))
+        for subscription in subscribers:
+            subscription.put(notification)
+        self.published += 1
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+hub = Hub()
+
+
+# ========== PUSH BACKENDS ==========
+
+class LogPushBackend:
+    """Stand-in that logs each push instead of sending it."""
+
+    def send_batch(self, notifications):
+        for notification in notifications:
+            logger.info('push notification', extra=notification)
+        return len(notifications)
+
+
+class FilePushBackend:
+    """Stand-in that appends each push to ``NOTIFICATION_PUSH_FILE`` as a JSON line."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = Path(path or settings.NOTIFICATION_PUSH_FILE)
+
+    def send_batch(self, notifications):
+        lines = ''.join(json.dumps(n, sort_keys=True) + '\n' for n in notifications)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(lines)
+        return len(notifications)
+
+
+_backend = None
+
+
+def get_push_backend():
+    """The configured backend, or None when ``NOTIFICATION_PUSH_BACKEND`` is empty."""
+    global _backend
+    path = getattr(settings, 'NOTIFICATION_PUSH_BACKEND', '')
+    if not path:
+        return None
+    if _backend is None or _backend[0] != path:
+        _backend = (path, import_string(path)())
+    return _backend[1]
+
+
+# ========== DISPATCHER ==========
+
+class Dispatcher:
+
+    def __init__(self, name):
+        self.name = name
+        self.delivered = 0
+        self.dropped = 0
+        self._queue = queue.Queue(10000)
+        self._lock = threading.Lock()
+        self._deliver_lock = threading.Lock()  # one batch at a time, thread or caller
+        self._thread = None
+
+    def submit(self, notification):
+        if getattr(settings, 'NOTIFICATION_DISPATCH_SYNC', False):
+            self.deliver([notification])
+            return
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('notification dropped', extra={'event': notification['event']})
+            return
+        with self._lock:
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f'chargenow-notifications-{self.name}', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            close_old_connections()
+            try:
+                self.deliver(batch)
+            except Exception:
+                logger.exception('notification batch failed', extra={'size': len(batch)})
+            finally:
+                # Hand the (pooled) connection back while waiting for the next batch
+                connection.close()
+
+    def _collect(self):
+        """Block for one notification, then take more until the batch is full or the wait is over."""
+        size = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 100)
+        wait = getattr(settings, 'NOTIFICATION_BATCH_WAIT_MS', 200) / 1000
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + wait
+        while len(batch) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def deliver(self, batch):
+        """Publish ``batch`` to the hub and queue its push, in the calling thread."""
+        from .tasks import push_notifications
+
+        with self._deliver_lock:
+            batch = resolve_recipients(batch)
+            for notification in batch:
+                hub.publish(notification)
+            if batch and get_push_backend() is not None:
+                self._queue_push(push_notifications, batch)
+            self.delivered += len(batch)
+        return len(batch)
+
+    def _queue_push(self, push_notifications, batch, retries=3):
+        # The batch is already published, so only the job insert is retried
+        for attempt in range(retries):
+            try:
+                return push_notifications.delay(batch)
+            except OperationalError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def flush(self):
+        """Deliver everything submitted so far, in the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        delivered = self.deliver(batch) if batch else 0
+        with self._deliver_lock:
+            pass  # wait for a batch the thread already took
+        return delivered
+
+
+dispatcher = Dispatcher('default')
@@ -0,0 +1,135 @@
+"""
+Cached operator profile and operator -> van lookups.
+
+Operator endpoints read the same two rows on every call: the operator and
+the van assigned to it. Both are kept in the ``operators`` cache
+(settings.CACHES) for OPERATOR_CACHE_SECONDS:
+
+- ``operator(operator_id)``: the VanOperator, or None.
+- ``van_for(operator_id)``: the operator's ChargingVan, or None.
+
+signals.py drops the entries when the rows are saved or deleted. That
+covers the operator's profile and status updates, ChargingVanAdmin
+reassignments and ChargingVanForm saves. ``operator_stats.bump()`` drops
+the entry too, because it changes the stats with UPDATE. Location pings
+write through with ``van_moved()`` instead of dropping the entry.
+
+On a miss, one caller per key loads the row (a lock taken with
+``cache.add``). The others wait up to OPERATOR_CACHE_LOCK_SECONDS for it
+to appear, so an expiry under load costs one query rather than one per
+request.
+
+The cache is local memory by default, so each process has its own copy
+and an invalidation only reaches the process that made the change. Other
+processes see it when their copy expires. Point the ``operators`` cache at
+Redis or Memcached to share one copy and invalidate everywhere.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import VanOperator, ChargingVan
+from .writequeue import location_writes
+
+# Cached in place of None so "no van" is a hit too
+MISSING = 'missing'
+POLL_SECONDS = 0.02
+
+# Keys share a fixed set of locks; ids come from URLs, so one lock per key
+# would grow without limit
+LOCAL_LOCK_STRIPES = 64
+_local_locks = [threading.Lock() for _ in range(LOCAL_LOCK_STRIPES)]
+
+
+def get_cache():
+    return caches[settings.OPERATOR_CACHE_ALIAS]
+
+
+def operator_key(operator_id):
+    return f'operator:{operator_id}'
+
+
+def van_key(operator_id):
+    return f'operator-van:{operator_id}'
+
+
+def _local_lock(key):
+    return _local_locks[hash(key) % LOCAL_LOCK_STRIPES]
+
+
+def cached(key, load):
+    """The cached value for ``key``, loading it with ``load()`` on a miss."""
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return None if value == MISSING else value
+
+    # Threads of this process queue on a local lock; processes race on cache.add
+    with _local_lock(key):
+        value = cache.get(key)
+        if value is None:
+            lock_key = f'{key}:lock'
+            lock_seconds = settings.OPERATOR_CACHE_LOCK_SECONDS
+            if cache.add(lock_key, 1, lock_seconds):
+                try:
+                    value = load()
+                    cache.set(key, MISSING if value is None else value, settings.OPERATOR_CACHE_SECONDS)
+                finally:
+                    cache.delete(lock_key)
+                return value
+            # Someone else is loading it; wait, then load it ourselves if they fail
+            deadline = time.monotonic() + lock_seconds
+            while value is None and time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                value = cache.get(key)
+            if value is None:
+                return load()
+    return None if value == MISSING else value
+
+
+# ========== LOOKUPS ==========
+
+def operator(operator_id):
+    return cached(operator_key(operator_id), lambda: VanOperator.objects.filter(pk=operator_id).first())
+
+
+def van_for(operator_id):
+    def load():
+        van = ChargingVan.objects.filter(operator_id=operator_id).first()
+        if van is not None:
+            # A ping may still be waiting for the write queue's next flush
+            for field, value in location_writes.pending(ChargingVan, van.pk).items():
+                setattr(van, field, value)
+        return van
+
+    return cached(van_key(operator_id), load)
+
+
+def van_moved(van):
+    """Write a location ping through to the cached van."""
+    cache = get_cache()
+    key = van_key(van.operator_id)
+    current = cache.get(key)
+    # Only refresh an entry for this van; a reassignment may have dropped it
+    if current is not None and current != MISSING and current.pk == van.pk:
+        cache.set(key, van, settings.OPERATOR_CACHE_SECONDS)
+
+
+# ========== INVALIDATION ==========
+
+def forget(*keys):
+    keys = [key for key in keys if key is not None]
+    get_cache().delete_many(keys)
+    # Again after commit, in case a reader cached the old row meanwhile
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def forget_operator(operator_id):
+    forget(operator_key(operator_id))
+
+
+def forget_van(*operator_ids):
+    forget(*(van_key(operator_id) for operator_id in set(operator_ids) if operator_id is not None))
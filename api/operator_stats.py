@@ -0,0 +1,108 @@
+"""
+Denormalized operator stats.
+
+``VanOperator`` carries rating sum/count, completed bookings and total
+earnings so rating displays and dispatch ranking never aggregate the feedback,
+booking or payment tables. Every change is a single ``UPDATE ... SET x = x + n``
+so concurrent writers can't lose increments. ``repair()`` recomputes the
+columns in bulk if they ever drift.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, Sum
+
+from . import operator_cache
+from .models import VanOperator, Booking, Payment, Feedback, ArchivedBooking, ArchivedPayment
+
+
+BOOKING_COMPLETED = 2
+PAYMENT_COMPLETED = 1
+
+
+def bump(operator_id, **deltas):
+    deltas = {field: value for field, value in deltas.items() if value}
+    if operator_id is None or not deltas:
+        return
+    VanOperator.objects.filter(pk=operator_id).update(**{
+        field: F(field) + value for field, value in deltas.items()
+    })
+    operator_cache.forget_operator(operator_id)
+
+
+# ========== INCREMENTAL UPDATES ==========
+
+def record_feedback(feedback, sign=1):
+    bump(feedback.operator_id, rating_sum=sign * feedback.rating, rating_count=sign)
+
+
+def record_booking(booking, old_status):
+    if booking.booking_status == BOOKING_COMPLETED and old_status != BOOKING_COMPLETED:
+        bump(booking.operator_id, completed_bookings=1)
+    elif old_status == BOOKING_COMPLETED and booking.booking_status != BOOKING_COMPLETED:
+        bump(booking.operator_id, completed_bookings=-1)
+
+
+def record_payment(payment, old_status):
+    if payment.payment_status == PAYMENT_COMPLETED and old_status != PAYMENT_COMPLETED:
+        bump(payment.operator_id, total_earnings=payment.amount)
+    elif old_status == PAYMENT_COMPLETED and payment.payment_status != PAYMENT_COMPLETED:
+        bump(payment.operator_id, total_earnings=-payment.amount)
+
+
+def forget_booking(booking):
+    if booking.booking_status == BOOKING_COMPLETED:
+        bump(booking.operator_id, completed_bookings=-1)
+
+
+def forget_payment(payment):
+    if payment.payment_status == PAYMENT_COMPLETED:
+        bump(payment.operator_id, total_earnings=-payment.amount)
+
+
+# ========== REPAIR ==========
+
+def repair(chunk_size=1000):
+    """Recompute the stats columns for every operator. Returns operators updated."""
+    operator_ids = list(VanOperator.objects.order_by('pk').values_list('pk', flat=True))
+    updated = 0
+    for start in range(0, len(operator_ids), chunk_size):
+        chunk = operator_ids[start:start + chunk_size]
+
+        ratings = {
+            row['operator_id']: row
+            for row in Feedback.objects.filter(operator_id__in=chunk)
+            .values('operator_id')
+            .annotate(total=Sum('rating'), count=Count('pk'))
+        }
+        # Archived bookings and payments still count towards the totals
+        completed = Counter()
+        earnings = Counter()
+        for model in (Booking, ArchivedBooking):
+            completed.update(dict(
+                model.objects.filter(operator_id__in=chunk, booking_status=BOOKING_COMPLETED)
+                .values('operator_id')
+                .annotate(count=Count('pk'))
+                .values_list('operator_id', 'count')
+            ))
+        for model in (Payment, ArchivedPayment):
+            earnings.update(dict(
+                model.objects.filter(operator_id__in=chunk, payment_status=PAYMENT_COMPLETED)
+                .values('operator_id')
+                .annotate(total=Sum('amount'))
+                .values_list('operator_id', 'total')
+            ))
+
+        operators = [
+            VanOperator(
+                pk=operator_id,
+                rating_sum=ratings.get(operator_id, {}).get('total') or 0,
+                rating_count=ratings.get(operator_id, {}).get('count') or 0,
+                completed_bookings=completed.get(operator_id, 0),
+                total_earnings=earnings.get(operator_id) or 0,
+            )
+            for operator_id in chunk
+        ]
+        VanOperator.objects.bulk_update(operators, VanOperator.STATS_FIELDS)
+        operator_cache.forget(*(operator_cache.operator_key(operator_id) for operator_id in chunk))
+        updated += len(operators)
+    return updated
@@ -0,0 +1,153 @@
+"""
+On-demand statistical profiler for production requests.
+
+While a profiled request runs, a background thread samples the request
+thread's stack every ``PROFILE_INTERVAL_MS`` with ``sys._current_frames()``.
+The request itself is not slowed by tracing hooks. Samples are stored as
+flamegraph-compatible collapsed stacks (``root;caller;leaf count``) in
+``PROFILE_DIR``, which keeps only the newest ``PROFILE_MAX_FILES`` profiles.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+class SamplingProfiler:
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._root = str(Path(settings.BASE_DIR).resolve())
+
+    def frame_label(self, code):
+        filename = code.co_filename
+        if filename.startswith(self._root):
+            filename = filename[len(self._root) + 1:]
+        elif 'site-packages' in filename:
+            filename = filename.split('site-packages', 1)[1].lstrip(os.sep)
+        return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self.frame_label(frame.f_code))
+            frame = frame.f_back
+        if stack:
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='chargenow-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """Bounded ring of ``.folded`` files; the oldest are deleted first."""
+
+    NAME = re.compile(r'^[\w.-]+\.folded$')
+
+    def __init__(self, directory=None, max_files=None):
+        self.directory = Path(directory or settings.PROFILE_DIR)
+        self.max_files = max_files or getattr(settings, 'PROFILE_MAX_FILES', 50)
+
+    def save(self, label, collapsed, elapsed):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+        name = f'{stamp}-{slugify(label)[:60] or "request"}-{int(elapsed * 1000)}ms.folded'
+        path = self.directory / name
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(collapsed)
+        tmp.replace(path)
+        self.trim()
+        return name
+
+    def trim(self):
+        for path in self.list()[self.max_files:]:
+            path.unlink(missing_ok=True)
+
+    def list(self):
+        """Stored profiles, newest first."""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob('*.folded'), reverse=True)
+
+    def path(self, name):
+        if not self.NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.exists() else None
+
+
+def should_profile(request):
+    if request.headers.get('X-Profile') == '1':
+        user = getattr(request, 'user', None)
+        if getattr(user, 'is_superuser', False):
+            return True
+    return any(pattern.search(request.path) for pattern in url_patterns())
+
+
+_patterns = None
+
+
+def url_patterns():
+    global _patterns
+    if _patterns is None:
+        _patterns = [re.compile(p) for p in getattr(settings, 'PROFILE_URL_PATTERNS', ())]
+    return _patterns
+
+
+def profile_request(request, get_response):
+    profiler = SamplingProfiler(interval=getattr(settings, 'PROFILE_INTERVAL_MS', 5) / 1000)
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        return get_response(request)
+    finally:
+        profiler.stop()
+        save_profile(request, profiler, time.perf_counter() - start)
+
+
+async def aprofile_request(request, get_response):
+    """
+    ``profile_request()`` under ASGI. This samples the event loop thread, so
+    other requests running at the same time show up in the profile too.
+    """
+    profiler = SamplingProfiler(interval=getattr(settings, 'PROFILE_INTERVAL_MS', 5) / 1000)
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        return await get_response(request)
+    finally:
+        profiler.stop()
+        await sync_to_async(save_profile, thread_sensitive=False)(
+            request, profiler, time.perf_counter() - start,
+        )
+
+
+def save_profile(request, profiler, elapsed):
+    if profiler.samples:
+        ProfileStore().save(f'{request.method}-{request.path}', profiler.collapsed(), elapsed)
@@ -0,0 +1,172 @@
+"""
+Slow-query log and duplicate-query detector.
+
+``QueryAuditor`` is a ``connection.execute_wrapper`` that, for one request
+(QueryAuditMiddleware, when ``QUERY_AUDIT_ENABLED=1`` is set in the environment):
+
+- logs every query slower than ``SLOW_QUERY_MS`` with the view and the first
+  project stack frame that issued it;
+- groups queries by SQL shape (placeholders, with IN lists collapsed) and
+  flags shapes run more than ``DUPLICATE_QUERY_THRESHOLD`` times, which is
+  what an N+1 looks like;
+- in strict mode (``QUERY_AUDIT_STRICT``, on under ``manage.py test``) raises
+  ``QueryBudgetExceeded`` instead of only logging.
+
+Tests can also set explicit budgets around a block with ``query_budget()``.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('api.db')
+
+PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+# With the separator, so /srv/app doesn't claim /srv/app-scripts
+PROJECT_PREFIX = PROJECT_ROOT + os.sep
+# Instrumentation frames sit between the view and the query; skip them
+INSTRUMENTATION_FILES = {
+    str(Path(__file__).resolve().with_name(name))
+    for name in ('querylog.py', 'metrics.py', 'middleware.py')
+}
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more (or more repeated) queries than its budget allows."""
+
+
+def sql_shape(sql):
+    shape = IN_LIST.sub('IN (...)', sql)
+    shape = NUMBER.sub('?', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def origin_frame():
+    """``path:line in function`` of the innermost project frame that isn't instrumentation."""
+    frame = sys._getframe(3)  # skip record() and __call__
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(PROJECT_PREFIX)
+            and filename not in INSTRUMENTATION_FILES
+            and 'site-packages' not in filename
+        ):
+            path = filename[len(PROJECT_PREFIX):]
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryAuditor:
+
+    def __init__(self, view=None, slow_ms=None, duplicate_threshold=None,
+                 max_queries=None, strict=None):
+        self.view = view or 'unknown'
+        self.slow_ms = _setting('SLOW_QUERY_MS', 100) if slow_ms is None else slow_ms
+        self.duplicate_threshold = (
+            _setting('DUPLICATE_QUERY_THRESHOLD', 5)
+            if duplicate_threshold is None else duplicate_threshold
+        )
+        self.max_queries = (
+            _setting('QUERY_BUDGET_PER_REQUEST', None) if max_queries is None else max_queries
+        )
+        self.strict = _setting('QUERY_AUDIT_STRICT', False) if strict is None else strict
+        self.count = 0
+        self.shapes = {}  # shape -> [count, origin of first run]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            try:
+                self.record(sql, (time.perf_counter() - start) * 1000)
+            except Exception:
+                # Auditing must never fail (or mask the error of) the query it watches
+                logger.exception('query audit failed', extra={'view': self.view})
+
+    def record(self, sql, elapsed_ms):
+        self.count += 1
+
+        shape = sql_shape(sql)
+        seen = self.shapes.get(shape)
+        if seen is None:
+            self.shapes[shape] = [1, origin_frame()]
+        else:
+            seen[0] += 1
+
+        if elapsed_ms >= self.slow_ms:
+            logger.warning('slow query', extra={
+                'view': self.view,
+                'duration_ms': round(elapsed_ms, 2),
+                'sql': sql,
+                'origin': origin_frame(),
+            })
+
+    @contextmanager
+    def watching(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def duplicates(self):
+        return [
+            (shape, count, origin)
+            for shape, (count, origin) in self.shapes.items()
+            if count > self.duplicate_threshold
+        ]
+
+    def finish(self):
+        """Log (or in strict mode raise) anything over budget."""
+        problems = []
+        for shape, count, origin in self.duplicates():
+            logger.warning('duplicate query', extra={
+                'view': self.view, 'count': count, 'sql': shape, 'origin': origin,
+            })
+            problems.append(f'{count}x from {origin}: {shape}')
+        if self.max_queries is not None and self.count > self.max_queries:
+            logger.warning('query budget exceeded', extra={
+                'view': self.view, 'count': self.count, 'budget': self.max_queries,
+            })
+            problems.insert(0, f'{self.count} queries (budget {self.max_queries})')
+
+        if problems and self.strict:
+            raise QueryBudgetExceeded(
+                f'{self.view} exceeded its query budget:\n  ' + '\n  '.join(problems)
+            )
+
+
+@contextmanager
+def query_budget(max_queries=None, duplicate_threshold=None, view='test'):
+    """
+    Fail if the block runs more than ``max_queries`` queries or repeats one
+    SQL shape more than ``duplicate_threshold`` times::
+
+        with query_budget(max_queries=4, duplicate_threshold=1):
+            client.get('/api/operator/bookings/', **headers)
+    """
+    auditor = QueryAuditor(
+        view=view,
+        max_queries=max_queries,
+        duplicate_threshold=duplicate_threshold,
+        strict=True,
+    )
+    with auditor.watching():
+        yield auditor
+    auditor.finish()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
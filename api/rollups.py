@@ -0,0 +1,294 @@
+"""
+Daily analytics rollups for the admin dashboard.
+
+``DailyOperatorStats`` holds per-operator, per-day counters. Signals bump
+them with F-expressions as Requests, Bookings, Payments and Feedback are
+written, and the dashboard reads these rows instead of aggregating raw tables.
+``rebuild()`` recomputes everything from the raw tables, archives included,
+in chunked passes.
+
+Buckets are chosen so a rebuild reproduces the incremental numbers:
+requests by creation day, bookings by creation and completion day, payments
+by payment day and ratings by feedback day.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import (
+    DailyOperatorStats, Request, Booking, Payment, Feedback,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment
+)
+
+
+REQUEST_ACCEPTED = 1
+REQUEST_REJECTED = 2
+REQUEST_COMPLETED = 3
+BOOKING_COMPLETED = 2
+PAYMENT_COMPLETED = 1
+
+
+def local_date(value):
+    return timezone.localdate(value) if value else timezone.localdate()
+
+
+def bump(day, operator_id, **deltas):
+    """Add ``deltas`` to the (day, operator) row, creating it if needed."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    rows = DailyOperatorStats.objects.filter(date=day, operator_id=operator_id)
+    # One transaction (BEGIN IMMEDIATE on SQLite), so two first writes of a
+    # day don't both miss the update and both create
+    with transaction.atomic():
+        if rows.update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                DailyOperatorStats.objects.create(date=day, operator_id=operator_id, **deltas)
+        except IntegrityError:
+            # Someone else created the row first (databases without IMMEDIATE)
+            rows.update(**updates)
+
+
+# ========== INCREMENTAL UPDATES ==========
+
+def request_deltas(req, old_status):
+    deltas = {}
+    if old_status is None:
+        deltas['requests_received'] = 1
+    if req.request_status != old_status:
+        if req.request_status == REQUEST_ACCEPTED:
+            deltas['requests_accepted'] = 1
+        elif req.request_status == REQUEST_REJECTED:
+            deltas['requests_rejected'] = 1
+    return deltas
+
+
+def record_request(req, old_status):
+    bump(local_date(req.created_at), req.operator_id, **request_deltas(req, old_status))
+
+
+def record_booking(booking, old_status, request_created_at=None):
+    if old_status is None:
+        if request_created_at is None:
+            request_created_at = Request.objects.filter(
+                pk=booking.request_id
+            ).values_list('created_at', flat=True).first()
+        bump(
+            local_date(booking.created_at),
+            booking.operator_id,
+            bookings_created=1,
+            request_to_booking_seconds=seconds_between(request_created_at, booking.created_at),
+        )
+    if booking.booking_status == BOOKING_COMPLETED and old_status != BOOKING_COMPLETED:
+        completed_at = booking.completed_at or timezone.now()
+        bump(
+            local_date(completed_at),
+            booking.operator_id,
+            bookings_completed=1,
+            booking_to_completion_seconds=seconds_between(booking.created_at, completed_at),
+        )
+
+
+def record_payment(payment, old_status):
+    if payment.payment_status == PAYMENT_COMPLETED and old_status != PAYMENT_COMPLETED:
+        bump(
+            local_date(payment.created_at),
+            payment.operator_id,
+            revenue=payment.amount,
+            payments_completed=1,
+        )
+
+
+def record_feedback(feedback):
+    bump(
+        local_date(feedback.created_at),
+        feedback.operator_id,
+        rating_sum=feedback.rating,
+        rating_count=1,
+    )
+
+
+def seconds_between(start, end):
+    if not start or not end:
+        return 0
+    return max((end - start).total_seconds(), 0)
+
+
+# ========== REBUILD ==========
+
+def iterate_chunks(queryset, chunk_size):
+    """Walk ``queryset`` in primary key order, ``chunk_size`` rows at a time."""
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1]['pk']
+
+
+def chain_chunks(querysets, chunk_size):
+    for queryset in querysets:
+        yield from iterate_chunks(queryset, chunk_size)
+
+
+def rebuild(chunk_size=5000):
+    """Recompute every rollup row from the raw tables. Returns the row count."""
+    totals = defaultdict(lambda: defaultdict(float))
+
+    def add(day, operator_id, **deltas):
+        for field, value in deltas.items():
+            totals[(day, operator_id)][field] += value
+
+    # Archived history still counts, so every pass reads the hot and archive tables
+    requests = [
+        model.objects.values('pk', 'operator_id', 'request_status', 'created_at')
+        for model in (Request, ArchivedRequest)
+    ]
+    for rows in chain_chunks(requests, chunk_size):
+        for row in rows:
+            status = row['request_status']
+            add(
+                local_date(row['created_at']), row['operator_id'],
+                requests_received=1,
+                # A completed request was accepted on the way
+                requests_accepted=int(status in (REQUEST_ACCEPTED, REQUEST_COMPLETED)),
+                requests_rejected=int(status == REQUEST_REJECTED),
+            )
+
+    booking_fields = ('pk', 'operator_id', 'booking_status', 'created_at', 'completed_at')
+    bookings = [
+        Booking.objects.values(*booking_fields, requested_at=F('request__created_at')),
+        ArchivedBooking.objects.values(*booking_fields, 'requested_at'),
+    ]
+    for rows in chain_chunks(bookings, chunk_size):
+        for row in rows:
+            add(
+                local_date(row['created_at']), row['operator_id'],
+                bookings_created=1,
+                request_to_booking_seconds=seconds_between(
+                    row['requested_at'], row['created_at']
+                ),
+            )
+            if row['booking_status'] == BOOKING_COMPLETED and row['completed_at']:
+                add(
+                    local_date(row['completed_at']), row['operator_id'],
+                    bookings_completed=1,
+                    booking_to_completion_seconds=seconds_between(
+                        row['created_at'], row['completed_at']
+                    ),
+                )
+
+    payments = [
+        model.objects.filter(payment_status=PAYMENT_COMPLETED).values(
+            'pk', 'operator_id', 'amount', 'created_at'
+        )
+        for model in (Payment, ArchivedPayment)
+    ]
+    for rows in chain_chunks(payments, chunk_size):
+        for row in rows:
+            add(
+                local_date(row['created_at']), row['operator_id'],
+                revenue=row['amount'], payments_completed=1,
+            )
+
+    feedbacks = Feedback.objects.values('pk', 'operator_id', 'rating', 'created_at')
+    for rows in iterate_chunks(feedbacks, chunk_size):
+        for row in rows:
+            add(
+                local_date(row['created_at']), row['operator_id'],
+                rating_sum=row['rating'], rating_count=1,
+            )
+
+    float_fields = {'revenue', 'request_to_booking_seconds', 'booking_to_completion_seconds'}
+    objs = [
+        DailyOperatorStats(date=day, operator_id=operator_id, **{
+            field: value if field in float_fields else int(value)
+            for field, value in fields.items()
+        })
+        for (day, operator_id), fields in totals.items()
+    ]
+    with transaction.atomic():
+        DailyOperatorStats.objects.all().delete()
+        DailyOperatorStats.objects.bulk_create(objs, batch_size=chunk_size)
+    return len(objs)
+
+
+# ========== DASHBOARD ==========
+
+def daily_series(days=14):
+    """Totals per day for the last ``days`` days, oldest first, gaps filled."""
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = {
+        row['date']: row
+        for row in DailyOperatorStats.objects.filter(date__gte=start)
+        .values('date')
+        .annotate(
+            revenue=Sum('revenue'),
+            requests_received=Sum('requests_received'),
+            requests_accepted=Sum('requests_accepted'),
+            requests_rejected=Sum('requests_rejected'),
+            bookings_created=Sum('bookings_created'),
+            request_to_booking_seconds=Sum('request_to_booking_seconds'),
+            bookings_completed=Sum('bookings_completed'),
+            booking_to_completion_seconds=Sum('booking_to_completion_seconds'),
+            rating_sum=Sum('rating_sum'),
+            rating_count=Sum('rating_count'),
+        )
+    }
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day, {})
+        received = row.get('requests_received') or 0
+        bookings = row.get('bookings_created') or 0
+        completed = row.get('bookings_completed') or 0
+        ratings = row.get('rating_count') or 0
+        series.append({
+            'date': day,
+            'revenue': row.get('revenue') or 0,
+            'requests': received,
+            'acceptance_rate': ratio(row.get('requests_accepted'), received) * 100,
+            'rejection_rate': ratio(row.get('requests_rejected'), received) * 100,
+            'avg_minutes_to_booking': ratio(row.get('request_to_booking_seconds'), bookings) / 60,
+            'avg_minutes_to_completion': ratio(row.get('booking_to_completion_seconds'), completed) / 60,
+            'avg_rating': ratio(row.get('rating_sum'), ratings),
+        })
+
+    peak = max((point['revenue'] for point in series), default=0)
+    for point in series:
+        point['revenue_pct'] = ratio(point['revenue'], peak) * 100
+    return series
+
+
+def top_operators(days=30, limit=5):
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = list(
+        DailyOperatorStats.objects.filter(date__gte=since, operator__isnull=False)
+        .values('operator_id', 'operator__operator_name')
+        .annotate(
+            revenue=Sum('revenue'),
+            bookings_completed=Sum('bookings_completed'),
+            rating_sum=Sum('rating_sum'),
+            rating_count=Sum('rating_count'),
+        )
+        .order_by('-revenue')[:limit]
+    )
+    for row in rows:
+        row['avg_rating'] = ratio(row['rating_sum'], row['rating_count'])
+    return rows
+
+
+def ratio(numerator, denominator):
+    return (numerator or 0) / denominator if denominator else 0
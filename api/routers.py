@@ -0,0 +1,60 @@
+"""
+Read-replica routing.
+
+Writes always go to ``default``. Reads go to a replica only while
+``ReplicaRoutingMiddleware`` has marked the current request as replica-safe:
+a GET to a view with ``replica_reads = True`` or to an admin changelist,
+from a client that hasn't written recently. Everything else, including
+background threads and management commands, reads from ``default``.
+
+After a successful write, the client is pinned to ``default`` for
+``REPLICA_PIN_SECONDS`` so it reads its own writes while replicas catch up.
+The pin is stored in the cache, so every process sees it when the cache
+backend is shared.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+current_read_db = ContextVar('chargenow_read_db', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def pin_key(identity):
+    return f'db-pin:{identity}'
+
+
+def pin_to_primary(identity):
+    cache.set(pin_key(identity), 1, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(identity):
+    return cache.get(pin_key(identity)) is not None
+
+
+def choose_replica():
+    aliases = replica_aliases()
+    return random.choice(aliases) if aliases else None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return current_read_db.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by copying default, not by migrating
+        return db == 'default'
@@ -0,0 +1,346 @@
+"""
+Search index for the ChargeNow admin.
+
+Admin ``search_fields`` that cross joins (``request__user__user_name``) end up
+as ``LIKE '%q%'`` over several tables. Instead every searchable row keeps one
+flattened text document in a search index, kept in sync by signals, and the
+admin asks the index for the matching primary keys.
+"""
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from django.utils.text import smart_split, unescape_string_literal
+
+
+# Rows of every model share one index; the model is encoded in the low bits
+# of the rowid so single-row updates and deletes stay rowid lookups.
+MODEL_SLOTS = 32
+
+
+class SearchDocument:
+    """
+    Describe which (possibly joined) fields make up a model's document.
+    ``search_fields`` mirrors the ModelAdmin's: plain fields go into the
+    indexed text, ``=field`` ones stay exact (case-insensitive) lookups.
+    """
+
+    def __init__(self, label, slot, search_fields):
+        self.label = label
+        self.slot = slot
+        self.search_fields = search_fields
+        self.fields = tuple(field for field in search_fields if not field.startswith('='))
+        self.exact_fields = tuple(field[1:] for field in search_fields if field.startswith('='))
+
+    @property
+    def model(self):
+        return apps.get_model(self.label)
+
+    @property
+    def select_related(self):
+        return sorted({
+            field.rsplit('__', 1)[0] for field in self.fields if '__' in field
+        })
+
+    def text(self, obj):
+        values = []
+        for field in self.fields:
+            value = obj
+            for attr in field.split('__'):
+                value = getattr(value, attr, None)
+                if value is None:
+                    break
+            if value not in (None, ''):
+                values.append(str(value))
+        return ' '.join(values)
+
+    def touches(self, update_fields):
+        """Whether a save limited to ``update_fields`` can change this document."""
+        if update_fields is None:
+            return True
+        return any(field.split('__', 1)[0] in update_fields for field in self.fields)
+
+    def dependencies(self):
+        """
+        Yield ``(model, lookup)`` pairs for joined fields, e.g. ``(User,
+        'request__user')`` for ``request__user__user_name`` on Booking.
+        """
+        for field in self.fields:
+            if '__' not in field:
+                continue
+            path = field.rsplit('__', 1)[0]
+            model = self.model
+            for attr in path.split('__'):
+                model = model._meta.get_field(attr).related_model
+            yield model, path, field.rsplit('__', 1)[1]
+
+
+DOCUMENTS = [
+    SearchDocument('api.User', 1, ('user_name', '=user_email')),
+    SearchDocument('api.VanOperator', 2, (
+        'operator_name', 'operator_email', 'operator_phone', 'operator_license',
+    )),
+    SearchDocument('api.ChargingVan', 3, ('van_number', 'operator__operator_name')),
+    SearchDocument('api.Request', 4, ('user__user_name', 'operator__operator_name')),
+    SearchDocument('api.Booking', 5, (
+        'request__user__user_name', 'operator__operator_name',
+    )),
+    SearchDocument('api.Payment', 6, ('user__user_name', 'operator__operator_name')),
+    SearchDocument('api.Feedback', 7, ('user__user_name', 'operator__operator_name')),
+]
+
+
+def get_document(model):
+    label = model._meta.label
+    for document in DOCUMENTS:
+        if document.label == label:
+            return document
+    return None
+
+
+# ========== BACKENDS ==========
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def update(self, document, pk, text):
+        raise NotImplementedError
+
+    def delete(self, document, pk):
+        raise NotImplementedError
+
+    def clear(self, document):
+        raise NotImplementedError
+
+    def filter(self, queryset, document, terms):
+        """
+        Return ``queryset`` narrowed to rows matching every term, or None to
+        let the admin fall back to its default ``LIKE`` search.
+        """
+        raise NotImplementedError
+
+
+class NullSearchBackend(BaseSearchBackend):
+    """Keep no index; the admin uses Django's default search."""
+
+    def update(self, document, pk, text):
+        pass
+
+    def delete(self, document, pk):
+        pass
+
+    def clear(self, document):
+        pass
+
+    def filter(self, queryset, document, terms):
+        return None
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    FTS5 virtual table with the trigram tokenizer, so a term matches
+    anywhere inside a word just like ``icontains`` does. Terms shorter than
+    three characters can't use trigrams and fall back to the default search.
+    """
+
+    table = 'search_index'
+    min_term_length = 3
+
+    def __init__(self, using='default'):
+        self.using = using
+        self._available = {}  # alias -> whether it has the index table
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_available(self, using=None):
+        using = using or self.using
+        if using not in self._available:
+            connection = connections[using]
+            self._available[using] = (
+                connection.vendor == 'sqlite' and self.table in connection.introspection.table_names()
+            )
+        return self._available[using]
+
+    def rowid(self, document, pk):
+        return int(pk) * MODEL_SLOTS + document.slot
+
+    def update(self, document, pk, text):
+        if not self.is_available():
+            return
+        rowid = self.rowid(document, pk)
+        # Atomic, or two concurrent saves of one row can both delete, then both
+        # insert. Inside a caller's transaction that one is enough.
+        with transaction.atomic(using=self.using, savepoint=False), self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, content) VALUES (%s, %s)',
+                [rowid, text],
+            )
+
+    def delete(self, document, pk):
+        if not self.is_available():
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [self.rowid(document, pk)],
+            )
+
+    def clear(self, document):
+        if not self.is_available():
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid %% {MODEL_SLOTS} = %s',
+                [document.slot],
+            )
+
+    def filter(self, queryset, document, terms):
+        # Replicas are copies of the same SQLite file, index included, so the
+        # subquery runs wherever the queryset is routed
+        if not self.is_available(queryset.db):
+            return None
+        if not terms or any(len(term) < self.min_term_length for term in terms):
+            return None
+
+        if not document.exact_fields:
+            return queryset.filter(pk__in=self.matching(document, terms))
+        # Like the admin: every term must match the text or one of the exact fields
+        for term in terms:
+            condition = Q(pk__in=self.matching(document, [term]))
+            for field in document.exact_fields:
+                condition |= Q(**{f'{field}__iexact': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def matching(self, document, terms):
+        """Subquery of the primary keys whose text contains every term."""
+        match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+        return RawSQL(
+            f'SELECT rowid / {MODEL_SLOTS} FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid %% {MODEL_SLOTS} = %s',
+            [match, document.slot],
+        )
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_INDEX_BACKEND', 'api.search.NullSearchBackend')
+        _backend = import_string(path)()
+    return _backend
+
+
+# ========== INDEXING ==========
+
+def split_terms(search_term):
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            terms.append(bit)
+    return terms
+
+
+def index_instance(instance):
+    document = get_document(type(instance))
+    if document:
+        get_backend().update(document, instance.pk, document.text(instance))
+
+
+def unindex_instance(instance):
+    document = get_document(type(instance))
+    if document:
+        get_backend().delete(document, instance.pk)
+
+
+def reindex_queryset(document, queryset, chunk_size=1000):
+    backend = get_backend()
+    count = 0
+    queryset = queryset.select_related(*document.select_related).order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:chunk_size])
+        if not batch:
+            return count
+        # One transaction per chunk rather than one per row
+        with transaction.atomic():
+            for obj in batch:
+                backend.update(document, obj.pk, document.text(obj))
+        count += len(batch)
+        last_pk = batch[-1].pk
+
+
+@lru_cache(maxsize=None)
+def embedded_fields(model):
+    """Fields of ``model`` that other documents embed, e.g. ``user_name`` of User."""
+    return frozenset(
+        attr
+        for document in DOCUMENTS
+        for dependency, lookup, attr in document.dependencies()
+        if issubclass(model, dependency)
+    )
+
+
+def changed_embedded_fields(instance, update_fields=None):
+    """
+    Embedded fields that this save of ``instance`` changed, compared with the
+    ``_loaded_<field>`` values set in the model's ``from_db``. Rows that
+    weren't loaded from the database count as changed. The saved values are
+    remembered for the next save.
+    """
+    changed = []
+    for attr in sorted(embedded_fields(type(instance))):
+        if update_fields is not None and attr not in update_fields:
+            continue
+        value = getattr(instance, attr)
+        if getattr(instance, f'_loaded_{attr}', None) != value:
+            changed.append(attr)
+        setattr(instance, f'_loaded_{attr}', value)
+    return changed
+
+
+def reindex_dependents(label, pk, fields, chunk_size=1000):
+    """Refresh documents that embed one of ``fields`` of row ``pk`` (e.g. a renamed user)."""
+    model = apps.get_model(label)
+    count = 0
+    for document in DOCUMENTS:
+        lookups = {
+            lookup for dependency, lookup, attr in document.dependencies()
+            if issubclass(model, dependency) and attr in fields
+        }
+        for lookup in sorted(lookups):
+            queryset = document.model._default_manager.filter(**{lookup: pk})
+            count += reindex_queryset(document, queryset, chunk_size)
+    return count
+
+
+def rebuild(chunk_size=1000):
+    """Drop and rebuild every document; returns ``{label: rows indexed}``."""
+    backend = get_backend()
+    counts = {}
+    for document in DOCUMENTS:
+        backend.clear(document)
+        counts[document.label] = reindex_queryset(
+            document, document.model._default_manager.all(), chunk_size
+        )
+    return counts
+
+
+def search_queryset(queryset, search_term):
+    """Return ``queryset`` filtered through the index, or None when it can't help."""
+    document = get_document(queryset.model)
+    if document is None:
+        return None
+    return get_backend().filter(queryset, document, split_terms(search_term))
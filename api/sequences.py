@@ -0,0 +1,95 @@
+"""
+Block-allocated ids for primary keys that are not auto-increment.
+
+``Booking.booking_id`` is a plain ``IntegerField`` primary key. Computing
+``max() + 1`` on every insert makes all writers read the same aggregate,
+and two concurrent inserts can still get the same value. Instead, each
+sequence has a row in ``id_sequence``. ``reserve()`` bumps that row to claim
+a range of ids. ``BlockAllocator`` reserves ``block_size`` ids at a time
+and, once the reservation has committed, hands them out from memory. The table
+is therefore touched once per block, not once per booking.
+
+Ids are unique, but they are not gap-free and only increase within one
+process. A block left over when a worker restarts is simply never used.
+"""
+import os
+import threading
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import IdSequence, Booking, ArchivedBooking
+
+
+# Existing rows a new sequence must start after
+SEEDS = {
+    'booking': [(Booking, 'booking_id'), (ArchivedBooking, 'booking_id')],
+}
+
+
+def _seed(name):
+    highest = 0
+    for model, field in SEEDS.get(name, []):
+        highest = max(highest, model.objects.aggregate(top=Max(field))['top'] or 0)
+    return highest + 1
+
+
+def reserve(name, count=1):
+    """
+    Reserve ``count`` consecutive ids from sequence ``name``; returns the first.
+
+    The reservation commits or rolls back with the caller's transaction, so
+    it is safe inside ``atomic()`` as long as the ids are only used there.
+    """
+    with transaction.atomic():
+        sequence = IdSequence.objects.select_for_update().filter(name=name).first()
+        if sequence is None:
+            IdSequence.objects.get_or_create(name=name, defaults={'next_value': _seed(name)})
+            sequence = IdSequence.objects.select_for_update().get(name=name)
+        first = sequence.next_value
+        sequence.next_value = first + count
+        sequence.save(update_fields=['next_value'])
+    return first
+
+
+class BlockAllocator:
+    """Thread-safe id source for one sequence, refilled a block at a time."""
+
+    def __init__(self, name, block_size=20):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self.reset()
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        # A forked worker must not hand out the parent's remaining ids
+        self._next = self._end = 0
+
+    def next(self):
+        with self._lock:
+            if self._next < self._end:
+                value = self._next
+                self._next += 1
+                return value
+            if not transaction.get_connection().in_atomic_block:
+                # Commit the reservation before caching it
+                with transaction.atomic():
+                    self._next = reserve(self.name, self.block_size)
+                self._end = self._next + self.block_size
+                value = self._next
+                self._next += 1
+                return value
+
+        # Inside the caller's transaction the reservation rolls back with it,
+        # so the rest of the block is only cached once that commits. Reserved
+        # without the lock: the caller's transaction may hold the database
+        # lock another thread is waiting for.
+        first = reserve(self.name, self.block_size)
+        transaction.on_commit(lambda: self._refill(first + 1, first + self.block_size))
+        return first
+
+    def _refill(self, start, end):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = start, end
@@ -2,7 +2,11 @@
 Serializers for ChargeNow API.
 """
 from rest_framework import serializers
-from .models import User, VanOperator, UserVehicle, ChargingVan, Request, Booking, Payment, Feedback
+from .models import (
+    User, VanOperator, UserVehicle, ChargingVan, Request, Booking, Payment, Feedback,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment
+)
+from .uploads import validate_license
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,11 +26,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 class VanOperatorSerializer(serializers.ModelSerializer):
     """Serializer for Van Operator model"""
+    average_rating = serializers.FloatField(read_only=True)
+
     class Meta:
         model = VanOperator
         fields = ['operator_id', 'operator_name', 'operator_email', 'operator_phone', 
-                  'operator_license', 'operator_status', 'role','is_verified','created_at']
-        read_only_fields = ['operator_id', 'created_at']
+                  'operator_license', 'operator_status', 'role','is_verified','created_at',
+                  'average_rating', 'rating_count', 'completed_bookings', 'total_earnings']
+        read_only_fields = ['operator_id', 'created_at', 'rating_count',
+                            'completed_bookings', 'total_earnings']
 
 
 # class VanOperatorRegistrationSerializer(serializers.ModelSerializer):
@@ -40,17 +48,9 @@ class VanOperatorSerializer(serializers.ModelSerializer):
 class VanOperatorRegistrationSerializer(serializers.ModelSerializer):
     operator_license = serializers.FileField()
 
-    def validate_operator_license_doc(self, file):
-        allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png']
-
-        if not file.name.lower().endswith(tuple(allowed_extensions)):
-            raise serializers.ValidationError(
-                "Only PDF or image files (JPG, JPEG, PNG) are allowed"
-            )
-
-        if file.size > 5 * 1024 * 1024:
-            raise serializers.ValidationError("File size must be under 5MB")
-
+    def validate_operator_license(self, file):
+        # Checks the size and the file's leading bytes, not just its name
+        validate_license(file)
         return file
 
 
@@ -314,4 +314,78 @@ class FeedbackSerializer(serializers.ModelSerializer):
 class LoginSerializer(serializers.Serializer):
     """Serializer for login request"""
     email = serializers.EmailField()
-    password = serializers.CharField()
\ No newline at end of file
+    password = serializers.CharField()
+
+
+# ========== ARCHIVED HISTORY ==========
+# Same output as the live serializers, plus "archived": true
+
+class ArchivedRequestSerializer(serializers.ModelSerializer):
+    user_name = serializers.CharField(source='user.user_name', read_only=True)
+    operator_name = serializers.CharField(source='operator.operator_name', read_only=True)
+    vehicle_number = serializers.CharField(source='vehicle.vehicle_number', read_only=True)
+    vehicle_name = serializers.CharField(source='vehicle.vehicle_name', read_only=True)
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = ArchivedRequest
+        fields = [
+            'request_id',
+            'user_name',
+            'operator_name',
+            'vehicle_name',
+            'vehicle_number',
+            'user_latitude',
+            'user_longitude',
+            'amount',
+            'request_status',
+            'created_at',
+            'archived',
+        ]
+
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    operator_name = serializers.CharField(source='operator.operator_name', read_only=True)
+    user_name = serializers.CharField(source='user.user_name', read_only=True)
+    vehicle_name = serializers.CharField(source='vehicle.vehicle_name', read_only=True)
+    vehicle_number = serializers.CharField(source='vehicle.vehicle_number', read_only=True)
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = ArchivedBooking
+        fields = [
+            'booking_id',
+            'request_id',
+            'operator',
+            'operator_name',
+            'user_name',
+            'vehicle_name',
+            'vehicle_number',
+            'booking_status',
+            'created_at',
+            'archived',
+        ]
+
+
+class ArchivedPaymentSerializer(serializers.ModelSerializer):
+    user_name = serializers.CharField(source='user.user_name', read_only=True)
+    operator_name = serializers.CharField(source='operator.operator_name', read_only=True)
+    booking = serializers.IntegerField(source='booking_id', read_only=True)
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = ArchivedPayment
+        fields = [
+            'payment_id',
+            'booking',
+            'booking_id',
+            'user',
+            'user_name',
+            'operator',
+            'operator_name',
+            'amount',
+            'payment_method',
+            'payment_status',
+            'created_at',
+            'archived',
+        ]
@@ -0,0 +1,235 @@
+"""
+Signal receivers for ChargeNow models.
+Keeps derived data (the admin search index, facet counts, analytics
+rollups, operator stats, cached operator lookups and archived history) in
+sync with writes, and
+sends status notifications and operator inbox updates.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import search, rollups, operator_stats, operator_cache, notifications, storage, tasks, websocket
+from .admin_filters import invalidate_facets
+from .transitions import transitioned
+from .models import (
+    User, VanOperator, ChargingVan, UserVehicle, Request, Booking, Payment, Feedback,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment
+)
+
+
+# ========== SEARCH INDEX ==========
+
+@receiver(post_save)
+def update_search_index(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    document = search.get_document(sender)
+    if raw or document is None:
+        return
+    if document.touches(update_fields):
+        search.index_instance(instance)
+    # Rows embedding this one (a renamed user's bookings, ...) can be many,
+    # so they are refreshed by a job, and only when an embedded field changed
+    fields = search.changed_embedded_fields(instance, update_fields)
+    if fields and not created:
+        tasks.reindex_search_dependents.delay(sender._meta.label, instance.pk, fields)
+
+
+@receiver(post_delete)
+def remove_from_search_index(sender, instance, **kwargs):
+    if search.get_document(sender) is None:
+        return
+    search.unindex_instance(instance)
+
+
+# ========== ADMIN FACETS ==========
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_facets(sender, instance, created=True, **kwargs):
+    if created:
+        invalidate_facets(User, 'registered', 'vehicles', 'activity')
+
+
+@receiver(post_save, sender=UserVehicle)
+@receiver(post_delete, sender=UserVehicle)
+def invalidate_vehicle_facets(sender, instance, created=True, **kwargs):
+    if created:
+        invalidate_facets(User, 'vehicles')
+
+
+# ========== STATUS TRANSITIONS (ROLLUPS + OPERATOR STATS) ==========
+
+STATUS_FIELDS = {
+    Request: 'request_status',
+    Booking: 'booking_status',
+    Payment: 'payment_status',
+}
+
+
+def previous_status(sender, instance, created):
+    """Status the row had before this save (None for new rows)."""
+    if created:
+        return None
+    return getattr(instance, '_loaded_status', getattr(instance, STATUS_FIELDS[sender]))
+
+
+def remember_status(sender, instance):
+    instance._loaded_status = getattr(instance, STATUS_FIELDS[sender])
+
+
+@receiver(post_save, sender=Request)
+def request_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.record_request(instance, previous_status(sender, instance, created))
+    remember_status(sender, instance)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_status = previous_status(sender, instance, created)
+    request_created_at = None
+    if Booking.request.is_cached(instance):
+        request_created_at = instance.request.created_at
+    rollups.record_booking(instance, old_status, request_created_at)
+    operator_stats.record_booking(instance, old_status)
+    remember_status(sender, instance)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_status = previous_status(sender, instance, created)
+    rollups.record_payment(instance, old_status)
+    operator_stats.record_payment(instance, old_status)
+    remember_status(sender, instance)
+
+
+@receiver(post_save, sender=Feedback)
+def feedback_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    rollups.record_feedback(instance)
+    operator_stats.record_feedback(instance)
+
+
+# Lifecycle transitions (api/transitions.py) are UPDATEs, so post_save never
+# sees them. Any source status will do as the old one: the recorders only
+# check that the status changed and what it changed to.
+
+@receiver(transitioned, sender=Request)
+def request_transitioned(sender, instance, sources, **kwargs):
+    rollups.record_request(instance, sources[0])
+
+
+@receiver(transitioned, sender=Booking)
+def booking_transitioned(sender, instance, sources, **kwargs):
+    rollups.record_booking(instance, sources[0])
+    operator_stats.record_booking(instance, sources[0])
+
+
+# Deletes only touch the operator totals; the daily rollups keep history.
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    operator_stats.forget_booking(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    operator_stats.forget_payment(instance)
+
+
+@receiver(post_delete, sender=Feedback)
+def feedback_deleted(sender, instance, **kwargs):
+    operator_stats.record_feedback(instance, sign=-1)
+
+
+# ========== ARCHIVE ==========
+# Archive tables have no FK constraints, so mirror the hot tables' CASCADE.
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    for model in (ArchivedRequest, ArchivedBooking, ArchivedPayment):
+        model.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=VanOperator)
+def operator_deleted(sender, instance, **kwargs):
+    for model in (ArchivedRequest, ArchivedBooking, ArchivedPayment):
+        model.objects.filter(operator_id=instance.pk).delete()
+
+
+# ========== OPERATOR CACHE ==========
+# Cached operator and van lookups (api/operator_cache.py)
+
+@receiver(post_save, sender=VanOperator)
+@receiver(post_delete, sender=VanOperator)
+def uncache_operator(sender, instance, **kwargs):
+    operator_cache.forget_operator(instance.pk)
+    # A delete unassigns the van with an UPDATE, which sends no signal
+    if 'created' not in kwargs:
+        operator_cache.forget_van(instance.pk)
+
+
+@receiver(post_save, sender=ChargingVan)
+@receiver(post_delete, sender=ChargingVan)
+def uncache_van(sender, instance, **kwargs):
+    operator_cache.forget_van(instance.operator_id, getattr(instance, '_loaded_operator_id', None))
+    instance._loaded_operator_id = instance.operator_id
+
+
+# ========== OPERATOR DOCUMENTS ==========
+# Documents are shared between rows with the same content (api/storage.py),
+# so a file is only deleted once nothing uses it.
+
+@receiver(post_save, sender=VanOperator)
+def operator_document_saved(sender, instance, created, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_license', None)
+    loaded = getattr(loaded, 'name', loaded)
+    if not created and loaded and loaded != instance.operator_license.name:
+        storage.release(loaded)
+    instance._loaded_license = instance.operator_license.name
+
+
+@receiver(post_delete, sender=VanOperator)
+def operator_document_deleted(sender, instance, **kwargs):
+    storage.release(instance.operator_license.name)
+    if instance.license_preview:
+        # Named after the operator, so never shared
+        name = instance.license_preview.name
+        transaction.on_commit(lambda: instance.license_preview.storage.delete(name))
+
+
+# ========== NOTIFICATIONS ==========
+# Delivered after commit by api/notifications.py. Status changes made in the
+# admin are not announced.
+
+@receiver(post_save, sender=Request)
+def request_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notifications.notify(instance, 'created')
+
+
+@receiver(transitioned)
+def notify_transition(sender, action, instance, **kwargs):
+    notifications.notify(instance, action)
+
+
+# ========== OPERATOR INBOX ==========
+# Open /ws/operator/requests/ sockets (api/websocket.py) reload the row.
+# Unlike notifications, admin edits are included.
+
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+def request_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        websocket.request_changed(instance.operator_id, instance.pk)
+
+
+@receiver(transitioned, sender=Request)
+def request_transitioned_inbox(sender, instance, **kwargs):
+    websocket.request_changed(instance.operator_id, instance.pk)
@@ -0,0 +1,237 @@
+"""
+Static files for the admin.
+
+``collectstatic`` (with CompressedManifestStaticFilesStorage) gives every
+file a content hash in its name, e.g. admin/css/custom_admin.3b9f1c2a.css.
+It also writes ``.gz`` and, when the ``brotli`` package is installed,
+``.br`` copies beside the compressible ones.
+
+StaticFilesMiddleware (api/middleware.py) then serves STATIC_ROOT itself:
+
+- It picks the precompressed copy that matches the request's
+  Accept-Encoding.
+- Hashed names never change content, so they are cached for a year
+  (``immutable``). Other names get STATIC_MAX_AGE.
+- ETag/Last-Modified let a browser revalidate cheaply.
+- A new collectstatic (a rewritten manifest) is picked up without a
+  restart.
+
+With DEBUG on, files come from the finders (static/ and the apps) instead,
+uncached, so edits show without collectstatic.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+import stat as stat_module
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip copies are made
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+)
+MIN_COMPRESS_SIZE = 256
+ONE_YEAR = 365 * 24 * 3600
+
+# Suffix -> Content-Encoding, in order of preference
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+def compress(path):
+    """Write ``path``.gz (and .br) if that saves anything; returns the files written."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    written = []
+    for suffix, compressed in variants:
+        # Not worth a Content-Encoding for less than 5%
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Fingerprinted names, plus gzip/brotli copies written at collectstatic."""
+
+    def stored_name(self, name):
+        # jazzmin's theme switcher asks for {% static 'vendor/bootswatch' %},
+        # a directory, which has no manifest entry; use the plain URL for it
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.exists(name) and not os.path.isfile(self.path(name)):
+                return name
+            raise
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.lower().endswith(COMPRESSIBLE) and self.size(name) >= MIN_COMPRESS_SIZE:
+                compress(self.path(name))
+
+
+class StaticFile:
+
+    def __init__(self, path, url_path, immutable):
+        self.path = path
+        self.content_type = mimetypes.guess_type(url_path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.immutable = immutable
+        # Content-Encoding -> (path, stat) of the file sent for it; None is the original
+        self.variants = {None: (path, os.stat(path))}
+        for suffix, encoding in ENCODINGS:
+            try:
+                self.variants[encoding] = (path + suffix, os.stat(path + suffix))
+            except FileNotFoundError:
+                pass
+
+    def changed(self):
+        """Whether the original file was replaced or removed since it was found."""
+        _, cached = self.variants[None]
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (current.st_mtime_ns, current.st_size) != (cached.st_mtime_ns, cached.st_size)
+
+    def choose(self, accept_encoding):
+        for _, encoding in ENCODINGS:
+            if encoding in self.variants and encoding in accept_encoding:
+                return encoding
+        return None
+
+
+class StaticFiles:
+    """Finds and serves files under STATIC_URL; ``serve()`` returns None for anything else."""
+
+    def __init__(self):
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        self.debug = settings.DEBUG
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        self.files = {}  # url path -> StaticFile, found files only
+        self.manifest_mtime = None
+        self.hashed = self.load_manifest()
+
+    def manifest_path(self):
+        storage_class = settings.STORAGES['staticfiles']['BACKEND']
+        if self.root is None or 'Manifest' not in storage_class:
+            return None
+        return os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)
+
+    def load_manifest(self):
+        # Names in the manifest's values carry their content hash
+        path = self.manifest_path()
+        if path is None:
+            return set()
+        try:
+            self.manifest_mtime = os.stat(path).st_mtime_ns
+            with open(path, 'rb') as file:
+                return set(json.load(file).get('paths', {}).values())
+        except (FileNotFoundError, ValueError):
+            return set()
+
+    def reload_if_collected(self):
+        """Forget every cached file when collectstatic has rewritten the manifest."""
+        path = self.manifest_path()
+        if path is None:
+            return
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.manifest_mtime:
+            self.files = {}
+            self.manifest_mtime = None
+            self.hashed = self.load_manifest()
+
+    def find(self, name):
+        if self.debug:
+            path = finders.find(name)
+            return StaticFile(path, name, immutable=False) if path else None
+        self.reload_if_collected()
+        static_file = self.files.get(name)
+        if static_file is not None and not static_file.immutable and static_file.changed():
+            # Unhashed names can be overwritten in place; find them again
+            del self.files[name]
+            static_file = None
+        if static_file is None:
+            if self.root is None:
+                return None
+            try:
+                path = safe_join(self.root, name)
+                if not stat_module.S_ISREG(os.stat(path).st_mode):
+                    return None
+            except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError, ValueError):
+                return None
+            static_file = self.files[name] = StaticFile(path, name, immutable=name in self.hashed)
+        return static_file
+
+    def serve(self, request):
+        if not request.path.startswith(self.prefix) or request.method not in ('GET', 'HEAD'):
+            return None
+        name = posixpath.normpath(request.path[len(self.prefix):]).lstrip('/')
+        static_file = self.find(name)
+        if static_file is None:
+            return None
+        return self.response(request, static_file)
+
+    def cache_control(self, static_file):
+        if self.debug:
+            return 'no-cache'
+        if static_file.immutable:
+            return f'public, max-age={ONE_YEAR}, immutable'
+        return f'public, max-age={self.max_age}'
+
+    def response(self, request, static_file):
+        encoding = static_file.choose(request.headers.get('Accept-Encoding', ''))
+        path, stat = static_file.variants[encoding]
+        if self.debug:
+            stat = os.stat(path)
+        etag = quote_etag(f'{stat.st_size:x}-{int(stat.st_mtime):x}{"-" + encoding if encoding else ""}')
+        headers = {
+            'Content-Type': static_file.content_type,
+            'Cache-Control': self.cache_control(static_file),
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+        }
+        if len(static_file.variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if not_modified is not None:
+            for header in ('Cache-Control', 'Vary'):
+                if header in headers:
+                    not_modified[header] = headers[header]
+            return not_modified
+        if request.method == 'HEAD':
+            return HttpResponse(headers={**headers, 'Content-Length': str(stat.st_size)})
+        response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+        for header, value in headers.items():
+            response[header] = value
+        # FileResponse names the file; these are displayed, not downloaded
+        del response['Content-Disposition']
+        return response
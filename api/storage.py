@@ -0,0 +1,185 @@
+"""
+Content-addressed storage for operator documents.
+
+``VanOperator.operator_license`` files are stored under their SHA-256,
+sharded two levels deep:
+
+    operator_docs/3f/a2/3fa2...e1.pdf
+
+The same document uploaded twice is stored once, and every row that uses
+it points at the same name. There is no separate count to keep in step:
+a file's references are the rows naming it (``references()``).
+
+When a row is deleted or its document replaced, ``release()`` deletes the
+file after commit if nothing else uses it. Files written or re-uploaded
+within DOCUMENT_GC_GRACE_SECONDS are kept, because an upload of the same
+bytes may be about to reference them. ``sweep()`` (the daily
+``collect_documents`` job) removes what that leaves behind, plus orphaned
+previews. Files uploaded before this storage keep their names until
+``manage.py collect_documents --rehash`` moves them in.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+logger = logging.getLogger('api.storage')
+
+DOCUMENT_PREFIX = 'operator_docs/'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by the hash of their content."""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(); an existing
+        # file of that name already holds the same bytes
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+
+        # Hash while writing to a temp file, then move it into place
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            hexdigest = digest.hexdigest()
+            extension = posixpath.splitext(name)[1].lower()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.utime(full_path)  # restarts the grace period
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, full_path)
+                temp_path = None
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        if not is_hashed(name):
+            return
+        # Drop shard directories left empty
+        directory = os.path.dirname(self.path(name))
+        for _ in range(2):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    # Referenced from the model field (and migrations) instead of the instance
+    return document_storage
+
+
+# ========== REFERENCES ==========
+
+def references(name):
+    from .models import VanOperator
+
+    return VanOperator.objects.filter(operator_license=name).count()
+
+
+def recently_written(name):
+    try:
+        modified = os.path.getmtime(document_storage.path(name))
+    except FileNotFoundError:
+        return False
+    return time.time() - modified < settings.DOCUMENT_GC_GRACE_SECONDS
+
+
+def release(name):
+    """Delete ``name`` after commit if no row uses it any more."""
+    if name:
+        transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    if references(name) or recently_written(name):
+        return False
+    document_storage.delete(name)
+    return True
+
+
+def sweep(dry_run=False):
+    """Delete files under operator_docs/ that no row uses; returns the names."""
+    from .models import VanOperator
+
+    referenced = set()
+    for document, preview in VanOperator.objects.values_list('operator_license', 'license_preview').iterator():
+        referenced.update((document, preview))
+    root = document_storage.path(DOCUMENT_PREFIX)
+    deleted = []
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            name = posixpath.join(
+                DOCUMENT_PREFIX, os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/')
+            )
+            if name in referenced or recently_written(name):
+                continue
+            if not dry_run:
+                document_storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+def rehash(dry_run=False):
+    """
+    Move documents saved under their upload names into the hashed layout.
+    Returns ``{old name: new name}``; the old files are left for ``sweep()``.
+    """
+    from . import operator_cache
+    from .models import VanOperator
+
+    moved = {}
+    names = VanOperator.objects.exclude(operator_license='').values_list(
+        'operator_license', flat=True
+    ).distinct()
+    for name in list(names):
+        if is_hashed(name):
+            continue
+        try:
+            with document_storage.open(name, 'rb') as file:
+                new_name = name if dry_run else document_storage.save(name, file)
+        except FileNotFoundError:
+            logger.warning('document missing: %s', name)
+            continue
+        if not dry_run:
+            operators = VanOperator.objects.filter(operator_license=name)
+            operator_ids = list(operators.values_list('pk', flat=True))
+            operators.update(operator_license=new_name)
+            # update() sends no signal; cached profiles would keep the old URL
+            operator_cache.forget(*map(operator_cache.operator_key, operator_ids))
+        moved[name] = new_name
+    return moved
+
+
+def is_hashed(name):
+    parts = name.split('/')
+    digest = posixpath.splitext(parts[-1])[0]
+    return (
+        len(parts) >= 3 and len(digest) == 64
+        and parts[-3] == digest[:2] and parts[-2] == digest[2:4]
+    )
@@ -0,0 +1,48 @@
+"""
+Background tasks for ChargeNow (see api/jobs.py).
+
+The maintenance commands are registered here too, so ``JOB_SCHEDULE`` can
+run them from the worker instead of cron.
+"""
+from . import archive, idempotency, jobs, notifications, operator_stats, rollups, search, storage, uploads
+
+
+@jobs.task(name='archive_history', queue='maintenance', max_attempts=1)
+def archive_history():
+    return archive.archive()
+
+
+@jobs.task(name='prune_idempotency_keys', queue='maintenance')
+def prune_idempotency_keys():
+    return idempotency.prune()
+
+
+@jobs.task(name='rebuild_rollups', queue='maintenance', max_attempts=1)
+def rebuild_rollups():
+    return rollups.rebuild()
+
+
+@jobs.task(name='repair_operator_stats', queue='maintenance', max_attempts=1)
+def repair_operator_stats():
+    return operator_stats.repair()
+
+
+@jobs.task(name='collect_documents', queue='maintenance', max_attempts=1)
+def collect_documents():
+    return len(storage.sweep())
+
+
+@jobs.task(name='reindex_search_dependents')
+def reindex_search_dependents(label, pk, fields):
+    return search.reindex_dependents(label, pk, fields)
+
+
+@jobs.task(name='push_notifications', queue='notifications', max_attempts=5)
+def push_notifications(batch):
+    backend = notifications.get_push_backend()
+    return backend.send_batch(batch) if backend is not None else 0
+
+
+@jobs.task(name='license_preview')
+def license_preview(operator_id):
+    return uploads.generate_preview(operator_id)
@@ -0,0 +1,119 @@
+"""
+Test runner that bootstraps SQLite test databases from a cached snapshot.
+
+The first run migrates the test database as usual and saves a copy in
+``TEST_DB_SNAPSHOT_DIR``. The copy is keyed by a hash of every migration file
+and the Django version. Later runs restore that copy with SQLite's backup API
+instead of replaying the migrations. Any change to a migration changes the
+key, so a stale snapshot is never used.
+
+Enabled by ``TEST_RUNNER = "api.test_runner.SnapshotTestRunner"``. Set
+``TEST_DB_SNAPSHOTS=0`` to migrate from scratch.
+"""
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.test.runner import DiscoverRunner
+
+
+def migrations_hash():
+    """Fingerprint of every migration on disk, across all installed apps."""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    digest = hashlib.sha256(django.get_version().encode())
+    for key in sorted(loader.disk_migrations):
+        module = __import__(loader.disk_migrations[key].__module__, fromlist=['_'])
+        digest.update('.'.join(key).encode())
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def snapshot_path(alias, key=None):
+    directory = Path(getattr(settings, 'TEST_DB_SNAPSHOT_DIR', Path(settings.BASE_DIR) / '.test_db_snapshots'))
+    return directory / f'{alias}-{key or migrations_hash()}.sqlite3'
+
+
+def save_snapshot(connection, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Older snapshots for this alias belong to migrations that no longer exist
+    for stale in path.parent.glob(f'{connection.alias}-*.sqlite3'):
+        stale.unlink(missing_ok=True)
+    tmp = path.with_suffix('.tmp')
+    connection.ensure_connection()
+    target = sqlite3.connect(tmp)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+    os.replace(tmp, path)
+
+
+def restore_snapshot(connection, path):
+    connection.ensure_connection()
+    source = sqlite3.connect(path)
+    try:
+        source.backup(connection.connection)
+    finally:
+        source.close()
+
+
+def snapshot_create_test_db(creation, original):
+    """Wrap ``creation.create_test_db`` so it restores or records a snapshot."""
+    connection = creation.connection
+
+    def create_test_db(verbosity=1, autoclobber=False, serialize=True, keepdb=False):
+        if keepdb or connection.settings_dict['TEST'].get('MIGRATE') is False:
+            return original(verbosity, autoclobber, serialize, keepdb)
+
+        path = snapshot_path(connection.alias)
+        if not path.exists():
+            name = original(verbosity, autoclobber, serialize, keepdb)
+            save_snapshot(connection, path)
+            return name
+
+        test_database_name = creation._get_test_db_name()
+        if verbosity >= 1:
+            creation.log('Restoring test database for alias %s from %s...' % (
+                creation._get_database_display_str(verbosity, test_database_name), path.name,
+            ))
+        creation._create_test_db(verbosity, autoclobber, keepdb)
+
+        connection.close()
+        settings.DATABASES[connection.alias]['NAME'] = test_database_name
+        connection.settings_dict['NAME'] = test_database_name
+        restore_snapshot(connection, path)
+
+        if serialize:
+            connection._test_serialized_contents = creation.serialize_db_to_string()
+        call_command('createcachetable', database=connection.alias)
+        connection.ensure_connection()
+        return test_database_name
+
+    return create_test_db
+
+
+class SnapshotTestRunner(DiscoverRunner):
+
+    def setup_databases(self, **kwargs):
+        if os.getenv('TEST_DB_SNAPSHOTS', '1') == '0':
+            return super().setup_databases(**kwargs)
+
+        patched = []
+        for alias in connections:
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                continue
+            creation = connection.creation
+            creation.create_test_db = snapshot_create_test_db(creation, creation.create_test_db)
+            patched.append(creation)
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            for creation in patched:
+                del creation.create_test_db
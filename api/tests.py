@@ -0,0 +1,424 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from . import archive, jobs, operator_cache, storage
+from .authentication import generate_token
+from .models import Booking, ChargingVan, Job, Request, User, UserVehicle, VanOperator
+from .querylog import PROJECT_ROOT, QueryBudgetExceeded, query_budget
+from .sequences import BlockAllocator
+from .transitions import TransitionError, act_on_booking, act_on_request
+
+
+def create_parties():
+    """A user with a vehicle and an operator, for tests that need requests."""
+    user = User.objects.create(
+        user_name='Asha', user_email='asha@example.com', user_password='secret',
+        user_phone=9876543210, user_address='Ahmedabad',
+    )
+    operator = VanOperator.objects.create(
+        operator_name='Ravi', operator_email='ravi@example.com', operator_password='secret',
+        operator_phone=9123456780, operator_license='operator_docs/licence.pdf',
+    )
+    vehicle = UserVehicle.objects.create(
+        user=user, vehicle_company='Tata', vehicle_name='Nexon', vehicle_model='EV',
+        vehicle_number='GJ01AB1234',
+    )
+    return user, operator, vehicle
+
+
+def operator_auth(operator):
+    token = generate_token(operator.operator_id, operator.operator_email, 2, operator.operator_name)
+    return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            user_name='Asha', user_email='asha@example.com', user_password='secret',
+            user_phone=9876543210, user_address='Ahmedabad',
+        )
+
+    def test_too_many_queries_raise(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_queries=1):
+                User.objects.count()
+                User.objects.exists()
+
+    def test_repeated_query_shape_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '3x from api/tests.py'):
+            with query_budget(duplicate_threshold=2):
+                for pk in range(3):
+                    User.objects.filter(pk=pk).first()
+
+    def test_within_budget(self):
+        with query_budget(max_queries=2, duplicate_threshold=1) as auditor:
+            User.objects.count()
+        self.assertEqual(auditor.count, 1)
+
+    def test_query_from_sibling_directory(self):
+        # /srv/app-scripts/x.py is not inside /srv/app; auditing it must not fail the query
+        code = compile('User.objects.count()', PROJECT_ROOT + '-scripts/script.py', 'exec')
+        with query_budget(max_queries=1) as auditor:
+            exec(code, {'User': User})
+        self.assertEqual(auditor.count, 1)
+
+    @override_settings(QUERY_AUDIT_ENABLED=True, QUERY_AUDIT_STRICT=True, QUERY_BUDGET_PER_REQUEST=0)
+    def test_middleware_enforces_request_budget(self):
+        token = generate_token(self.user.user_id, self.user.user_email, 1, self.user.user_name)
+        with self.assertRaises(QueryBudgetExceeded):
+            Client().get('/api/user/profile/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+class HistoryPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.operator, vehicle = create_parties()
+        # Bookings 1-5, oldest first; the three oldest are finished and get archived
+        now = timezone.now()
+        for booking_id in range(1, 6):
+            request = Request.objects.create(
+                user=cls.user, operator=cls.operator, vehicle=vehicle,
+                user_latitude=23, user_longitude=72, amount=100, request_status=1,
+            )
+            Booking.objects.create(
+                booking_id=booking_id, request=request, operator=cls.operator,
+                booking_status=2 if booking_id <= 3 else 1,
+            )
+            created_at = now - timedelta(days=10 - booking_id)
+            Request.objects.filter(pk=request.pk).update(created_at=created_at)
+            Booking.objects.filter(pk=booking_id).update(created_at=created_at)
+        archive.archive(cutoff=now)
+
+    def page(self, query):
+        response = Client().get(f'/api/operator/bookings/{query}', **operator_auth(self.operator))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [row['booking_id'] for row in body['data']], body.get('next_offset')
+
+    def test_archived_rows_leave_the_hot_table(self):
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True).order_by('pk')), [4, 5])
+
+    def test_unpaged_history_is_the_hot_rows(self):
+        self.assertCountEqual(self.page('')[0], [4, 5])
+
+    def test_pages_continue_into_the_archive(self):
+        self.assertEqual(self.page('?limit=2'), ([5, 4], 2))
+        self.assertEqual(self.page('?limit=2&offset=2'), ([3, 2], 4))
+        self.assertEqual(self.page('?limit=2&offset=4'), ([1], None))
+
+    def test_page_spanning_both_tables(self):
+        self.assertEqual(self.page('?limit=3&offset=1'), ([4, 3, 2], 4))
+
+
+class RequestActionIdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.operator, vehicle = create_parties()
+        cls.request = Request.objects.create(
+            user=cls.user, operator=cls.operator, vehicle=vehicle,
+            user_latitude=23, user_longitude=72, amount=100,
+        )
+
+    def put(self, action, key):
+        return Client().put(
+            f'/api/operator/requests/{self.request.pk}/', {'action': action},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key, **operator_auth(self.operator),
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.put('accept', 'tap-1')
+        retry = self.put('accept', 'tap-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Booking.objects.filter(request=self.request).count(), 1)
+
+    def test_key_reused_for_another_body(self):
+        self.put('accept', 'tap-1')
+        self.assertEqual(self.put('reject', 'tap-1').status_code, 422)
+
+
+class BlockAllocatorTests(TestCase):
+
+    def test_ids_are_unique_inside_a_transaction(self):
+        allocator = BlockAllocator('test', block_size=5)
+        with transaction.atomic():
+            ids = [allocator.next() for _ in range(3)]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_block_is_cached_once_committed(self):
+        allocator = BlockAllocator('test', block_size=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = allocator.next()
+        with self.assertNumQueries(0):
+            rest = [allocator.next() for _ in range(4)]
+        self.assertEqual(rest, list(range(first + 1, first + 5)))
+
+    def test_rolled_back_block_is_not_cached(self):
+        allocator = BlockAllocator('test', block_size=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                lost = allocator.next()
+                raise ValueError
+        # The reservation rolled back too, so the block is handed out afresh
+        self.assertEqual(allocator.next(), lost)
+
+
+class LifecycleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.operator, vehicle = create_parties()
+        cls.request = Request.objects.create(
+            user=cls.user, operator=cls.operator, vehicle=vehicle,
+            user_latitude=23, user_longitude=72, amount=100,
+        )
+
+    def test_second_accept_loses(self):
+        _, booking = act_on_request(self.request.pk, self.operator.pk, 'accept')
+        with self.assertRaises(TransitionError):
+            act_on_request(self.request.pk, self.operator.pk, 'accept')
+        with self.assertRaises(TransitionError):
+            act_on_request(self.request.pk, self.operator.pk, 'reject')
+        self.assertEqual(list(Booking.objects.filter(request=self.request)), [booking])
+
+    def test_second_accept_over_http_conflicts(self):
+        url = f'/api/operator/requests/{self.request.pk}/'
+        responses = [
+            Client().put(url, {'action': 'accept'}, content_type='application/json',
+                         **operator_auth(self.operator))
+            for _ in range(2)
+        ]
+        self.assertEqual([response.status_code for response in responses], [200, 409])
+
+    def test_other_operators_request_is_not_found(self):
+        with self.assertRaises(Request.DoesNotExist):
+            act_on_request(self.request.pk, self.operator.pk + 1, 'accept')
+
+    def test_completing_the_booking_completes_the_request(self):
+        _, booking = act_on_request(self.request.pk, self.operator.pk, 'accept')
+        act_on_booking(booking.pk, 'start', operator_id=self.operator.pk)
+        act_on_booking(booking.pk, 'complete', operator_id=self.operator.pk)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.request_status, 3)
+        with self.assertRaises(TransitionError):
+            act_on_booking(booking.pk, 'cancel', request__user_id=self.user.pk)
+
+
+recorded = []
+
+
+@jobs.task(name='tests.record')
+def record(value):
+    recorded.append(value)
+
+
+@jobs.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+@override_settings(JOB_ALWAYS_EAGER=False)
+class JobTests(TestCase):
+
+    def setUp(self):
+        recorded.clear()
+
+    def test_claimed_job_runs_once(self):
+        record.delay(7)
+        job = jobs.claim('default', 'host:1:0')
+        self.assertIsNone(jobs.claim('default', 'host:2:0'))
+        self.assertTrue(jobs.run(job))
+        self.assertEqual(recorded, [7])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, jobs.DONE)
+
+    def test_failing_job_backs_off_then_fails(self):
+        queued = explode.delay()
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(jobs.claim('default', 'host:1:0')))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (jobs.QUEUED, 1))
+        self.assertIn('boom', queued.last_error)
+        self.assertIsNone(jobs.claim('default', 'host:1:0'))  # still backing off
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('api.jobs', 'WARNING'):
+            jobs.run(jobs.claim('default', 'host:1:0'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (jobs.FAILED, 2))
+
+    def test_renewed_lease_survives_recovery(self):
+        worker = jobs.Worker(['default'], threads=1)
+        record.delay(1)
+        record.delay(2)
+        mine = jobs.claim('default', f'{worker.name}:0')
+        lost = jobs.claim('default', 'gone:1:0')
+        expired = timezone.now() - timedelta(seconds=jobs.lease_seconds() + 1)
+        Job.objects.update(locked_at=expired)
+
+        worker.running.add(mine.pk)
+        worker.renew()
+        self.assertEqual(jobs.recover_expired(), 1)
+        self.assertEqual(Job.objects.get(pk=mine.pk).status, jobs.RUNNING)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.locked_by), (jobs.QUEUED, ''))
+
+
+class DocumentStorageTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, DOCUMENT_GC_GRACE_SECONDS=0))
+
+    def create_operator(self, email, content):
+        return VanOperator.objects.create(
+            operator_name='Ravi', operator_email=email, operator_password='secret',
+            operator_phone=9123456780, operator_license=ContentFile(content, name='licence.pdf'),
+        )
+
+    def exists(self, name):
+        return os.path.exists(storage.document_storage.path(name))
+
+    def test_same_content_is_stored_once(self):
+        first = self.create_operator('a@example.com', b'%PDF same')
+        second = self.create_operator('b@example.com', b'%PDF same')
+        name = first.operator_license.name
+        self.assertEqual(second.operator_license.name, name)
+        self.assertTrue(storage.is_hashed(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.exists(name))  # still used by the second row
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(self.exists(name))
+
+    def test_recent_files_wait_for_the_sweep(self):
+        operator = self.create_operator('a@example.com', b'%PDF kept')
+        replaced = self.create_operator('b@example.com', b'%PDF old')
+        old_name = replaced.operator_license.name
+        with self.settings(DOCUMENT_GC_GRACE_SECONDS=3600), self.captureOnCommitCallbacks(execute=True):
+            replaced.delete()
+        self.assertTrue(self.exists(old_name))
+
+        self.assertEqual(storage.sweep(), [old_name])
+        self.assertFalse(self.exists(old_name))
+        self.assertTrue(self.exists(operator.operator_license.name))
+
+
+class MediaViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.operator, _ = create_parties()
+        cls.other = VanOperator.objects.create(
+            operator_name='Meena', operator_email='meena@example.com', operator_password='secret',
+            operator_phone=9123456781, operator_license='operator_docs/other.pdf',
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE=''))
+        os.makedirs(os.path.join(media_root, 'operator_docs'))
+        with open(os.path.join(media_root, 'operator_docs', 'licence.pdf'), 'wb') as file:
+            file.write(b'0123456789')
+
+    def get(self, operator=None, **headers):
+        if operator is not None:
+            headers.update(operator_auth(operator))
+        return Client().get('/media/operator_docs/licence.pdf', **headers)
+
+    def test_owner_gets_the_file(self):
+        response = self.get(self.operator)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_access_control(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(self.other).status_code, 403)
+        user_token = generate_token(self.user.user_id, self.user.user_email, 1, self.user.user_name)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION=f'Bearer {user_token}').status_code, 403)
+        token = operator_auth(self.operator)['HTTP_AUTHORIZATION'].split()[1]
+        self.assertEqual(Client().get(f'/media/operator_docs/licence.pdf?token={token}').status_code, 401)
+
+    def test_missing_file(self):
+        response = Client().get('/media/operator_docs/other.pdf', **operator_auth(self.other))
+        self.assertEqual(response.status_code, 404)
+
+    def test_ranges(self):
+        response = self.get(self.operator, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(self.get(self.operator, HTTP_RANGE='bytes=-3').status_code, 206)
+        response = self.get(self.operator, HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_etag_revalidation(self):
+        etag = self.get(self.operator)['ETag']
+        self.assertEqual(self.get(self.operator, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # A stale If-Range sends the whole file instead of the range
+        response = self.get(self.operator, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+
+class OperatorCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.operator, _ = create_parties()
+        cls.van = ChargingVan.objects.create(van_number='GJ01VAN1', operator=cls.operator, battery_capacity='60')
+
+    def setUp(self):
+        operator_cache.get_cache().clear()
+        self.addCleanup(operator_cache.get_cache().clear)
+
+    def test_lookups_are_cached(self):
+        operator_cache.operator(self.operator.pk)
+        operator_cache.van_for(self.operator.pk)
+        operator_cache.van_for(self.operator.pk + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(operator_cache.operator(self.operator.pk), self.operator)
+            self.assertEqual(operator_cache.van_for(self.operator.pk), self.van)
+            self.assertIsNone(operator_cache.van_for(self.operator.pk + 1))  # "no van" is cached too
+
+    def test_save_drops_the_entries(self):
+        operator_cache.operator(self.operator.pk)
+        operator_cache.van_for(self.operator.pk)
+        operator = VanOperator.objects.get(pk=self.operator.pk)
+        operator.operator_name = 'Ravi Kumar'
+        operator.save()
+        self.van.operator = None
+        self.van.save()
+        self.assertEqual(operator_cache.operator(self.operator.pk).operator_name, 'Ravi Kumar')
+        self.assertIsNone(operator_cache.van_for(self.operator.pk))
+
+    def test_rehash_drops_the_profile(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        os.makedirs(os.path.join(media_root, 'operator_docs'))
+        with open(os.path.join(media_root, 'operator_docs', 'licence.pdf'), 'wb') as file:
+            file.write(b'%PDF licence')
+
+        operator_cache.operator(self.operator.pk)
+        moved = storage.rehash()  # changes the row with update(), which sends no signal
+        new_name = moved['operator_docs/licence.pdf']
+        self.assertEqual(operator_cache.operator(self.operator.pk).operator_license.name, new_name)
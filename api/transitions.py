@@ -0,0 +1,187 @@
+"""
+Request and booking lifecycles.
+
+Each model declares its allowed transitions, as ``action -> (source
+statuses, target status)``. A transition is applied as one conditional
+statement::
+
+    UPDATE booking SET booking_status = 2, completed_at = ...
+    WHERE booking_id = 7 AND operator_id = 3 AND booking_status IN (0, 1)
+    RETURNING request_id, operator_id, created_at, completed_at
+
+This is a compare-and-swap. If another request got there first, the status
+no longer matches and no row is updated, so nothing is read and then
+written back in between for a race to slip into. Only a failed transition
+reads the row, to tell "not found" (``DoesNotExist``) from "wrong state"
+(``TransitionError``, a 409). On databases without ``UPDATE ... RETURNING``
+the returned columns are selected right after the update, in the same
+transaction.
+
+Every successful transition sends ``transitioned``. Rollups and operator
+stats (api/signals.py) listen to it, because these UPDATEs never fire
+``post_save``. Saves made elsewhere, such as admin edits, still go through
+``post_save`` as before.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.sql import UpdateQuery
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Request, Booking
+from .sequences import BlockAllocator
+
+
+# Sent inside the transaction, once the row has changed. Arguments:
+# sender (model class), action, instance (unsaved model instance with the
+# pk, the new status and the lifecycle's returning fields), sources (the
+# statuses the row could have come from) and using. Receivers doing
+# non-database work should defer it with transaction.on_commit().
+transitioned = Signal()
+
+
+class TransitionError(Exception):
+    """The row is not in a state the action can start from."""
+
+
+# ``stamp`` names a DateTimeField set to now() by the same UPDATE
+Transition = namedtuple('Transition', 'sources target stamp', defaults=(None,))
+
+
+def supports_update_returning(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+class Lifecycle:
+
+    def __init__(self, model, field, transitions, returning=()):
+        self.model = model
+        self.field = field
+        self.transitions = transitions
+        self.returning = tuple(returning)
+        for action, transition in transitions.items():
+            if transition.target in transition.sources:
+                raise ValueError(f"{model.__name__}.{action} must change {field}")
+
+    def apply(self, action, pk, **filters):
+        """
+        Move row ``pk`` (further narrowed by ``filters``, e.g. its owner)
+        through ``action``. Returns the ``instance`` sent with ``transitioned``.
+        """
+        transition = self.transitions[action]
+        values = {self.field: transition.target}
+        if transition.stamp:
+            values[transition.stamp] = timezone.now()
+
+        manager = self.model._base_manager
+        using = router.db_for_write(self.model)
+        owned = manager.using(using).filter(pk=pk, **filters)
+        with transaction.atomic(using=using):
+            rows = self._update(owned, transition.sources, values, using)
+            if not rows:
+                self._refuse(action, owned)
+            instance = self.model(pk=pk, **{**rows[0], **values})
+            transitioned.send(
+                sender=self.model, action=action, instance=instance,
+                sources=transition.sources, using=using,
+            )
+        return instance
+
+    def _update(self, owned, sources, values, using):
+        """Run the UPDATE; returns the returning fields of the rows it changed."""
+        queryset = owned.filter(**{f'{self.field}__in': sources})
+        connection = connections[using]
+        if not supports_update_returning(connection):
+            if not queryset.update(**values):
+                return []
+            return list(owned.values(*self.returning))
+
+        # QuerySet.update(), plus a RETURNING clause
+        query = queryset.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        query.annotations = {}
+        compiler = query.get_compiler(using)
+        sql, params = compiler.as_sql()
+        fields = [self.model._meta.get_field(name) for name in self.returning]
+        sql += ' RETURNING ' + ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        columns = [field.get_col(self.model._meta.db_table) for field in fields]
+        converters = compiler.get_converters(columns)
+        if converters:
+            rows = compiler.apply_converters(rows, converters)
+        return [dict(zip(self.returning, row)) for row in rows]
+
+    def _refuse(self, action, owned):
+        current = owned.values_list(self.field, flat=True).first()
+        if current is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} matching query does not exist.")
+        label = dict(self.model._meta.get_field(self.field).choices).get(current, current)
+        raise TransitionError(f"Cannot {action} a {self.model._meta.verbose_name} that is {label}")
+
+
+REQUEST_LIFECYCLE = Lifecycle(Request, 'request_status', {
+    'accept': Transition((0,), 1),
+    'reject': Transition((0,), 2),
+    'complete': Transition((1,), 3),
+}, returning=('user_id', 'operator_id', 'created_at'))
+
+BOOKING_LIFECYCLE = Lifecycle(Booking, 'booking_status', {
+    'start': Transition((0,), 1),
+    'complete': Transition((0, 1), 2, stamp='completed_at'),
+    'cancel': Transition((0, 1), 3),
+}, returning=('request_id', 'operator_id', 'created_at', 'completed_at'))
+
+# What operators may do through the API
+REQUEST_ACTIONS = ('accept', 'reject')
+BOOKING_ACTIONS = ('start', 'complete')
+
+booking_ids = BlockAllocator('booking', getattr(settings, 'BOOKING_ID_BLOCK_SIZE', 20))
+
+
+def act_on_request(request_id, operator_id, action):
+    """
+    Accept or reject one of ``operator_id``'s pending requests.
+
+    Returns ``(request, booking)``; ``booking`` is None for a reject. Raises
+    ``Request.DoesNotExist`` or ``TransitionError``.
+    """
+    if action not in REQUEST_ACTIONS:
+        raise ValueError(f"Unknown request action {action!r}")
+    # Taken outside the transaction; a rollback just leaves a gap
+    booking_id = booking_ids.next() if action == 'accept' else None
+
+    with transaction.atomic():
+        req = REQUEST_LIFECYCLE.apply(action, request_id, operator_id=operator_id)
+        booking = None
+        if action == 'accept':
+            booking = Booking.objects.create(
+                booking_id=booking_id,
+                request=req,
+                operator_id=operator_id,
+                booking_status=0,
+            )
+    return req, booking
+
+
+def act_on_booking(booking_id, action, **owner):
+    """
+    Apply ``action`` to a booking owned by ``owner`` (``operator_id=`` or
+    ``request__user_id=``). Completing a booking also completes its request
+    in the same transaction. Raises ``Booking.DoesNotExist`` or ``TransitionError``.
+    """
+    with transaction.atomic():
+        booking = BOOKING_LIFECYCLE.apply(action, booking_id, **owner)
+        if action == 'complete':
+            try:
+                REQUEST_LIFECYCLE.apply('complete', booking.request_id)
+            except (Request.DoesNotExist, TransitionError):
+                pass  # already completed, or edited by hand in the admin
+    return booking
@@ -0,0 +1,151 @@
+"""
+Operator license uploads.
+
+Registration streams the upload to a temp file (``LicenseUploadHandler``),
+checks it by size and magic bytes (``validate_license``) and returns. A
+background job (``license_preview``, api/tasks.py) then records the type and
+size and writes a small JPEG thumbnail for the admin changelist.
+
+Thumbnails need Pillow, which is optional. Without it, and for PDFs, the
+admin shows the document type and size instead.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+
+from . import operator_cache
+from .models import VanOperator
+
+logger = logging.getLogger('api.uploads')
+
+# Leading bytes -> (content type, allowed extensions)
+LICENSE_TYPES = {
+    b'%PDF-': ('application/pdf', ('.pdf',)),
+    b'\xff\xd8\xff': ('image/jpeg', ('.jpg', '.jpeg')),
+    b'\x89PNG\r\n\x1a\n': ('image/png', ('.png',)),
+}
+TYPE_LABELS = {'application/pdf': 'PDF', 'image/jpeg': 'JPEG', 'image/png': 'PNG'}
+
+
+class LicenseUploadHandler(TemporaryFileUploadHandler):
+    """
+    Writes every upload to a temp file in chunks, however small. Once a file
+    passes ``max_size`` the rest of it is read but not written; its ``size``
+    is still the full size, so ``validate_license`` rejects it.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.LICENSE_MAX_UPLOAD_SIZE
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+
+def sniff(head):
+    """Content type for a file starting with ``head``, or None."""
+    for magic, (content_type, _) in LICENSE_TYPES.items():
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+def read_head(file, length=16):
+    file.seek(0)
+    head = file.read(length)
+    file.seek(0)
+    return head
+
+
+def validate_license(file):
+    if file.size > settings.LICENSE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            f"File size must be under {settings.LICENSE_MAX_UPLOAD_SIZE // (1024 * 1024)}MB"
+        )
+    content_type = sniff(read_head(file))
+    extensions = next((ext for ct, ext in LICENSE_TYPES.values() if ct == content_type), ())
+    if not file.name.lower().endswith(extensions):
+        raise ValidationError("Only PDF or image files (JPG, JPEG, PNG) are allowed")
+
+
+def license_changed(operator):
+    """Queue a new preview for ``operator``'s license once the save commits."""
+    from . import tasks
+
+    transaction.on_commit(lambda: tasks.license_preview.delay(operator.pk))
+
+
+# ========== PREVIEWS ==========
+
+def thumbnail(file, size):
+    """JPEG bytes of ``file`` shrunk to fit ``size`` pixels, or None."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(file) as image:
+            # JPEGs decode straight to a smaller scale
+            image.draft('RGB', (size, size))
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, 'JPEG', quality=70, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('license thumbnail failed: %s', exc)
+        return None
+    return output.getvalue()
+
+
+def generate_preview(operator_id):
+    """Record the license's type and size and write its thumbnail."""
+    operator = VanOperator.objects.filter(pk=operator_id).only(
+        'operator_license', 'license_preview'
+    ).first()
+    if operator is None or not operator.operator_license:
+        return None
+    document = operator.operator_license
+    try:
+        with document.open('rb') as file:
+            content_type = sniff(read_head(file))
+            size = document.size
+            data = None
+            if content_type in ('image/jpeg', 'image/png'):
+                data = thumbnail(file, settings.LICENSE_PREVIEW_SIZE)
+    except FileNotFoundError:
+        logger.warning('license missing for operator %s: %s', operator_id, document.name)
+        return None
+
+    old_preview = operator.license_preview.name
+    preview = ''
+    if data is not None:
+        storage = operator.license_preview.storage
+        preview = storage.save(f"{VanOperator.license_preview.field.upload_to}{operator_id}.jpg", ContentFile(data))
+    # Skip the write if the license was replaced while this ran
+    updated = VanOperator.objects.filter(pk=operator_id, operator_license=document.name).update(
+        license_preview=preview, license_content_type=content_type or '', license_size=size,
+    )
+    if updated:
+        operator_cache.forget_operator(operator_id)
+    stale = old_preview if updated else preview
+    if stale and (stale != preview or not updated):
+        operator.license_preview.storage.delete(stale)
+    return preview or None
+
+
+def preview_label(operator):
+    """'PDF · 1.2 MB' style summary for a license without a thumbnail."""
+    label = TYPE_LABELS.get(operator.license_content_type) or os.path.splitext(
+        operator.operator_license.name
+    )[1].lstrip('.').upper() or 'File'
+    if operator.license_size is None:
+        return label
+    return f"{label} · {filesizeformat(operator.license_size)}"
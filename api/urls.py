@@ -1,24 +1,26 @@
 """
 URL configuration for ChargeNow API.
 """
+from django.conf import settings
 from django.urls import path
+from .views import async_views, notification_views, operator_views, user_views
 from .views.auth_views import LoginView, UserRegisterView, OperatorRegisterView , ForgotPasswordView 
 from .views.user_views import (
-    UserProfileView,
     UserVehicleListView, UserVehicleDetailView,
-    UserRequestListView, UserRequestDetailView,
-    UserBookingListView, UserBookingCancelView,
-    UserPaymentView, UserFeedbackView,
-    TrackOperatorView
+    UserRequestDetailView, UserBookingCancelView,
+    UserFeedbackView,
 )
 from .views.operator_views import (
-    OperatorProfileView, OperatorStatusView,
-    OperatorVanView,OperatorVanLocationUpdateView,
+    OperatorStatusView, OperatorVanLocationUpdateView,
     OperatorRequestListView, OperatorRequestActionView,
     OperatorChargingView,
-    OperatorBookingHistoryView, OperatorPaymentHistoryView, OperatorFeedbackHistoryView
 )
-from django.views.generic import RedirectView
+
+# Under ASGI the read-heavy endpoints are the async views of the same names
+user_reads = async_views if settings.ASYNC_VIEWS else user_views
+operator_reads = async_views if settings.ASYNC_VIEWS else operator_views
+notification_reads = async_views if settings.ASYNC_VIEWS else notification_views
+
 urlpatterns = [
     #  AUTH ENDPOINTS 
     path('auth/login/', LoginView.as_view(), name='login'),
@@ -30,27 +32,27 @@ urlpatterns = [
     # path('user/vehicles/<int:vehicle_id>/', UserVehicleDetailView.as_view(), name='user-vehicle-detail'),
     
     #path('', RedirectView.as_view(url='/admin-dashboard/', permanent=False)),
-    path('user/profile/', UserProfileView.as_view(), name='user-profile'),
+    path('user/profile/', user_reads.UserProfileView.as_view(), name='user-profile'),
     # Vehicles
     path('user/vehicles/', UserVehicleListView.as_view(), name='user-vehicles'),
     path('user/vehicles/<int:vehicle_id>/', UserVehicleDetailView.as_view(), name='user-vehicle-detail'),
     # Requests
-    path('user/requests/', UserRequestListView.as_view(), name='user-requests'),
+    path('user/requests/', user_reads.UserRequestListView.as_view(), name='user-requests'),
     path('user/requests/<int:request_id>/', UserRequestDetailView.as_view(), name='user-request-detail'),
     # Bookings
-    path('user/bookings/', UserBookingListView.as_view(), name='user-bookings'),
+    path('user/bookings/', user_reads.UserBookingListView.as_view(), name='user-bookings'),
     path('user/bookings/<int:booking_id>/cancel/', UserBookingCancelView.as_view(), name='user-booking-cancel'),
     # Payments
-    path('user/payments/', UserPaymentView.as_view(), name='user-payments'),
+    path('user/payments/', user_reads.UserPaymentView.as_view(), name='user-payments'),
     # Feedback
     path('user/feedback/', UserFeedbackView.as_view(), name='user-feedback'),
     # Track Operator
-    path('user/track-operator/<int:operator_id>/', TrackOperatorView.as_view(), name='track-operator'),
+    path('user/track-operator/<int:operator_id>/', user_reads.TrackOperatorView.as_view(), name='track-operator'),
     
     # ========== OPERATOR ENDPOINTS ==========
-    path('operator/profile/', OperatorProfileView.as_view(), name='operator-profile'),
+    path('operator/profile/', operator_reads.OperatorProfileView.as_view(), name='operator-profile'),
     path('operator/status/', OperatorStatusView.as_view(), name='operator-status'),
-    path('operator/van/', OperatorVanView.as_view(), name='operator-van'),
+    path('operator/van/', operator_reads.OperatorVanView.as_view(), name='operator-van'),
     path('operator/van/update-location/',OperatorVanLocationUpdateView.as_view(), name='operator-van-update-location'),
     # Requests
     path('operator/requests/', OperatorRequestListView.as_view(), name='operator-requests'),
@@ -58,9 +60,12 @@ urlpatterns = [
     # Charging
     path('operator/charging/<int:booking_id>/', OperatorChargingView.as_view(), name='operator-charging'),
     # History
-    path('operator/bookings/', OperatorBookingHistoryView.as_view(), name='operator-bookings'),
-    path('operator/payments/', OperatorPaymentHistoryView.as_view(), name='operator-payments'),
-    path('operator/feedback/', OperatorFeedbackHistoryView.as_view(), name='operator-feedback'),
+    path('operator/bookings/', operator_reads.OperatorBookingHistoryView.as_view(), name='operator-bookings'),
+    path('operator/payments/', operator_reads.OperatorPaymentHistoryView.as_view(), name='operator-payments'),
+    path('operator/feedback/', operator_reads.OperatorFeedbackHistoryView.as_view(), name='operator-feedback'),
+
+    # ========== NOTIFICATIONS ==========
+    path('notifications/stream/', notification_reads.NotificationStreamView.as_view(), name='notification-stream'),
 
 
 ]
@@ -0,0 +1,307 @@
+"""
+Async views for ChargeNow API.
+Read-heavy endpoints (profiles, van, tracking, history and the
+notification stream) on Django's async ORM. api/urls.py uses them in place
+of the DRF views of the same name when ASYNC_VIEWS is on (chargenow/asgi.py).
+
+Only GET is async. Other methods on the same URL are passed to the DRF
+view in a worker thread, so writes behave exactly as under WSGI.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+
+from .. import operator_cache
+from ..archive import ahistory_page
+from ..authentication import JWTAuthentication, QueryTokenAuthentication, identity_for
+from ..models import (
+    User, VanOperator, Request, Booking, Payment, Feedback,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment
+)
+from ..notifications import AsyncSubscription, hub
+from ..serializers import (
+    UserSerializer, VanOperatorSerializer, ChargingVanSerializer, RequestSerializer,
+    BookingSerializer, PaymentSerializer, FeedbackSerializer,
+    ArchivedRequestSerializer, ArchivedBookingSerializer, ArchivedPaymentSerializer
+)
+from . import notification_views, operator_views, user_views
+
+USER, OPERATOR = 1, 2
+
+
+# A miss may wait for another caller's load, so the lookups run in a thread
+cached_operator = sync_to_async(operator_cache.operator)
+cached_van_for = sync_to_async(operator_cache.van_for)
+
+
+def respond(body, status=200):
+    # Same bytes as DRF's JSONRenderer
+    return JsonResponse(body, status=status, json_dumps_params={
+        'separators': (',', ':'), 'ensure_ascii': False,
+    })
+
+
+class AsyncAPIView(View):
+    """
+    Base for async views standing in for ``sync_view``. Authenticates like
+    DRF would and lets through only ``roles``.
+    """
+    sync_view = None
+    roles = ()
+    authentication_classes = (JWTAuthentication,)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The middleware reads these from the view class
+        cls.replica_reads = getattr(cls.sync_view, 'replica_reads', False)
+        cls.idempotent = getattr(cls.sync_view, 'idempotent', False)
+        cls._sync_handler = staticmethod(sync_to_async(cls.sync_view.as_view()))
+        for method in ('post', 'put', 'patch', 'delete'):
+            if hasattr(cls.sync_view, method) and method not in cls.__dict__:
+                setattr(cls, method, AsyncAPIView.delegate)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token auth, like DRF's views. (csrf_exempt() can't wrap async views on Django 4.2.)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Delegated methods are authenticated by the DRF view itself
+        if getattr(type(self), request.method.lower(), None) is not AsyncAPIView.delegate:
+            denied = self.authenticate(request)
+            if denied is not None:
+                return denied
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def delegate(self, request, *args, **kwargs):
+        return await self._sync_handler(request, *args, **kwargs)
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        response = respond({'detail': f'Method "{request.method}" not allowed.'}, 405)
+        response['Allow'] = ', '.join(self._allowed_methods())
+        return response
+
+    def authenticate(self, request):
+        """Set ``request.user`` as DRF does; returns an error response or None."""
+        try:
+            for authentication_class in self.authentication_classes:
+                result = authentication_class().authenticate(request)
+                if result is not None:
+                    break
+        except AuthenticationFailed as exc:
+            return self.unauthorized(str(exc.detail))
+        if result is None:
+            return self.unauthorized('Authentication credentials were not provided.')
+        request.user = result[0]
+        if request.user.get('role') not in self.roles:
+            return respond({'detail': 'You do not have permission to perform this action.'}, 403)
+        return None
+
+    @staticmethod
+    def unauthorized(detail):
+        response = respond({'detail': detail}, 401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+
+
+# ========== PROFILE VIEWS ==========
+
+class UserProfileView(AsyncAPIView):
+    sync_view = user_views.UserProfileView
+    roles = (USER,)
+
+    async def get(self, request):
+        try:
+            user = await User.objects.aget(user_id=request.user['id'])
+        except User.DoesNotExist:
+            return respond({'success': False, 'message': 'User Not Found'}, 404)
+        return respond({'success': True, 'data': UserSerializer(user).data})
+
+
+class OperatorProfileView(AsyncAPIView):
+    sync_view = operator_views.OperatorProfileView
+    roles = (OPERATOR,)
+
+    async def get(self, request):
+        operator = await cached_operator(request.user['id'])
+        if operator is None:
+            return respond({'success': False, 'message': 'Operator Not Found'}, 404)
+        return respond({'success': True, 'data': VanOperatorSerializer(operator).data})
+
+
+# ========== VAN AND TRACKING VIEWS ==========
+
+class OperatorVanView(AsyncAPIView):
+    sync_view = operator_views.OperatorVanView
+    roles = (OPERATOR,)
+
+    async def get(self, request):
+        van = await cached_van_for(request.user['id'])
+        if not van:
+            return respond({'success': False, 'message': 'No Van Assigned'})
+        return respond({'success': True, 'data': ChargingVanSerializer(van).data})
+
+
+class TrackOperatorView(AsyncAPIView):
+    sync_view = user_views.TrackOperatorView
+    roles = (USER,)
+
+    async def get(self, request, operator_id):
+        operator = await cached_operator(operator_id)
+        if operator is None:
+            return respond({'success': False, 'message': 'Operator Not Found'}, 404)
+        return respond({
+            'success': True,
+            'data': {
+                'operator_id': operator.operator_id,
+                'operator_name': operator.operator_name,
+                'operator_status': operator.operator_status,
+                'is_online': operator.operator_status == 1
+            }
+        })
+
+
+# ========== HISTORY VIEWS ==========
+
+class UserRequestListView(AsyncAPIView):
+    sync_view = user_views.UserRequestListView
+    roles = (USER,)
+
+    async def get(self, request):
+        requests = Request.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'vehicle')
+        archived = ArchivedRequest.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'vehicle')
+        return respond(await ahistory_page(
+            request, requests, archived, RequestSerializer, ArchivedRequestSerializer
+        ))
+
+
+class UserBookingListView(AsyncAPIView):
+    sync_view = user_views.UserBookingListView
+    roles = (USER,)
+
+    async def get(self, request):
+        bookings = Booking.objects.filter(
+            request__user_id=request.user['id']
+        ).select_related('request__user', 'request__vehicle', 'operator')
+        archived = ArchivedBooking.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'vehicle', 'operator')
+        return respond(await ahistory_page(
+            request, bookings, archived, BookingSerializer, ArchivedBookingSerializer
+        ))
+
+
+class UserPaymentView(AsyncAPIView):
+    sync_view = user_views.UserPaymentView
+    roles = (USER,)
+
+    async def get(self, request):
+        payments = Payment.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'booking')
+        archived = ArchivedPayment.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator')
+        return respond(await ahistory_page(
+            request, payments, archived, PaymentSerializer, ArchivedPaymentSerializer
+        ))
+
+
+class OperatorBookingHistoryView(AsyncAPIView):
+    sync_view = operator_views.OperatorBookingHistoryView
+    roles = (OPERATOR,)
+
+    async def get(self, request):
+        bookings = Booking.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('request__user', 'request__vehicle', 'operator')
+        archived = ArchivedBooking.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'vehicle', 'operator')
+        return respond(await ahistory_page(
+            request, bookings, archived, BookingSerializer, ArchivedBookingSerializer
+        ))
+
+
+class OperatorPaymentHistoryView(AsyncAPIView):
+    sync_view = operator_views.OperatorPaymentHistoryView
+    roles = (OPERATOR,)
+
+    async def get(self, request):
+        payments = Payment.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator', 'booking')
+        archived = ArchivedPayment.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator')
+        return respond(await ahistory_page(
+            request, payments, archived, PaymentSerializer, ArchivedPaymentSerializer
+        ))
+
+
+class OperatorFeedbackHistoryView(AsyncAPIView):
+    sync_view = operator_views.OperatorFeedbackHistoryView
+    roles = (OPERATOR,)
+
+    async def get(self, request):
+        feedbacks = [
+            feedback async for feedback in Feedback.objects.filter(
+                operator_id=request.user['id']
+            ).select_related('user', 'operator')
+        ]
+        operator = await VanOperator.objects.filter(operator_id=request.user['id']).only(
+            'rating_sum', 'rating_count'
+        ).afirst()
+        summary = {
+            'average_rating': operator.average_rating if operator else None,
+            'rating_count': operator.rating_count if operator else 0,
+        }
+        return respond({
+            'success': True, 'data': FeedbackSerializer(feedbacks, many=True).data, 'summary': summary,
+        })
+
+
+# ========== NOTIFICATIONS ==========
+
+async def aevent_stream(subscription, keepalive, lifetime):
+    deadline = time.monotonic() + lifetime
+    try:
+        yield f'retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n'
+        while time.monotonic() < deadline:
+            notification = await subscription.aget(timeout=keepalive)
+            if notification is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield notification_views.format_event(notification)
+    finally:
+        subscription.close()
+
+
+class NotificationStreamView(AsyncAPIView):
+    sync_view = notification_views.NotificationStreamView
+    roles = (USER, OPERATOR)
+    authentication_classes = (JWTAuthentication, QueryTokenAuthentication)
+
+    async def get(self, request):
+        subscription = hub.subscribe(identity_for(request.user), AsyncSubscription)
+        response = StreamingHttpResponse(
+            aevent_stream(
+                subscription,
+                settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS,
+                settings.NOTIFICATION_STREAM_MAX_SECONDS,
+            ),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -11,6 +11,7 @@ from rest_framework.permissions import AllowAny
 from ..models import User, VanOperator
 from ..serializers import LoginSerializer, UserRegistrationSerializer, VanOperatorRegistrationSerializer, ForgotPasswordSerializer
 from ..authentication import generate_token
+from ..uploads import LicenseUploadHandler, license_changed
 
 # from django.contrib.auth.hashers import make_password
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -138,6 +139,8 @@ class OperatorRegisterView(APIView):
 
     
     def post(self, request):
+        # Stream the license to a temp file; it is checked before it is saved
+        request.upload_handlers = [LicenseUploadHandler(request)]
         # serializer = VanOperatorRegistrationSerializer(data=request.data, files=request.FILES)
         serializer = VanOperatorRegistrationSerializer(data=request.data)
 
@@ -159,7 +162,9 @@ class OperatorRegisterView(APIView):
             operator_status=0,
             role=2
         )
-        
+        # Thumbnail for the admin, made in the background
+        license_changed(operator)
+
         token = generate_token(operator.operator_id, operator.operator_email, 2, operator.operator_name)
         
         return Response({
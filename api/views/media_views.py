@@ -0,0 +1,171 @@
+"""
+Media views for ChargeNow.
+Uploaded files (operator licenses and their previews) are only served to
+admins signed in to the admin site and to the operator whose row names the
+file. Operators authenticate with their token in the Authorization header
+only; a token in the query string would end up in access logs, the request
+log and Referer headers.
+
+With MEDIA_SENDFILE set, the view only checks access and conditional
+headers. The front-end server then sends the bytes (and handles Range):
+
+- ``"x-accel-redirect"`` (nginx) redirects internally to
+  MEDIA_SENDFILE_PREFIX + name::
+
+      location /protected-media/ {
+          internal;
+          alias /srv/chargenow/media/;
+      }
+
+- ``"x-sendfile"`` (Apache mod_xsendfile, lighttpd) passes the absolute path.
+
+Without it (e.g. runserver) the file is streamed from Python, including
+single byte ranges.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from ..authentication import decode_token
+from ..models import VanOperator
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def token_payload(request):
+    """Token payload from the Authorization header, or None; raises on a bad token."""
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        return decode_token(parts[1])
+    return None
+
+
+def may_read(request, name):
+    """True/False for an authenticated caller, None if not authenticated."""
+    payload = token_payload(request)
+    if payload is not None:
+        return payload.get('role') == 2 and VanOperator.objects.filter(
+            Q(operator_license=name) | Q(license_preview=name), operator_id=payload.get('id'),
+        ).exists()
+    user = request.user
+    if user.is_authenticated:
+        return user.is_active and user.is_staff
+    return None
+
+
+def denied(detail, status):
+    response = JsonResponse({'detail': detail}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+def parse_range(header, size):
+    """``(start, end)`` for a single ``bytes=`` range, 'invalid' if unsatisfiable, None to send it all."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Malformed or several ranges; the whole file is a valid answer
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'invalid'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def read_file(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def if_range_matches(request, etag, last_modified):
+    """A Range only applies if If-Range, when sent, names the current file."""
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+@require_safe
+def media_view(request, name):
+    try:
+        allowed = may_read(request, name)
+    except jwt.ExpiredSignatureError:
+        return denied('Token has expired', 401)
+    except jwt.InvalidTokenError:
+        return denied('Invalid token', 401)
+    if allowed is None:
+        return denied('Authentication credentials were not provided.', 401)
+    if not allowed:
+        return denied('You do not have permission to perform this action.', 403)
+
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        return denied('Not found.', 404)
+
+    etag = quote_etag(f'{stat.st_size:x}-{int(stat.st_mtime):x}')
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(path)
+    headers = {
+        'Content-Type': content_type or 'application/octet-stream',
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        # Readable only with credentials, so never in a shared cache
+        'Cache-Control': 'private, no-cache',
+        'Content-Disposition': content_disposition_header(False, os.path.basename(name)),
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        return HttpResponse(headers={**headers, 'X-Accel-Redirect': settings.MEDIA_SENDFILE_PREFIX + quote(name)})
+    if settings.MEDIA_SENDFILE == 'x-sendfile':
+        return HttpResponse(headers={**headers, 'X-Sendfile': path})
+
+    byte_range = None
+    if 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], stat.st_size)
+    if byte_range == 'invalid':
+        return HttpResponse(status=416, headers={'Content-Range': f'bytes */{stat.st_size}'})
+    start, end = byte_range or (0, stat.st_size - 1)
+    response = StreamingHttpResponse(
+        read_file(path, start, end - start + 1) if request.method == 'GET' else (),
+        status=206 if byte_range else 200,
+        headers={**headers, 'Content-Length': str(end - start + 1)},
+    )
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
@@ -0,0 +1,79 @@
+"""
+Notification views for ChargeNow API.
+Live status updates for users and operators (see api/notifications.py).
+"""
+import json
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.views import APIView
+
+from ..authentication import JWTAuthentication, QueryTokenAuthentication, identity_for
+from ..notifications import hub
+from ..permissions import IsUser, IsOperator
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept ``Accept: text/event-stream``; errors are sent as JSON."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data)
+
+
+def format_event(notification):
+    return (
+        f"id: {notification['id']}\n"
+        f"event: {notification['event']}\n"
+        f"data: {json.dumps(notification)}\n\n"
+    )
+
+
+def event_stream(subscription, keepalive, lifetime):
+    # Streams end after ``lifetime`` seconds and the client reconnects, so a
+    # client that vanished without closing the connection is not kept forever
+    deadline = time.monotonic() + lifetime
+    try:
+        yield f'retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n'
+        while time.monotonic() < deadline:
+            notification = subscription.get(timeout=keepalive)
+            if notification is None:
+                # Keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(notification)
+    finally:
+        subscription.close()
+
+
+class NotificationStreamView(APIView):
+    """
+    Server-sent events for the signed-in user or operator.
+
+    EventSource cannot set headers, so the token may also be passed as
+    ``?token=``. Under WSGI each open stream holds a server thread; under
+    ASGI the async version in async_views.py waits on the event loop.
+    """
+    authentication_classes = [JWTAuthentication, QueryTokenAuthentication]
+    permission_classes = [IsUser | IsOperator]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        subscription = hub.subscribe(identity_for(request.user))
+        # The stream stays open for minutes; don't hold a database connection
+        connection.close()
+        response = StreamingHttpResponse(
+            event_stream(
+                subscription,
+                settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS,
+                settings.NOTIFICATION_STREAM_MAX_SECONDS,
+            ),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx: send each event as it comes
+        return response
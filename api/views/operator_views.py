@@ -6,26 +6,39 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from ..models import VanOperator, ChargingVan, Request, Booking, Payment, Feedback
+from ..models import (
+    VanOperator, ChargingVan, Request, Booking, Payment, Feedback,
+    ArchivedBooking, ArchivedPayment
+)
 from ..serializers import (
     VanOperatorSerializer, ChargingVanSerializer, RequestSerializer, 
-    BookingSerializer, PaymentSerializer, FeedbackSerializer
+    BookingSerializer, PaymentSerializer, FeedbackSerializer,
+    ArchivedBookingSerializer, ArchivedPaymentSerializer
 )
+from .. import operator_cache
+from ..archive import history_page
 from ..permissions import IsOperator
+from ..transitions import (
+    REQUEST_ACTIONS, BOOKING_ACTIONS, TransitionError, act_on_request, act_on_booking
+)
+from ..writequeue import location_writes
 from decimal import Decimal
+from django.conf import settings
+import logging
+
+location_logger = logging.getLogger('api.location')
 
 class OperatorProfileView(APIView):
     """Get and update operator profile"""
     permission_classes = [IsOperator]
     
     def get(self, request):
-        try:
-            operator = VanOperator.objects.get(operator_id=request.user['id'])
-            serializer = VanOperatorSerializer(operator)
-            return Response({'success': True, 'data': serializer.data})
-        except VanOperator.DoesNotExist:
+        operator = operator_cache.operator(request.user['id'])
+        if operator is None:
             return Response({'success': False, 'message': 'Operator Not Found'}, 
                           status=status.HTTP_404_NOT_FOUND)
+        serializer = VanOperatorSerializer(operator)
+        return Response({'success': True, 'data': serializer.data})
     
     def put(self, request):
         try:
@@ -62,7 +75,7 @@ class OperatorStatusView(APIView):
                               status=status.HTTP_400_BAD_REQUEST)
             
             operator.operator_status = new_status
-            operator.save()
+            operator.save(update_fields=['operator_status'])
             
             status_text = 'online' if new_status == 1 else 'offline'
             return Response({
@@ -82,7 +95,7 @@ class OperatorVanView(APIView):
     def get(self, request):
         operator_id = request.user['id']  # int from JWT
 
-        van = ChargingVan.objects.filter(operator_id=operator_id).first()
+        van = operator_cache.van_for(operator_id)
 
         if not van:
             return Response(
@@ -104,7 +117,7 @@ class OperatorVanLocationUpdateView(APIView):
         lat = request.data.get('latitude')
         lng = request.data.get('longitude')
 
-        van = ChargingVan.objects.filter(operator_id=operator_id).first()
+        van = operator_cache.van_for(operator_id)
 
         if not van:
             return Response({"success": False, "message": "No Van Assigned"}, status=404)
@@ -112,9 +125,24 @@ class OperatorVanLocationUpdateView(APIView):
         # 🔥 Convert to Decimal
         van.vanoperator_latitude = Decimal(str(lat))
         van.vanoperator_longitude = Decimal(str(lng))
-        van.save()
-
-        print("UPDATED TO:", van.vanoperator_latitude, van.vanoperator_longitude)
+        if settings.LOCATION_WRITE_QUEUE:
+            # Pings are last-value-wins; the writer thread batches them
+            location_writes.submit(
+                ChargingVan, van.van_id,
+                vanoperator_latitude=van.vanoperator_latitude,
+                vanoperator_longitude=van.vanoperator_longitude,
+            )
+        else:
+            van.save(update_fields=['vanoperator_latitude', 'vanoperator_longitude'])
+        # Keep the cached van current instead of dropping it on every ping
+        operator_cache.van_moved(van)
+
+        location_logger.info('van location updated', extra={
+            'operator_id': operator_id,
+            'van_id': van.van_id,
+            'latitude': str(van.vanoperator_latitude),
+            'longitude': str(van.vanoperator_longitude),
+        })
 
         return Response({"success": True, "message": "Location Updated"})    
 
@@ -125,7 +153,9 @@ class OperatorRequestListView(APIView):
     permission_classes = [IsOperator]
     
     def get(self, request):
-        requests = Request.objects.filter(operator_id=request.user['id'])
+        requests = Request.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator', 'vehicle')
         serializer = RequestSerializer(requests, many=True)
         return Response({'success': True, 'data': serializer.data})
 
@@ -164,45 +194,26 @@ class OperatorRequestListView(APIView):
 class OperatorRequestActionView(APIView):
     """Accept or reject a request"""
     permission_classes = [IsOperator]
+    idempotent = True  # retries with the same Idempotency-Key replay the first response
     
     def put(self, request, request_id):
+        action = request.data.get('action')  # 'accept' or 'reject'
+        if action not in REQUEST_ACTIONS:
+            return Response({'success': False, 'message': 'Action Must Be Accept Or Reject'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         try:
-            ### CHANGE: Retrieve the operator object to pass into Booking creation later
-            operator_obj = VanOperator.objects.get(operator_id=request.user['id'])
-            
-            # Find the specific request assigned to this operator
-            req = Request.objects.get(request_id=request_id, operator=operator_obj)
-            
-            action = request.data.get('action')  # 'accept' or 'reject'
-            
-            if action == 'accept':
-                req.request_status = 1  # Accepted
-                
-                ### CHANGE: Create booking using Model Instances (req, operator_obj) 
-                ### instead of raw IDs. This ensures data integrity.
-                Booking.objects.create(
-                    request=req,
-                    operator=operator_obj,
-                    booking_status=0
-                )
-                message = 'Request Accepted'
-            
-            elif action == 'reject':
-                req.request_status = 2  # Rejected
-                message = 'Request Aejected'
-            else:
-                return Response({'success': False, 'message': 'Action Must Be Accept Or Reject'}, 
-                              status=status.HTTP_400_BAD_REQUEST)
-            
-            req.save()
-            return Response({'success': True, 'message': message})
-            
+            # Locks the request, so a double tap can't create a second booking
+            req, booking = act_on_request(request_id, request.user['id'], action)
         except Request.DoesNotExist:
             return Response({'success': False, 'message': 'Request not found'}, 
                           status=status.HTTP_404_NOT_FOUND)
-        except VanOperator.DoesNotExist:
-             return Response({'success': False, 'message': 'Operator Profile Error'}, 
-                          status=status.HTTP_404_NOT_FOUND)
+        except TransitionError as exc:
+            return Response({'success': False, 'message': str(exc)}, 
+                          status=status.HTTP_409_CONFLICT)
+
+        if booking is None:
+            return Response({'success': True, 'message': 'Request Rejected'})
+        return Response({'success': True, 'message': 'Request Accepted', 'booking_id': booking.booking_id})
 
 
 # ========== CHARGING VIEWS ==========
@@ -210,34 +221,24 @@ class OperatorRequestActionView(APIView):
 class OperatorChargingView(APIView):
     """Start Or Complete Charging"""
     permission_classes = [IsOperator]
+    idempotent = True
     
     def put(self, request, booking_id):
+        action = request.data.get('action')  # 'start' or 'complete'
+        if action not in BOOKING_ACTIONS:
+            return Response({'success': False, 'message': 'Action must be start or complete'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         try:
-            booking = Booking.objects.get(booking_id=booking_id, operator_id=request.user['id'])
-            action = request.data.get('action')  # 'start' or 'complete'
-            
-            if action == 'start':
-                booking.booking_status = 1  # Started
-                message = 'Charging Started'
-            elif action == 'complete':
-                booking.booking_status = 2  # Completed
-                # Also mark request as completed
-                try:
-                    req = Request.objects.get(request_id=booking.request_id)
-                    req.request_status = 3  # Completed
-                    req.save()
-                except Request.DoesNotExist:
-                    pass
-                message = 'Charging completed'
-            else:
-                return Response({'success': False, 'message': 'Action must be start or complete'}, 
-                              status=status.HTTP_400_BAD_REQUEST)
-            
-            booking.save()
-            return Response({'success': True, 'message': message})
+            act_on_booking(booking_id, action, operator_id=request.user['id'])
         except Booking.DoesNotExist:
             return Response({'success': False, 'message': 'Booking not found'}, 
                           status=status.HTTP_404_NOT_FOUND)
+        except TransitionError as exc:
+            return Response({'success': False, 'message': str(exc)}, 
+                          status=status.HTTP_409_CONFLICT)
+
+        message = 'Charging Started' if action == 'start' else 'Charging completed'
+        return Response({'success': True, 'message': message})
 
 
 # ========== HISTORY VIEWS ==========
@@ -254,6 +255,7 @@ class OperatorChargingView(APIView):
 
 class OperatorBookingHistoryView(APIView):
     permission_classes = [IsOperator]
+    replica_reads = True  # GETs may be served from a read replica (api/routers.py)
 
     def get(self, request):
         bookings = Booking.objects.filter(
@@ -264,28 +266,51 @@ class OperatorBookingHistoryView(APIView):
             'operator'
         )
 
-        serializer = BookingSerializer(bookings, many=True)
-        return Response({'success': True, 'data': serializer.data})
+        archived = ArchivedBooking.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'vehicle', 'operator')
+        return Response(history_page(
+            request, bookings, archived, BookingSerializer, ArchivedBookingSerializer
+        ))
 
 
 class OperatorPaymentHistoryView(APIView):
     """View payment history"""
     permission_classes = [IsOperator]
+    replica_reads = True
     
     def get(self, request):
-        payments = Payment.objects.filter(operator_id=request.user['id'])
-        serializer = PaymentSerializer(payments, many=True)
-        return Response({'success': True, 'data': serializer.data})
+        payments = Payment.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator', 'booking')
+        archived = ArchivedPayment.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator')
+        return Response(history_page(
+            request, payments, archived, PaymentSerializer, ArchivedPaymentSerializer
+        ))
 
 
 class OperatorFeedbackHistoryView(APIView):
     """View feedback received"""
     permission_classes = [IsOperator]
+    replica_reads = True
     
     def get(self, request):
-        feedbacks = Feedback.objects.filter(operator_id=request.user['id'])
+        feedbacks = Feedback.objects.filter(
+            operator_id=request.user['id']
+        ).select_related('user', 'operator')
         serializer = FeedbackSerializer(feedbacks, many=True)
-        return Response({'success': True, 'data': serializer.data})
+
+        # Rating summary comes from the denormalized columns, not AVG(rating)
+        operator = VanOperator.objects.filter(operator_id=request.user['id']).only(
+            'rating_sum', 'rating_count'
+        ).first()
+        summary = {
+            'average_rating': operator.average_rating if operator else None,
+            'rating_count': operator.rating_count if operator else 0,
+        }
+        return Response({'success': True, 'data': serializer.data, 'summary': summary})
 
 # class OperatorFeedbackHistoryView(APIView):
 #     """View feedback received"""
@@ -6,12 +6,19 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from ..models import User, UserVehicle, Request, Booking, Payment, Feedback, VanOperator
+from ..models import (
+    User, UserVehicle, Request, Booking, Payment,
+    ArchivedRequest, ArchivedBooking, ArchivedPayment
+)
 from ..serializers import (
     UserSerializer, UserVehicleSerializer, RequestSerializer, 
-    BookingSerializer, PaymentSerializer, FeedbackSerializer
+    BookingSerializer, PaymentSerializer, FeedbackSerializer,
+    ArchivedRequestSerializer, ArchivedBookingSerializer, ArchivedPaymentSerializer
 )
+from .. import operator_cache
+from ..archive import history_page
 from ..permissions import IsUser
+from ..transitions import TransitionError, act_on_booking
 
 
 class UserProfileView(APIView):
@@ -140,11 +147,19 @@ class UserVehicleDetailView(APIView):
 class UserRequestListView(APIView):
     """Get user requests and create new request"""
     permission_classes = [IsUser]
+    replica_reads = True  # GETs may be served from a read replica (api/routers.py)
+    idempotent = True  # POST retries with the same Idempotency-Key replay the first response
     
     def get(self, request):
-        requests = Request.objects.filter(user_id=request.user['id'])
-        serializer = RequestSerializer(requests, many=True)
-        return Response({'success': True, 'data': serializer.data})
+        requests = Request.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'vehicle')
+        archived = ArchivedRequest.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'vehicle')
+        return Response(history_page(
+            request, requests, archived, RequestSerializer, ArchivedRequestSerializer
+        ))
     
     def post(self, request):
         data = request.data.copy()
@@ -168,7 +183,9 @@ class UserRequestDetailView(APIView):
     
     def get(self, request, request_id):
         try:
-            req = Request.objects.get(request_id=request_id, user_id=request.user['id'])
+            req = Request.objects.select_related('user', 'operator', 'vehicle').get(
+                request_id=request_id, user_id=request.user['id']
+            )
             serializer = RequestSerializer(req)
             return Response({'success': True, 'data': serializer.data})
         except Request.DoesNotExist:
@@ -181,32 +198,37 @@ class UserRequestDetailView(APIView):
 class UserBookingListView(APIView):
     """Get user bookings"""
     permission_classes = [IsUser]
+    replica_reads = True
     
     def get(self, request):
         # Get bookings through requests
-        user_requests = Request.objects.filter(user_id=request.user['id']).values_list('request_id', flat=True)
-        bookings = Booking.objects.filter(request_id__in=user_requests)
-        serializer = BookingSerializer(bookings, many=True)
-        return Response({'success': True, 'data': serializer.data})
+        bookings = Booking.objects.filter(
+            request__user_id=request.user['id']
+        ).select_related('request__user', 'request__vehicle', 'operator')
+        archived = ArchivedBooking.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'vehicle', 'operator')
+        return Response(history_page(
+            request, bookings, archived, BookingSerializer, ArchivedBookingSerializer
+        ))
 
 
 class UserBookingCancelView(APIView):
     """Cancel a booking"""
     permission_classes = [IsUser]
+    idempotent = True
     
     def put(self, request, booking_id):
         try:
-            # Verify booking belongs to user
-            user_requests = Request.objects.filter(user_id=request.user['id']).values_list('request_id', flat=True)
-            booking = Booking.objects.get(booking_id=booking_id, request_id__in=user_requests)
-            
-            booking.booking_status = 3  # Cancelled
-            booking.save()
-            
+            # Only the user's own bookings, and only before charging completes
+            act_on_booking(booking_id, 'cancel', request__user_id=request.user['id'])
             return Response({'success': True, 'message': 'Booking Cancelled'})
         except Booking.DoesNotExist:
             return Response({'success': False, 'message': 'Booking Not Found'}, 
                           status=status.HTTP_404_NOT_FOUND)
+        except TransitionError as exc:
+            return Response({'success': False, 'message': str(exc)}, 
+                          status=status.HTTP_409_CONFLICT)
 
 
 # ========== PAYMENT VIEWS ==========
@@ -214,15 +236,19 @@ class UserBookingCancelView(APIView):
 class UserPaymentView(APIView):
     """Create payment"""
     permission_classes = [IsUser]
+    replica_reads = True
+    idempotent = True
     def get(self, request):
         # Get payments of logged-in user
-        payments = Payment.objects.filter(user_id=request.user['id'])
-        serializer = PaymentSerializer(payments, many=True)
-
-        return Response({
-            'success': True,
-            'data': serializer.data
-        })
+        payments = Payment.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator', 'booking')
+        archived = ArchivedPayment.objects.filter(
+            user_id=request.user['id']
+        ).select_related('user', 'operator')
+        return Response(history_page(
+            request, payments, archived, PaymentSerializer, ArchivedPaymentSerializer
+        ))
     
     def post(self, request):
         data = request.data.copy()
@@ -270,17 +296,16 @@ class TrackOperatorView(APIView):
     permission_classes = [IsUser]
     
     def get(self, request, operator_id):
-        try:
-            operator = VanOperator.objects.get(operator_id=operator_id)
-            return Response({
-                'success': True, 
-                'data': {
-                    'operator_id': operator.operator_id,
-                    'operator_name': operator.operator_name,
-                    'operator_status': operator.operator_status,
-                    'is_online': operator.operator_status == 1
-                }
-            })
-        except VanOperator.DoesNotExist:
+        operator = operator_cache.operator(operator_id)
+        if operator is None:
             return Response({'success': False, 'message': 'Operator Not Found'}, 
                           status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'success': True, 
+            'data': {
+                'operator_id': operator.operator_id,
+                'operator_name': operator.operator_name,
+                'operator_status': operator.operator_status,
+                'is_online': operator.operator_status == 1
+            }
+        })
@@ -0,0 +1,206 @@
+"""
+WebSocket endpoints, served by chargenow/asgi.py.
+
+``/ws/operator/requests/?token=<jwt>`` is the operator's live request
+inbox, in place of polling GET /api/operator/requests/:
+
+- On connect the server sends ``{"type": "requests", "data": [...]}``
+  with the same rows as the list endpoint.
+- Whenever one of the operator's requests is created or changes, the
+  server sends another ``requests`` message with just those rows. Rows
+  that were deleted come as ``{"type": "requests.removed", "ids": [...]}``.
+- The client may send ``{"action": "accept" | "reject", "request_id": 7,
+  "id": <anything>}``. The server replies ``{"type": "action.result",
+  "id": ..., "request_id": 7, "ok": true, "booking_id": 12}``, or ``"ok":
+  false`` with ``"error"`` (not_found, conflict or invalid) and ``"message"``.
+  This works like PUT /api/operator/requests/<id>/.
+- If changes arrive faster than the socket takes them, some are dropped.
+  The server then sends ``{"type": "resync"}`` followed by a ``requests``
+  message with every row; the client should replace its list with it.
+
+Changes reach the socket through the in-memory channel layer
+(api/channels.py). Each operator has a group, and signals.py sends to it
+after commit. A burst of changes is loaded with one query. The socket has
+no Idempotency-Key: an action that is sent again gets a ``conflict``
+result once the first one has gone through.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+
+from .authentication import decode_token
+from .channels import OVERFLOW, channel_layer
+from .models import Request
+from .serializers import RequestSerializer
+from .transitions import REQUEST_ACTIONS, TransitionError, act_on_request
+
+logger = logging.getLogger('api.websocket')
+
+# Close codes (4000-4999 are for applications)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def inbox_group(operator_id):
+    return f'operator-requests-{operator_id}'
+
+
+def request_changed(operator_id, request_id):
+    """Tell ``operator_id``'s open inboxes about a row, once the transaction commits."""
+    message = {'type': 'request.changed', 'request_id': request_id}
+    transaction.on_commit(lambda: channel_layer.group_send_nowait(inbox_group(operator_id), message))
+
+
+async def run_db(func, *args):
+    """Run ``func`` in a worker thread, then give its connection back to the pool."""
+    def call():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            from django.db import connection
+            connection.close()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+# ========== OPERATOR INBOX ==========
+
+def load_requests(operator_id, request_ids=None):
+    """Serialized rows for the inbox, all of them or just ``request_ids``."""
+    rows = Request.objects.filter(operator_id=operator_id).select_related('user', 'operator', 'vehicle')
+    if request_ids is not None:
+        rows = rows.filter(pk__in=request_ids)
+    return RequestSerializer(rows, many=True).data
+
+
+def perform_action(operator_id, message):
+    reply = {'type': 'action.result', 'id': message.get('id'), 'request_id': message.get('request_id')}
+    action = message.get('action')
+    if action not in REQUEST_ACTIONS or not isinstance(message.get('request_id'), int):
+        return {**reply, 'ok': False, 'error': 'invalid',
+                'message': 'Send {"action": "accept" | "reject", "request_id": <int>}'}
+    try:
+        _, booking = act_on_request(message['request_id'], operator_id, action)
+    except Request.DoesNotExist:
+        return {**reply, 'ok': False, 'error': 'not_found', 'message': 'Request not found'}
+    except TransitionError as exc:
+        return {**reply, 'ok': False, 'error': 'conflict', 'message': str(exc)}
+    if booking is not None:
+        reply['booking_id'] = booking.booking_id
+    return {**reply, 'ok': True}
+
+
+class OperatorInbox:
+
+    def __init__(self, operator_id, receive, send):
+        self.operator_id = operator_id
+        self.receive = receive
+        self.send = send
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def run(self):
+        channel = await channel_layer.new_channel('inbox')
+        group = inbox_group(self.operator_id)
+        await channel_layer.group_add(group, channel)
+        try:
+            await self.send({'type': 'websocket.accept'})
+            await self.send_json({'type': 'requests', 'data': await run_db(load_requests, self.operator_id)})
+            await self.serve(channel)
+        finally:
+            channel_layer.close_channel(channel)
+
+    async def serve(self, channel):
+        from_client = asyncio.ensure_future(self.receive())
+        from_layer = asyncio.ensure_future(channel_layer.receive(channel))
+        try:
+            while True:
+                done, _ = await asyncio.wait({from_client, from_layer}, return_when=asyncio.FIRST_COMPLETED)
+                if from_layer in done:
+                    await self.push_changes(channel, from_layer.result())
+                    from_layer = asyncio.ensure_future(channel_layer.receive(channel))
+                if from_client in done:
+                    event = from_client.result()
+                    if event['type'] == 'websocket.disconnect':
+                        return
+                    if event['type'] == 'websocket.receive':
+                        await self.handle_message(event.get('text') or event.get('bytes') or '')
+                    from_client = asyncio.ensure_future(self.receive())
+        finally:
+            from_client.cancel()
+            from_layer.cancel()
+
+    async def push_changes(self, channel, first):
+        # Whatever else is queued goes out in the same query
+        messages = [first]
+        while (message := channel_layer.receive_nowait(channel)) is not None:
+            messages.append(message)
+        if any(message['type'] == OVERFLOW for message in messages):
+            # Some changes were lost; send every row again
+            await self.send_json({'type': 'resync'})
+            await self.send_json({'type': 'requests', 'data': await run_db(load_requests, self.operator_id)})
+            return
+        ids = {message['request_id'] for message in messages}
+        rows = await run_db(load_requests, self.operator_id, ids)
+        if rows:
+            await self.send_json({'type': 'requests', 'data': rows})
+        removed = ids - {row['request_id'] for row in rows}
+        if removed:
+            await self.send_json({'type': 'requests.removed', 'ids': sorted(removed)})
+
+    async def handle_message(self, text):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.send_json({'type': 'error', 'message': 'Messages must be JSON objects'})
+            return
+        await self.send_json(await run_db(perform_action, self.operator_id, message))
+
+
+# ========== ROUTING ==========
+
+def authenticate(scope):
+    """Token payload from ``?token=`` or an Authorization header, or None."""
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if token is None:
+        header = dict(scope.get('headers', ())).get(b'authorization', b'').decode().split()
+        if len(header) == 2 and header[0].lower() == 'bearer':
+            token = header[1]
+    if not token:
+        return None
+    try:
+        return decode_token(token)
+    except jwt.InvalidTokenError:
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    if scope['path'].rstrip('/') != '/ws/operator/requests':
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    payload = authenticate(scope)
+    if payload is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    if payload.get('role') != 2:
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+
+    try:
+        await OperatorInbox(payload['id'], receive, send).run()
+    except Exception:
+        logger.exception('websocket failed', extra={'path': scope['path'], 'operator': payload['id']})
+        raise
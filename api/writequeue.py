@@ -0,0 +1,95 @@
+"""
+Coalescing write queue for bursty, last-value-wins updates.
+
+With SQLite only one connection can write at a time. If many request threads
+each write a location ping, they all queue on the database lock. Instead,
+``submit()`` records the new field values in memory and returns at once.
+A single writer thread flushes everything pending in one transaction every
+``flush_interval`` seconds. Repeated updates to the same row are merged, so
+only the latest value is written. ``.update()`` is used, so save() signals
+are not sent.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection, transaction
+from django.db.utils import OperationalError
+
+
+logger = logging.getLogger('api.db')
+
+
+class CoalescingWriteQueue:
+
+    def __init__(self, name, flush_interval=0.05, retries=3):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.submitted = 0
+        self.written = 0
+        self._pending = {}  # (model, pk) -> {field: value}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, thread or caller
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, model, pk, **fields):
+        with self._lock:
+            self._pending.setdefault((model, pk), {}).update(fields)
+            self.submitted += 1
+            if self._thread is None:
+                self._start()
+        self._wakeup.set()
+
+    def pending(self, model, pk):
+        """Values submitted for a row but not yet written, if any."""
+        with self._lock:
+            return dict(self._pending.get((model, pk), {}))
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f'chargenow-writes-{self.name}', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let a burst accumulate so it lands in one transaction
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                # Hand the (pooled) connection back while idle
+                connection.close()
+
+    def flush(self):
+        """Write everything pending now, in the calling thread."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            for attempt in range(self.retries):
+                try:
+                    with transaction.atomic():
+                        for (model, pk), fields in batch.items():
+                            model._base_manager.filter(pk=pk).update(**fields)
+                    break
+                except OperationalError:
+                    if attempt == self.retries - 1:
+                        logger.exception('write queue flush failed', extra={
+                            'queue': self.name, 'rows': len(batch),
+                        })
+                        return 0
+                    time.sleep(self.flush_interval * (attempt + 1))
+            self.written += len(batch)
+            return len(batch)
+
+
+location_writes = CoalescingWriteQueue('location')
+atexit.register(location_writes.flush)
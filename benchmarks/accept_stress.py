@@ -0,0 +1,218 @@
+"""
+Concurrency stress test for accepting and rejecting requests.
+
+    python benchmarks/accept_stress.py --requests 200 --processes 4 --threads 8
+
+Seeds a file-backed SQLite database with ``--requests`` extra pending
+requests. Several processes then start, each running several threads, and
+every thread sends PUT /api/operator/requests/<id>/ for every pending
+request in a random order. Most calls accept and some reject. A third of them carry an Idempotency-Key
+shared by every thread, like a client retrying. Separate processes each get
+their own booking id block allocator (api/sequences.py).
+
+Afterwards the database is checked:
+
+- every request was decided exactly once: each accepted request has one
+  booking, each rejected request has none, and none is still pending
+- no call failed with a 5xx
+- booking ids are unique and above the ids that existed before the run
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import setup_django, git_revision, save_results, summarize_ms
+
+
+def database(path):
+    from django.conf import settings
+
+    default = {**settings.DATABASES['default'], 'NAME': str(path)}
+    # Every thread holds a connection for the whole run
+    default['OPTIONS'] = {**default['OPTIONS'], 'pool': {**default['OPTIONS']['pool'], 'size': 64}}
+    return default
+
+
+def prepare(count):
+    from django.core.management import call_command
+    from django.db.models import Max
+    from api.models import Request, Booking, UserVehicle, ChargingVan
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_data', scale=0.05, skip_derived=True, verbosity=0)
+    rng = random.Random(0)
+    operators = list(ChargingVan.objects.values_list('operator_id', flat=True))
+    vehicles = list(UserVehicle.objects.values('user_id', 'vehicle_id'))
+    Request.objects.bulk_create([
+        Request(
+            operator_id=rng.choice(operators), amount=500,
+            user_latitude=23.02, user_longitude=72.57, **rng.choice(vehicles),
+        )
+        for _ in range(count)
+    ])
+    return {
+        'pending': list(Request.objects.filter(request_status=0).values_list('request_id', flat=True)),
+        'booking_id_before': Booking.objects.aggregate(top=Max('booking_id'))['top'] or 0,
+    }
+
+
+def worker(targets, seed, results):
+    from django.db import connection
+    from django.test import Client
+
+    rng = random.Random(seed)
+    client = Client()
+    order = list(targets)
+    rng.shuffle(order)
+    statuses, latencies = Counter(), []
+    try:
+        for request_id, token in order:
+            action = 'reject' if rng.random() < 0.2 else 'accept'
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+            if rng.random() < 1 / 3:
+                headers['HTTP_IDEMPOTENCY_KEY'] = f'stress-{request_id}'
+                action = 'accept'  # a retry repeats the same body
+            start = time.perf_counter()
+            response = client.put(
+                f'/api/operator/requests/{request_id}/', json.dumps({'action': action}),
+                content_type='application/json', **headers,
+            )
+            latencies.append(time.perf_counter() - start)
+            replayed = response.get('Idempotent-Replayed') == 'true'
+            statuses[f"{response.status_code}{' replayed' if replayed else ''}"] += 1
+    finally:
+        connection.close()
+    results.append((statuses, latencies))
+
+
+def child(threads, path, seed):
+    setup_django(DATABASES={'default': database(path)}, LOCATION_WRITE_QUEUE=False)
+    from api.authentication import generate_token
+    from api.models import Request
+
+    targets = [
+        (row['request_id'], generate_token(row['operator_id'], 'stress@example.com', 2, 'Stress'))
+        for row in Request.objects.filter(request_status=0).values('request_id', 'operator_id')
+    ]
+    results = []
+    pool = [threading.Thread(target=worker, args=(targets, seed * 100 + i, results)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    statuses = sum((r[0] for r in results), Counter())
+    return {'statuses': dict(statuses), 'latencies': [t for r in results for t in r[1]]}
+
+
+def verify(pending, booking_id_before):
+    from django.db.models import Count
+    from api.models import Request, Booking
+
+    problems = []
+    decided = Counter()
+    rows = Request.objects.filter(request_id__in=pending).annotate(n=Count('bookings'))
+    for request_id, status, bookings in rows.values_list('request_id', 'request_status', 'n'):
+        if status == 0:
+            problems.append(f'request {request_id} still pending')
+        elif status == 1 and bookings != 1:
+            problems.append(f'accepted request {request_id} has {bookings} bookings')
+        elif status == 2 and bookings:
+            problems.append(f'rejected request {request_id} has {bookings} bookings')
+        decided[status] += 1
+    new_ids = Booking.objects.filter(booking_id__gt=booking_id_before).count()
+    return problems, {'accepted': decided[1], 'rejected': decided[2], 'new_bookings': new_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output')
+    parser.add_argument('--child', nargs=3, metavar=('THREADS', 'PATH', 'SEED'), help=argparse.SUPPRESS)
+    parser.add_argument('--prepare', nargs=2, metavar=('COUNT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        count, path = args.prepare
+        setup_django(DATABASES={'default': database(path)}, LOCATION_WRITE_QUEUE=False)
+        print(json.dumps(prepare(int(count))))
+        return 0
+    if args.child:
+        threads, path, seed = args.child
+        print(json.dumps(child(int(threads), path, int(seed))))
+        return 0
+
+    workdir = Path(tempfile.mkdtemp(prefix='chargenow-accept-stress-'))
+    path = workdir / 'stress.sqlite3'
+    try:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--prepare', str(args.requests), str(path)], text=True,
+        )
+        before = json.loads(output.strip().splitlines()[-1])
+
+        start = time.perf_counter()
+        children = [
+            subprocess.Popen(
+                [sys.executable, __file__, '--child', str(args.threads), str(path), str(seed)],
+                stdout=subprocess.PIPE, text=True,
+            )
+            for seed in range(args.processes)
+        ]
+        outputs = [json.loads(c.communicate()[0].strip().splitlines()[-1]) for c in children]
+        elapsed = time.perf_counter() - start
+
+        setup_django(DATABASES={'default': database(path)}, LOCATION_WRITE_QUEUE=False)
+        problems, decided = verify(before['pending'], before['booking_id_before'])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    statuses = sum((Counter(o['statuses']) for o in outputs), Counter())
+    latencies = [t for o in outputs for t in o['latencies']]
+    server_errors = sum(n for code, n in statuses.items() if code.startswith('5'))
+    if server_errors:
+        problems.append(f'{server_errors} responses were 5xx')
+    if decided['accepted'] + decided['rejected'] != len(before['pending']):
+        problems.append(f"{decided['accepted'] + decided['rejected']} of {len(before['pending'])} requests decided")
+    if decided['new_bookings'] != decided['accepted']:
+        problems.append(f"{decided['new_bookings']} new booking ids for {decided['accepted']} accepts")
+
+    calls = sum(statuses.values())
+    print(f"{calls} calls from {args.processes} processes x {args.threads} threads "
+          f"in {elapsed:.2f}s ({calls / elapsed:.1f}/s)")
+    for code, count in sorted(statuses.items()):
+        print(f"  {code:12} {count}")
+    print(f"{len(before['pending'])} pending requests: accepted {decided['accepted']}, rejected {decided['rejected']}")
+    for problem in problems[:20]:
+        print(f"FAIL {problem}")
+    print('OK' if not problems else f'{len(problems)} problems')
+
+    result = {
+        'benchmark': 'accept_stress',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'requests': args.requests,
+        'processes': args.processes,
+        'threads': args.threads,
+        'calls_per_second': round(calls / elapsed, 1),
+        'statuses': dict(statuses),
+        'decided': decided,
+        'problems': problems,
+        **summarize_ms(latencies),
+    }
+    print(f"saved {save_results(result, args.output, name='accept-stress')}")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
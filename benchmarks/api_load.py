@@ -0,0 +1,427 @@
+"""
+Mixed-traffic load benchmark for every endpoint in api/urls.py.
+
+Fills a throwaway test database with ``manage.py generate_data``, replays a
+weighted mix of user and operator calls through the Django test client, and
+reports p50/p95/p99 latency, queries per request and error counts per
+endpoint, plus overall throughput. Results are saved as JSON so two commits
+can be compared:
+
+    python benchmarks/api_load.py --scale 1 --requests 5000
+    python benchmarks/api_load.py --compare benchmarks/results/api-load-abc123.json \\
+                                            benchmarks/results/api-load-def456.json
+"""
+import argparse
+import itertools
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from common import (
+    setup_django, test_database, summarize_ms, git_revision,
+    save_results, load_results,
+)
+
+
+PDF_BYTES = b'%PDF-1.4\n1 0 obj\n<<>>\nendobj\ntrailer\n<<>>\n%%EOF\n'
+
+
+class Traffic:
+    """Builds one request at a time for each scenario from the generated data."""
+
+    def __init__(self, rng):
+        from api.authentication import generate_token
+        from api.models import User, VanOperator, UserVehicle, Request, Booking
+
+        self.rng = rng
+        self.counter = itertools.count()
+
+        users = list(User.objects.values('user_id', 'user_email', 'user_name')[:500])
+        operators = list(
+            VanOperator.objects.filter(chargingvan__isnull=False)
+            .values('operator_id', 'operator_email', 'operator_name')[:200]
+        )
+        self.users = [
+            (u['user_id'], u['user_email'], self.header(generate_token(u['user_id'], u['user_email'], 1, u['user_name'])))
+            for u in users
+        ]
+        self.operators = [
+            (o['operator_id'], o['operator_email'], self.header(generate_token(o['operator_id'], o['operator_email'], 2, o['operator_name'])))
+            for o in operators
+        ]
+        self.user_headers = {user_id: headers for user_id, _, headers in self.users}
+        self.operator_headers = {operator_id: headers for operator_id, _, headers in self.operators}
+
+        user_ids = [u[0] for u in self.users]
+        operator_ids = [o[0] for o in self.operators]
+        self.vehicles = defaultdict(list)
+        for vehicle_id, user_id in UserVehicle.objects.filter(user_id__in=user_ids).values_list('vehicle_id', 'user_id'):
+            self.vehicles[user_id].append(vehicle_id)
+        self.user_requests_by_id = defaultdict(list)
+        self.operator_requests_by_id = defaultdict(list)
+        for request_id, user_id, operator_id in Request.objects.filter(
+            user_id__in=user_ids
+        ).values_list('request_id', 'user_id', 'operator_id'):
+            self.user_requests_by_id[user_id].append((request_id, operator_id))
+        for request_id, operator_id in Request.objects.filter(
+            operator_id__in=operator_ids, request_status=0
+        ).values_list('request_id', 'operator_id'):
+            self.operator_requests_by_id[operator_id].append(request_id)
+        self.user_bookings_by_id = defaultdict(list)
+        for booking_id, user_id in Booking.objects.filter(
+            request__user_id__in=user_ids
+        ).values_list('booking_id', 'request__user_id'):
+            self.user_bookings_by_id[user_id].append(booking_id)
+
+        # Bookings still scheduled (0) or charging (1), tracked as the run moves
+        # them on, so cancel/start/complete always target a booking that allows it
+        self.open_bookings = {}  # booking_id -> [user_id, operator_id, status]
+        self.user_open = defaultdict(list)
+        self.operator_open = defaultdict(list)
+        for booking_id, user_id, operator_id, booking_status in Booking.objects.filter(
+            booking_status__in=(0, 1)
+        ).values_list('booking_id', 'request__user_id', 'operator_id', 'booking_status'):
+            if user_id not in self.user_headers and operator_id not in self.operator_headers:
+                continue
+            self.open_bookings[booking_id] = [user_id, operator_id, booking_status]
+            self.user_open[user_id].append(booking_id)
+            self.operator_open[operator_id].append(booking_id)
+
+    @staticmethod
+    def header(token):
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def user(self):
+        return self.rng.choice(self.users)
+
+    def operator(self):
+        return self.rng.choice(self.operators)
+
+    def unique(self):
+        return f'{next(self.counter)}{self.rng.randrange(10 ** 6)}'
+
+    def pick(self, items_by_id, headers_by_id):
+        """``(id, headers)`` of a random caller with at least one item, or None."""
+        ids = [key for key in headers_by_id if items_by_id.get(key)]
+        if not ids:
+            return None
+        key = self.rng.choice(ids)
+        return key, headers_by_id[key]
+
+    def close_booking(self, booking_id):
+        user_id, operator_id, _ = self.open_bookings.pop(booking_id)
+        self.user_open[user_id].remove(booking_id)
+        self.operator_open[operator_id].remove(booking_id)
+
+    # Each scenario returns (method, path, data, extra kwargs), or None when
+    # the data has nothing left it could succeed on
+
+    def login(self):
+        _, email, _ = self.user()
+        return 'post', '/api/auth/login/', {'email': email, 'password': 'password123'}, {}
+
+    def user_register(self):
+        n = self.unique()
+        return 'post', '/api/auth/user/register/', {
+            'user_name': 'Bench User', 'user_email': f'bu{n}@example.com', 'user_password': 'pw',
+            'user_phone': 9100000000, 'user_address': 'Bench Road',
+        }, {}
+
+    def operator_register(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        n = self.unique()
+        return 'post', '/api/auth/operator/register/', {
+            'operator_name': 'Bench Op', 'operator_email': f'bo{n}@example.com',
+            'operator_password': 'pw', 'operator_phone': 8100000000,
+            'operator_license': SimpleUploadedFile('license.pdf', PDF_BYTES, 'application/pdf'),
+        }, {'multipart': True}
+
+    def forgot_password(self):
+        _, email, _ = self.user()
+        return 'post', '/api/auth/forgot-password/', {'email': email, 'new_password': 'password123'}, {}
+
+    def user_profile(self):
+        return 'get', '/api/user/profile/', None, self.user()[2]
+
+    def user_profile_update(self):
+        return 'put', '/api/user/profile/', {'user_address': 'Updated Road'}, self.user()[2]
+
+    def user_vehicles(self):
+        return 'get', '/api/user/vehicles/', None, self.user()[2]
+
+    def user_vehicle_add(self):
+        return 'post', '/api/user/vehicles/', {
+            'vehicle_company': 'Tata', 'vehicle_name': 'Nexon EV', 'vehicle_model': '2024',
+            'vehicle_number': f'B{self.unique()}'[:20],
+        }, self.user()[2]
+
+    def user_vehicle_update(self):
+        caller = self.pick(self.vehicles, self.user_headers)
+        if caller is None:
+            return None
+        user_id, headers = caller
+        vehicle_id = self.rng.choice(self.vehicles[user_id])
+        return 'put', f'/api/user/vehicles/{vehicle_id}/', {'vehicle_model': '2025'}, headers
+
+    def user_requests(self):
+        return 'get', '/api/user/requests/', None, self.user()[2]
+
+    def user_request_create(self):
+        user_id, _, headers = self.user()
+        return 'post', '/api/user/requests/', {
+            'vehicle': self.rng.choice(self.vehicles[user_id] or [0]),
+            'operator': self.operator()[0],
+            'user_latitude': '23.02', 'user_longitude': '72.57', 'amount': 500,
+        }, headers
+
+    def user_request_detail(self):
+        caller = self.pick(self.user_requests_by_id, self.user_headers)
+        if caller is None:
+            return None
+        user_id, headers = caller
+        request_id = self.rng.choice(self.user_requests_by_id[user_id])[0]
+        return 'get', f'/api/user/requests/{request_id}/', None, headers
+
+    def user_bookings(self):
+        return 'get', '/api/user/bookings/', None, self.user()[2]
+
+    def user_booking_cancel(self):
+        caller = self.pick(self.user_open, self.user_headers)
+        if caller is None:
+            return None
+        user_id, headers = caller
+        booking_id = self.rng.choice(self.user_open[user_id])
+        self.close_booking(booking_id)
+        return 'put', f'/api/user/bookings/{booking_id}/cancel/', {}, headers
+
+    def user_payments(self):
+        return 'get', '/api/user/payments/', None, self.user()[2]
+
+    def user_payment_create(self):
+        user_id, _, headers = self.user()
+        booking_id = self.rng.choice(self.user_bookings_by_id[user_id] or [0])
+        return 'post', '/api/user/payments/', {
+            'booking': booking_id, 'user': user_id, 'operator': self.operator()[0],
+            'amount': 500, 'payment_method': 2,
+        }, headers
+
+    def user_feedback(self):
+        user_id, _, headers = self.user()
+        return 'post', '/api/user/feedback/', {
+            'operator': self.operator()[0], 'rating': 5, 'comments': 'Bench feedback',
+        }, headers
+
+    def track_operator(self):
+        return 'get', f'/api/user/track-operator/{self.operator()[0]}/', None, self.user()[2]
+
+    def operator_profile(self):
+        return 'get', '/api/operator/profile/', None, self.operator()[2]
+
+    def operator_profile_update(self):
+        return 'put', '/api/operator/profile/', {'operator_name': 'Bench Op'}, self.operator()[2]
+
+    def operator_status(self):
+        return 'put', '/api/operator/status/', {'status': self.rng.choice([0, 1])}, self.operator()[2]
+
+    def operator_van(self):
+        return 'get', '/api/operator/van/', None, self.operator()[2]
+
+    def operator_location(self):
+        return 'put', '/api/operator/van/update-location/', {
+            'latitude': round(23.0 + self.rng.random() / 10, 6),
+            'longitude': round(72.5 + self.rng.random() / 10, 6),
+        }, self.operator()[2]
+
+    def operator_requests(self):
+        return 'get', '/api/operator/requests/', None, self.operator()[2]
+
+    def operator_request_action(self):
+        caller = self.pick(self.operator_requests_by_id, self.operator_headers)
+        if caller is None:
+            return None
+        operator_id, headers = caller
+        request_id = self.operator_requests_by_id[operator_id].pop()
+        action = self.rng.choices(['accept', 'reject'], weights=[3, 1])[0]
+        return 'put', f'/api/operator/requests/{request_id}/', {'action': action}, headers
+
+    def operator_charging(self):
+        caller = self.pick(self.operator_open, self.operator_headers)
+        if caller is None:
+            return None
+        operator_id, headers = caller
+        booking_id = self.rng.choice(self.operator_open[operator_id])
+        booking = self.open_bookings[booking_id]
+        if booking[2] == 0:
+            action = 'start'
+            booking[2] = 1
+        else:
+            action = 'complete'
+            self.close_booking(booking_id)
+        return 'put', f'/api/operator/charging/{booking_id}/', {'action': action}, headers
+
+    def operator_bookings(self):
+        return 'get', '/api/operator/bookings/', None, self.operator()[2]
+
+    def operator_payments(self):
+        return 'get', '/api/operator/payments/', None, self.operator()[2]
+
+    def operator_feedback(self):
+        return 'get', '/api/operator/feedback/', None, self.operator()[2]
+
+
+# (scenario, weight). Reads dominate; location pings are the hottest write.
+MIX = [
+    ('login', 1), ('user_register', 1), ('operator_register', 1), ('forgot_password', 1),
+    ('user_profile', 10), ('user_profile_update', 2),
+    ('user_vehicles', 8), ('user_vehicle_add', 2), ('user_vehicle_update', 2),
+    ('user_requests', 10), ('user_request_create', 4), ('user_request_detail', 5),
+    ('user_bookings', 8), ('user_booking_cancel', 1),
+    ('user_payments', 5), ('user_payment_create', 1), ('user_feedback', 2),
+    ('track_operator', 5),
+    ('operator_profile', 6), ('operator_profile_update', 1), ('operator_status', 2),
+    ('operator_van', 8), ('operator_location', 20),
+    ('operator_requests', 10), ('operator_request_action', 3), ('operator_charging', 3),
+    ('operator_bookings', 6), ('operator_payments', 5), ('operator_feedback', 5),
+]
+
+# Left out of the run because every call fails at this revision, so their
+# rows would only time the error path. Put them back once the views work.
+EXCLUDED = {
+    'user_request_create': 'RequestSerializer has no writable user/operator/vehicle fields (IntegrityError)',
+    'user_feedback': 'FeedbackSerializer has no writable user/operator fields (IntegrityError)',
+}
+
+
+def run(args):
+    setup_django(MEDIA_ROOT=tempfile.mkdtemp(prefix='chargenow-bench-media-'))
+
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test import Client
+
+    with test_database():
+        start = time.perf_counter()
+        call_command('generate_data', scale=args.scale, seed=args.seed, verbosity=0)
+        generate_seconds = time.perf_counter() - start
+
+        rng = random.Random(args.seed)
+        traffic = Traffic(rng)
+        client = Client(raise_request_exception=False)
+        mix = [(name, weight) for name, weight in MIX if name not in EXCLUDED]
+        names = [name for name, weight in mix]
+        weights = [weight for name, weight in mix]
+
+        latencies = defaultdict(list)
+        queries = defaultdict(list)
+        errors = defaultdict(int)
+        skipped = defaultdict(int)
+        query_count = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            query_count[0] += 1
+            return execute(sql, params, many, context)
+
+        wall_start = time.perf_counter()
+        with connections['default'].execute_wrapper(count_queries):
+            for name in rng.choices(names, weights=weights, k=args.requests):
+                scenario = getattr(traffic, name)()
+                if scenario is None:
+                    skipped[name] += 1
+                    continue
+                method, path, data, extra = scenario
+                extra = dict(extra)
+                if extra.pop('multipart', False):
+                    kwargs = {'data': data}
+                elif method == 'get':
+                    kwargs = {}
+                else:
+                    kwargs = {'data': data, 'content_type': 'application/json'}
+
+                query_count[0] = 0
+                t0 = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs, **extra)
+                latencies[name].append(time.perf_counter() - t0)
+                queries[name].append(query_count[0])
+                if response.status_code >= 400:
+                    errors[name] += 1
+        wall = time.perf_counter() - wall_start
+
+    endpoints = {}
+    for name in names:
+        samples = latencies[name]
+        if not samples:
+            continue
+        endpoints[name] = {
+            'count': len(samples),
+            'errors': errors[name],
+            'mean_queries': round(sum(queries[name]) / len(samples), 2),
+            **summarize_ms(samples),
+        }
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        'benchmark': 'api_load',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scale': args.scale,
+        'seed': args.seed,
+        'requests': total,
+        'generate_seconds': round(generate_seconds, 2),
+        'throughput_rps': round(total / wall, 1) if wall else 0,
+        'all': summarize_ms([s for v in latencies.values() for s in v]),
+        'endpoints': endpoints,
+        'skipped': dict(skipped),
+        'excluded': EXCLUDED,
+    }
+
+
+def report(result):
+    print(f"revision {result['revision']}  scale {result['scale']}  "
+          f"{result['requests']} requests  {result['throughput_rps']} req/s")
+    print(f"{'endpoint':28} {'n':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+    for name, row in sorted(result['endpoints'].items()):
+        print(f"{name:28} {row['count']:5} {row['errors']:4} {row['p50_ms']:8.2f} "
+              f"{row['p95_ms']:8.2f} {row['p99_ms']:8.2f} {row['mean_queries']:8.2f}")
+    for name, count in sorted(result.get('skipped', {}).items()):
+        print(f"skipped {count} {name} calls: no target left in a state that allows it")
+    for name, reason in sorted(result.get('excluded', {}).items()):
+        print(f"excluded {name}: {reason}")
+
+
+def compare(old_path, new_path):
+    old, new = load_results(old_path), load_results(new_path)
+    print(f"{old['revision']} -> {new['revision']}  throughput "
+          f"{old['throughput_rps']} -> {new['throughput_rps']} req/s")
+    print(f"{'endpoint':28} {'p95 old':>9} {'p95 new':>9} {'change':>8} {'queries':>15}")
+    for name in sorted(set(old['endpoints']) | set(new['endpoints'])):
+        a, b = old['endpoints'].get(name), new['endpoints'].get(name)
+        if not a or not b:
+            continue
+        change = (b['p95_ms'] - a['p95_ms']) / a['p95_ms'] * 100 if a['p95_ms'] else 0
+        print(f"{name:28} {a['p95_ms']:9.2f} {b['p95_ms']:9.2f} {change:+7.1f}% "
+              f"{a['mean_queries']:7.2f}->{b['mean_queries']:<7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.5)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON file (default benchmarks/results/api-load-<rev>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    result = run(args)
+    report(result)
+    print(f"saved {save_results(result, args.output, name='api-load')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Shared helpers for the scripts in benchmarks/.
+
+Each script runs against a throwaway test database, never db.sqlite3.
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chargenow.settings')
+
+
+def setup_django(**overrides):
+    """Configure Django with production-like settings plus ``overrides``."""
+    import django
+    from django.conf import settings
+
+    defaults = {
+        'DEBUG': False,
+        'QUERY_AUDIT_ENABLED': False,
+        'PROFILE_URL_PATTERNS': [],
+    }
+    defaults.update(overrides)
+    # Before setup(), so apps and connections see the overrides when they load
+    for name, value in defaults.items():
+        setattr(settings, name, value)
+    django.setup()
+    return settings
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Create (and afterwards destroy) the test database for every alias."""
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from django.test.utils import setup_databases, teardown_databases
+
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize_ms(seconds):
+    return {
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(data, output=None, name='results'):
+    path = Path(output) if output else RESULTS_DIR / f"{name}-{data['revision']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True))
+    return path
+
+
+def load_results(path):
+    return json.loads(Path(path).read_text())
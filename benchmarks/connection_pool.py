@@ -0,0 +1,124 @@
+"""
+Per-request connect vs pooled connections.
+
+    python benchmarks/connection_pool.py --requests 2000 --threads 1,8
+
+Each simulated request does what a typical API call does (two small reads)
+and then closes its connection, as Django does at the end of every request
+with CONN_MAX_AGE = 0. The "connect" alias opens a new connection every
+time. The "pooled" alias returns it to api.backends.pool. Both point at the
+same file-backed SQLite database; SQLite connects are cheap, so the gap will
+be far larger on a networked database.
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import setup_django, git_revision, save_results, summarize_ms, percentile
+
+
+def configure(path, pool_size):
+    from django.conf import settings
+
+    default = settings.DATABASES['default']
+    pooled = {
+        **default, 'NAME': str(path),
+        'OPTIONS': {**default['OPTIONS'], 'pool': {**default['OPTIONS']['pool'], 'size': pool_size}},
+    }
+    connect = {**pooled, 'OPTIONS': {**pooled['OPTIONS'], 'pool': None}}
+    return {'default': pooled, 'connect': connect}
+
+
+def run(alias, threads, total, operators):
+    from django.db import connections
+    from api import metrics
+    from api.models import VanOperator, ChargingVan
+
+    latencies, waits = [], []
+    lock = threading.Lock()
+    per_thread = total // threads
+
+    def worker(seed):
+        rng = random.Random(seed)
+        mine, waited = [], []
+        for _ in range(per_thread):
+            stats = metrics.RequestStats()
+            token = metrics.current_stats.set(stats)
+            start = time.perf_counter()
+            operator_id = rng.choice(operators)
+            VanOperator.objects.using(alias).filter(operator_id=operator_id).first()
+            ChargingVan.objects.using(alias).filter(operator_id=operator_id).first()
+            connections[alias].close()
+            mine.append(time.perf_counter() - start)
+            waited.append(stats.pool_wait_seconds)
+            metrics.current_stats.reset(token)
+        with lock:
+            latencies.extend(mine)
+            waits.extend(waited)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': 'pooled' if alias == 'default' else 'connect',
+        'threads': threads,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'pool_wait_p95_ms': round(percentile(waits, 95) * 1000, 3),
+        **summarize_ms(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', default='1,8')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='chargenow-pool-bench-'))
+    path = workdir / 'bench.sqlite3'
+    try:
+        setup_django(DATABASES=configure(path, args.pool_size))
+
+        from django.core.management import call_command
+        from api.models import ChargingVan
+
+        call_command('migrate', verbosity=0)
+        call_command('generate_data', scale=0.1, skip_derived=True, verbosity=0)
+        operators = list(ChargingVan.objects.values_list('operator_id', flat=True))
+
+        runs = []
+        for threads in [int(t) for t in args.threads.split(',')]:
+            for alias in ('connect', 'default'):
+                row = run(alias, threads, args.requests, operators)
+                runs.append(row)
+                print(f"{row['mode']:8} {threads:3} threads  {row['requests_per_second']:9.1f} req/s  "
+                      f"p50 {row['p50_ms']:7.3f} ms  p95 {row['p95_ms']:7.3f} ms  "
+                      f"pool wait p95 {row['pool_wait_p95_ms']:7.3f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'benchmark': 'connection_pool',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'requests': args.requests,
+        'pool_size': args.pool_size,
+        'runs': runs,
+    }
+    print(f"saved {save_results(result, args.output, name='connection-pool')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Job queue throughput: enqueue rate and jobs drained per second.
+
+    python benchmarks/job_queue.py --jobs 2000 --threads 1,4,8 --processes 1,2
+
+For every (processes, threads) pair, a fresh file-backed SQLite database
+gets ``--jobs`` jobs, enqueued one ``delay()`` call at a time like request
+handlers do. Then ``run_worker --burst`` drains them. Two task kinds are
+measured:
+
+- noop: pure broker overhead (claim, run, mark done)
+- io:   sleeps ``--io-ms`` to stand in for a push request or file write
+
+One extra run caps the io queue with JOB_QUEUES to show the per-queue
+concurrency limit holding throughput down. Each run is its own process.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import setup_django, git_revision, save_results
+
+
+def register_tasks(io_ms):
+    from api import jobs
+
+    @jobs.task(name='bench.noop', queue='bench')
+    def noop(index):
+        return index
+
+    @jobs.task(name='bench.io', queue='bench')
+    def io(index):
+        time.sleep(io_ms / 1000)
+
+    return {'noop': noop, 'io': io}
+
+
+def child(kind, processes, threads, count, io_ms, limit, path):
+    setup_django(
+        DATABASES={'default': _database(path)},
+        JOB_QUEUES={'bench': limit},
+        JOB_ALWAYS_EAGER=False,
+        JOB_SCHEDULE={},
+    )
+    from django.core.management import call_command
+    from api.models import Job
+
+    call_command('migrate', verbosity=0)
+    task = register_tasks(io_ms)[kind]
+
+    start = time.perf_counter()
+    for index in range(count):
+        task.delay(index)
+    enqueue_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    call_command(
+        'run_worker', queues='bench', threads=threads, processes=processes,
+        burst=True, poll_interval=0.05, stdout=open('/dev/null', 'w'),
+    )
+    drain_seconds = time.perf_counter() - start
+    done = Job.objects.filter(status=2).count()
+    return {
+        'kind': kind,
+        'processes': processes,
+        'threads': threads,
+        'queue_limit': limit,
+        'jobs': count,
+        'done': done,
+        'enqueue_per_second': round(count / enqueue_seconds, 1),
+        'jobs_per_second': round(done / drain_seconds, 1),
+    }
+
+
+def _database(path):
+    from django.conf import settings
+
+    default = {**settings.DATABASES['default'], 'NAME': str(path)}
+    default['OPTIONS'] = {**default['OPTIONS'], 'pool': {**default['OPTIONS']['pool'], 'size': 64}}
+    return default
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--threads', default='1,4,8')
+    parser.add_argument('--processes', default='1,2')
+    parser.add_argument('--io-ms', type=float, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--child', nargs=7, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, processes, threads, count, io_ms, limit, path = args.child
+        print(json.dumps(child(kind, int(processes), int(threads), int(count), float(io_ms), int(limit), path)))
+        return 0
+
+    workdir = Path(tempfile.mkdtemp(prefix='chargenow-jobs-bench-'))
+    configs = [
+        (kind, processes, threads, 0)
+        for kind in ('noop', 'io')
+        for processes in [int(p) for p in args.processes.split(',')]
+        for threads in [int(t) for t in args.threads.split(',')]
+    ]
+    top_threads = max(int(t) for t in args.threads.split(','))
+    configs.append(('io', 1, top_threads, 2))
+
+    runs = []
+    try:
+        for index, (kind, processes, threads, limit) in enumerate(configs):
+            path = workdir / f'run-{index}.sqlite3'
+            output = subprocess.check_output([
+                sys.executable, __file__, '--child', kind, str(processes), str(threads),
+                str(args.jobs), str(args.io_ms), str(limit), str(path),
+            ], text=True)
+            run = json.loads(output.strip().splitlines()[-1])
+            runs.append(run)
+            print(f"{kind:5} {processes} proc x {threads:2} threads  limit {limit or '-':>2}  "
+                  f"enqueue {run['enqueue_per_second']:8.1f}/s  drain {run['jobs_per_second']:8.1f} jobs/s  "
+                  f"({run['done']}/{run['jobs']} done)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'benchmark': 'job_queue',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'io_ms': args.io_ms,
+        'runs': runs,
+    }
+    print(f"saved {save_results(result, args.output, name='job-queue')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
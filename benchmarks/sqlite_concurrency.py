@@ -0,0 +1,174 @@
+"""
+Writes per second on a file-backed SQLite database under N writer threads.
+
+    python benchmarks/sqlite_concurrency.py --threads 1,4,16 --seconds 3
+
+Each thread keeps issuing what the operator app does: a location ping (look
+up the van, update its coordinates) four times out of five, otherwise a new
+charging request. Three configurations are compared:
+
+- stock:  django.db.backends.sqlite3 with no options (rollback journal)
+- tuned:  api.backends.sqlite3 with the PRAGMAs from settings (WAL etc.)
+- queued: tuned, with location pings sent through api.writequeue
+
+Every run starts from a fresh copy of the same seeded database and runs in
+its own process, so engine settings never leak between runs.
+"""
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import setup_django, git_revision, save_results
+
+
+MODES = ('stock', 'tuned', 'queued')
+
+
+def database(mode, path):
+    from django.conf import settings
+
+    if mode in ('stock', 'prepare'):
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path)}
+    tuned = {**settings.DATABASES['default'], 'NAME': str(path)}
+    # Workers hold their connection for the whole run, so give each one a slot
+    tuned['OPTIONS'] = {**tuned['OPTIONS'], 'pool': {**tuned['OPTIONS'].get('pool', {}), 'size': 64}}
+    return tuned
+
+
+def prepare(path):
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_data', scale=0.2, skip_derived=True, verbosity=0)
+
+
+def worker(mode, deadline, seed, counts):
+    from django.db import connection
+    from django.db.utils import OperationalError
+    from api.models import ChargingVan, Request
+    from api.writequeue import location_writes
+
+    rng = random.Random(seed)
+    operators = list(ChargingVan.objects.values_list('operator_id', flat=True))
+    requests = list(Request.objects.values('user_id', 'vehicle_id')[:200])
+    ok = locked = 0
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < 0.8:
+                    van = ChargingVan.objects.filter(operator_id=rng.choice(operators)).first()
+                    lat, lng = 23 + rng.random() / 10, 72.5 + rng.random() / 10
+                    if mode == 'queued':
+                        location_writes.submit(
+                            ChargingVan, van.van_id,
+                            vanoperator_latitude=round(lat, 6), vanoperator_longitude=round(lng, 6),
+                        )
+                    else:
+                        van.vanoperator_latitude, van.vanoperator_longitude = round(lat, 6), round(lng, 6)
+                        van.save(update_fields=['vanoperator_latitude', 'vanoperator_longitude'])
+                else:
+                    source = rng.choice(requests)
+                    Request.objects.create(
+                        operator_id=rng.choice(operators), amount=500,
+                        user_latitude=23.02, user_longitude=72.57, **source,
+                    )
+                ok += 1
+            except OperationalError:
+                locked += 1
+    finally:
+        connection.close()
+    counts.append((ok, locked))
+
+
+def child(mode, threads, seconds, path):
+    setup_django(DATABASES={'default': database(mode, path)}, LOCATION_WRITE_QUEUE=mode == 'queued')
+    if mode == 'prepare':
+        prepare(path)
+        return {}
+
+    from api.writequeue import location_writes
+
+    counts = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    pool = [
+        threading.Thread(target=worker, args=(mode, deadline, i, counts))
+        for i in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    location_writes.flush()  # queued pings only count once they're on disk
+    elapsed = time.perf_counter() - start
+
+    ok = sum(c[0] for c in counts)
+    return {
+        'mode': mode,
+        'threads': threads,
+        'operations': ok,
+        'lock_errors': sum(c[1] for c in counts),
+        'ops_per_second': round(ok / elapsed, 1),
+        'rows_written_by_queue': location_writes.written,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,4,16')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--output')
+    parser.add_argument('--child', nargs=4, metavar=('MODE', 'THREADS', 'SECONDS', 'PATH'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, threads, seconds, path = args.child
+        print(json.dumps(child(mode, int(threads), float(seconds), path)))
+        return 0
+
+    workdir = Path(tempfile.mkdtemp(prefix='chargenow-sqlite-bench-'))
+    template = workdir / 'template.sqlite3'
+
+    def spawn(mode, threads, path):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--child', mode, str(threads), str(args.seconds), str(path)],
+            text=True,
+        )
+        return json.loads(output.strip().splitlines()[-1])
+
+    try:
+        spawn('prepare', 0, template)
+        runs = []
+        for threads in [int(t) for t in args.threads.split(',')]:
+            for mode in args.modes.split(','):
+                path = workdir / f'{mode}-{threads}.sqlite3'
+                shutil.copy(template, path)
+                run = spawn(mode, threads, path)
+                runs.append(run)
+                print(f"{mode:7} {threads:3} threads  {run['ops_per_second']:9.1f} ops/s  "
+                      f"{run['lock_errors']:5} lock errors")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'benchmark': 'sqlite_concurrency',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seconds': args.seconds,
+        'runs': runs,
+    }
+    print(f"saved {save_results(result, args.output, name='sqlite-concurrency')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Time test-database creation: migrating from scratch vs restoring a snapshot.
+
+    python benchmarks/test_db_setup.py --repeat 5
+
+"migrate" is what ``manage.py test`` did before api/test_runner.py: replay
+every migration into a fresh in-memory database. "snapshot" restores the
+cached template that the SnapshotTestRunner saves after its first run.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from common import setup_django, git_revision, save_results, summarize_ms
+
+
+def time_setup(runner_class, repeat):
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    samples = []
+    for _ in range(repeat):
+        runner = runner_class(verbosity=0, interactive=False)
+        setup_test_environment(debug=False)
+        start = time.perf_counter()
+        old_config = runner.setup_databases()
+        samples.append(time.perf_counter() - start)
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup_django(TEST_DB_SNAPSHOT_DIR=tempfile.mkdtemp(prefix='chargenow-snapshots-'))
+
+    from django.db.migrations.loader import MigrationLoader
+    from api.test_runner import SnapshotTestRunner
+
+    os.environ['TEST_DB_SNAPSHOTS'] = '0'
+    migrate = time_setup(SnapshotTestRunner, args.repeat)
+    os.environ['TEST_DB_SNAPSHOTS'] = '1'
+    time_setup(SnapshotTestRunner, 1)  # records the snapshot
+    snapshot = time_setup(SnapshotTestRunner, args.repeat)
+
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    result = {
+        'benchmark': 'test_db_setup',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'api_migrations_applied': sum(1 for app, _ in loader.graph.nodes if app == 'api'),
+        'migrate': summarize_ms(migrate),
+        'snapshot': summarize_ms(snapshot),
+    }
+    for name in ('migrate', 'snapshot'):
+        row = result[name]
+        print(f"{name:10} p50 {row['p50_ms']:9.1f} ms   p95 {row['p95_ms']:9.1f} ms")
+    print(f"saved {save_results(result, args.output, name='test-db-setup')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+WSGI vs ASGI under many concurrent slow clients.
+
+    python benchmarks/wsgi_vs_asgi.py --clients 50,500,2000 --duration 10 --slow-ms 200
+
+Both servers run one worker process on the same machine against the same
+throwaway database (``generate_data``), with DEBUG off:
+
+- wsgi: gunicorn, gthread worker with ``--threads`` threads (chargenow/wsgi.py)
+- asgi: uvicorn (chargenow/asgi.py, so the async views are used)
+
+Each simulated client loops for ``--duration`` seconds. Every request
+sends its headers in two parts, ``--slow-ms`` apart, the way a phone on a
+poor network does. It then reads the whole response. The mix is profile,
+operator tracking and paged booking history. The numbers reported are
+completed requests per second, latency percentiles, and errors (resets,
+refused connections, timeouts, 5xx).
+
+One extra run per server repeats the first level while ``--streams``
+clients also hold GET /api/notifications/stream/ open. Under WSGI each
+stream occupies a worker thread.
+
+Needs ``pip install gunicorn uvicorn``; neither is a dependency of the app.
+The load generator shares the machine with the server, so compare the two
+servers with each other rather than reading the numbers as absolute.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import ROOT, setup_django, git_revision, save_results, summarize_ms
+
+
+SETTINGS = """\
+from chargenow.settings import *  # noqa
+DEBUG = False
+PERF_METRICS_SAMPLE_RATE = 0
+"""
+
+
+def prepare(path, scale):
+    """Build the database; returns the tokens and ids the clients use."""
+    setup_django(DATABASES={'default': _database(path)}, LOCATION_WRITE_QUEUE=False)
+    from django.core.management import call_command
+    from api.authentication import generate_token
+    from api.models import User, VanOperator
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_data', scale=scale, skip_derived=True, verbosity=0)
+    users = [
+        generate_token(u['user_id'], u['user_email'], 1, u['user_name'])
+        for u in User.objects.values('user_id', 'user_email', 'user_name')[:500]
+    ]
+    operators = list(VanOperator.objects.values_list('operator_id', flat=True)[:200])
+    return {'users': users, 'operators': operators}
+
+
+def _database(path):
+    from django.conf import settings
+
+    return {**settings.DATABASES['default'], 'NAME': str(path)}
+
+
+# ========== SERVERS ==========
+
+def server_command(kind, port, threads):
+    if kind == 'wsgi':
+        return [
+            'gunicorn', 'chargenow.wsgi:application', '--worker-class', 'gthread',
+            '--workers', '1', '--threads', str(threads), '--bind', f'127.0.0.1:{port}',
+            '--backlog', '4096', '--log-level', 'warning', '--graceful-timeout', '2',
+        ]
+    return [
+        'uvicorn', 'chargenow.asgi:application', '--workers', '1', '--host', '127.0.0.1',
+        '--port', str(port), '--backlog', '4096', '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+def start_server(kind, port, threads, env):
+    process = subprocess.Popen(
+        server_command(kind, port, threads), cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} server exited: {process.stderr.read()[-2000:]}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ========== LOAD ==========
+
+def paths_for(rng, operators):
+    choice = rng.random()
+    if choice < 0.4:
+        return '/api/user/profile/'
+    if choice < 0.7:
+        return f'/api/user/track-operator/{rng.choice(operators)}/'
+    return '/api/user/bookings/?limit=20'
+
+
+async def one_request(port, path, token, slow, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'.encode())
+        await writer.drain()
+        await asyncio.sleep(slow)
+        writer.write(f'Authorization: Bearer {token}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    status = response.split(b' ', 2)[1] if response.startswith(b'HTTP/') else b'000'
+    return status.decode()
+
+
+async def client(index, port, plan, stop_at, slow, timeout, statuses, latencies):
+    rng = random.Random(index)
+    # Spread the start so connections don't all arrive in the same instant
+    await asyncio.sleep(rng.random())
+    while time.monotonic() < stop_at:
+        start = time.monotonic()
+        try:
+            status = await one_request(port, paths_for(rng, plan['operators']),
+                                       rng.choice(plan['users']), slow, timeout)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except OSError as exc:
+            status = type(exc).__name__
+            await asyncio.sleep(0.1)
+        statuses[status] += 1
+        if status == '200':
+            latencies.append(time.monotonic() - start)
+
+
+async def stream(port, token, stop_at, opened):
+    """Hold a notification stream open until ``stop_at``."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return
+    try:
+        writer.write(f'GET /api/notifications/stream/?token={token} HTTP/1.1\r\n'
+                     f'Host: 127.0.0.1\r\n\r\n'.encode())
+        await writer.drain()
+        if await asyncio.wait_for(reader.readline(), stop_at - time.monotonic()):
+            opened.append(1)
+        while time.monotonic() < stop_at:
+            if not await asyncio.wait_for(reader.read(4096), stop_at - time.monotonic()):
+                break
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+async def load(port, plan, clients, duration, slow, timeout, streams=0):
+    statuses, latencies, opened = Counter(), [], []
+    start = time.monotonic()
+    stop_at = start + duration
+    await asyncio.gather(
+        *(stream(port, plan['users'][index % len(plan['users'])], stop_at, opened) for index in range(streams)),
+        *(client(index, port, plan, stop_at, slow, timeout, statuses, latencies) for index in range(clients)),
+    )
+    return statuses, latencies, time.monotonic() - start, len(opened)
+
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', default='50,500,2000', help='Comma-separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--slow-ms', type=float, default=200, help='Pause in the middle of each request')
+    parser.add_argument('--threads', type=int, default=32, help='gthread threads for the WSGI worker')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--scale', type=float, default=0.05)
+    parser.add_argument('--servers', default='wsgi,asgi')
+    parser.add_argument('--streams', type=int, default=200,
+                        help='Open notification streams in the extra run (0 skips it)')
+    parser.add_argument('--output')
+    parser.add_argument('--prepare', nargs=2, metavar=('PATH', 'SCALE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare:
+        print(json.dumps(prepare(args.prepare[0], float(args.prepare[1]))))
+        return 0
+
+    missing = [tool for tool in ('gunicorn', 'uvicorn') if shutil.which(tool) is None]
+    if missing:
+        print(f"Needs {' and '.join(missing)}: pip install {' '.join(missing)}")
+        return 2
+    limit = raise_file_limit()
+    levels = [int(c) for c in args.clients.split(',')]
+    if max(levels) * 2 + 100 > limit:
+        print(f'warning: open file limit {limit} is low for {max(levels)} clients')
+
+    workdir = Path(tempfile.mkdtemp(prefix='chargenow-asgi-bench-'))
+    path = workdir / 'bench.sqlite3'
+    (workdir / 'bench_settings.py').write_text(SETTINGS)
+    runs = []
+    try:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--prepare', str(path), str(args.scale)], text=True,
+        )
+        plan = json.loads(output.strip().splitlines()[-1])
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join([str(workdir), str(ROOT)]),
+            'DJANGO_SETTINGS_MODULE': 'bench_settings',
+            'DB_PATH': str(path),
+            'DB_POOL_SIZE': str(args.threads),
+            'LOCATION_WRITE_QUEUE': '0',
+            'LOG_LEVEL': 'WARNING',
+        }
+        for kind in args.servers.split(','):
+            port = free_port()
+            server = start_server(kind, port, args.threads, env)
+            try:
+                extra = [(levels[0], args.streams)] if args.streams else []
+                for clients, streams in [(level, 0) for level in levels] + extra:
+                    statuses, latencies, elapsed, opened = asyncio.run(load(
+                        port, plan, clients, args.duration, args.slow_ms / 1000, args.timeout, streams,
+                    ))
+                    ok = statuses['200']
+                    run = {
+                        'server': kind,
+                        'clients': clients,
+                        'streams': streams,
+                        'streams_opened': opened,
+                        'requests': sum(statuses.values()),
+                        'ok': ok,
+                        'errors': sum(statuses.values()) - ok,
+                        'statuses': dict(statuses),
+                        'requests_per_second': round(ok / elapsed, 1),
+                        **summarize_ms(latencies),
+                    }
+                    runs.append(run)
+                    print(f"{kind} {clients:5} clients {opened:4}/{streams:<4} streams  "
+                          f"{run['requests_per_second']:8.1f} ok/s  "
+                          f"p50 {run['p50_ms']:8.1f}ms  p99 {run['p99_ms']:8.1f}ms  "
+                          f"errors {run['errors']}  {dict(statuses)}")
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'benchmark': 'wsgi_vs_asgi',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration': args.duration,
+        'slow_ms': args.slow_ms,
+        'wsgi_threads': args.threads,
+        'cpus': os.cpu_count(),
+        'runs': runs,
+    }
+    print(f"saved {save_results(result, args.output, name='wsgi-vs-asgi')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
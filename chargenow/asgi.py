@@ -0,0 +1,26 @@
+"""
+ASGI config for ChargeNow project.
+
+Serve with any ASGI server, e.g. ``uvicorn chargenow.asgi:application``.
+The read-heavy endpoints then run as async views (see ASYNC_VIEWS), so a
+slow client waits on the event loop instead of holding a thread.
+WebSocket connections go to api/websocket.py.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chargenow.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
+
+django_application = get_asgi_application()
+
+# Needs the app registry, so imported after setup
+from api.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
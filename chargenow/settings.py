@@ -4,6 +4,8 @@ Django settings for ChargeNow project.
 
 from pathlib import Path
 import os
+import sys
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 
@@ -16,7 +18,9 @@ SECRET_KEY = os.getenv(
     "django-insecure-chargenow-dev-key-change-in-production"
 )
 
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "1") == "1"
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -36,12 +40,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.PerformanceMiddleware",
+    "api.middleware.QueryAuditMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
+    "api.middleware.IdempotencyMiddleware",
+    "api.middleware.SamplingProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -49,6 +59,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "chargenow.urls"
 WSGI_APPLICATION = "chargenow.wsgi.application"
+ASGI_APPLICATION = "chargenow.asgi.application"
+# Serve the read-heavy endpoints with async views (api/views/async_views.py).
+# chargenow/asgi.py turns this on; under WSGI the DRF views are faster.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
 
 
 #  IMPORTANT FOR CUSTOM ADMIN LOGIN
@@ -71,11 +85,99 @@ TEMPLATES = [
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        # django.db.backends.sqlite3 plus per-connection PRAGMAs (see api/backends/sqlite3/base.py)
+        "ENGINE": "api.backends.sqlite3",
+        "NAME": os.getenv("DB_PATH", BASE_DIR / "db.sqlite3"),
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "pragmas": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+                "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+                "cache_size": -16000,
+                "temp_store": "MEMORY",
+            },
+            # Connections are returned here at the end of each request (api/backends/pool.py)
+            "pool": {
+                "size": int(os.getenv("DB_POOL_SIZE", "10")),
+                "max_lifetime": int(os.getenv("DB_POOL_MAX_LIFETIME", "600")),
+                "health_checks": True,
+                "timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            },
+        },
+        # Pooled connections go back to the pool per request instead of being
+        # kept by the thread; set DB_CONN_MAX_AGE only when pooling is off
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas: DB_REPLICA_PATHS="/data/replica1.sqlite3,/data/replica2.sqlite3".
+# Replica-safe GETs read from one of them (see api/routers.py); for local
+# testing, `manage.py sync_replicas` copies default into each file.
+for _index, _path in enumerate(p for p in os.getenv("DB_REPLICA_PATHS", "").split(",") if p):
+    DATABASES[f"replica{_index + 1}"] = {
+        **DATABASES["default"],
+        "NAME": _path,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+# After a write, the client reads from default for this long
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
+# Finished history older than this moves to the archive tables (manage.py archive_history)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+# Largest ?limit= accepted by the history endpoints
+HISTORY_PAGE_MAX = 200
+
+# Booking ids are reserved from the id_sequence table this many at a time (api/sequences.py)
+BOOKING_ID_BLOCK_SIZE = int(os.getenv("BOOKING_ID_BLOCK_SIZE", "20"))
+# Stored responses for Idempotency-Key retries are kept this long (api/idempotency.py)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+# Background jobs (api/jobs.py, run by `manage.py run_worker`).
+# JOB_QUEUES caps the jobs running at once per queue across all workers (0 = no limit).
+JOB_QUEUES = {"default": 8, "maintenance": 1, "notifications": 2}
+JOB_RETRY_BACKOFF_SECONDS = 10
+JOB_RETRY_BACKOFF_MAX_SECONDS = 3600
+# Workers renew a running job's lease every third of this; one left unrenewed is requeued
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_RETENTION_DAYS = 7
+JOB_SCHEDULE = {
+    "archive-history": {"task": "archive_history", "every": 24 * 3600},
+    "prune-idempotency-keys": {"task": "prune_idempotency_keys", "every": 3600},
+    "collect-documents": {"task": "collect_documents", "every": 24 * 3600},
+}
+# Run jobs inline on commit instead of writing them to the table
+JOB_ALWAYS_EAGER = TESTING
+
+# Status notifications (api/notifications.py) are published in batches by a
+# background thread: up to NOTIFICATION_BATCH_SIZE, or what arrives within the wait.
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_BATCH_WAIT_MS = int(os.getenv("NOTIFICATION_BATCH_WAIT_MS", "200"))
+# Deliver inline on commit instead (like JOB_ALWAYS_EAGER)
+NOTIFICATION_DISPATCH_SYNC = TESTING
+# Push delivery, run on the "notifications" job queue. Empty disables push;
+# api.notifications.FilePushBackend appends to NOTIFICATION_PUSH_FILE instead.
+NOTIFICATION_PUSH_BACKEND = os.getenv("NOTIFICATION_PUSH_BACKEND", "api.notifications.LogPushBackend")
+NOTIFICATION_PUSH_FILE = os.getenv("NOTIFICATION_PUSH_FILE", str(BASE_DIR / "notifications.jsonl"))
+# Live streams (GET /api/notifications/stream/)
+NOTIFICATION_SUBSCRIBER_BUFFER = 100
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = 15
+NOTIFICATION_STREAM_RETRY_MS = 3000
+NOTIFICATION_STREAM_MAX_SECONDS = 300
+# Messages a WebSocket may have queued before group sends to it are dropped (api/channels.py)
+CHANNEL_CAPACITY = 100
+
+# Location pings go through a coalescing single-writer queue (api/writequeue.py)
+LOCATION_WRITE_QUEUE = not TESTING and os.getenv("LOCATION_WRITE_QUEUE", "1") == "1"
+
+# Test databases are restored from a migrated snapshot (see api/test_runner.py)
+TEST_RUNNER = "api.test_runner.SnapshotTestRunner"
+TEST_DB_SNAPSHOT_DIR = BASE_DIR / ".test_db_snapshots"
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,10 +208,31 @@ STATICFILES_DIRS = [
 LOGOUT_REDIRECT_URL = "/admin/login/"
 LOGIN_REDIRECT_URL = "/admin/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# collectstatic fingerprints names and writes .gz/.br copies; StaticFilesMiddleware
+# serves them (api/staticfiles.py). Seconds to cache files without a hash in the name:
+STATIC_MAX_AGE = 60
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # Tests render templates without running collectstatic first
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage" if TESTING
+        else "api.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
 
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Let the front-end server send media bytes (api/views/media_views.py):
+# "x-accel-redirect" (nginx, to MEDIA_SENDFILE_PREFIX) or "x-sendfile". Empty streams from Python.
+MEDIA_SENDFILE = os.getenv("MEDIA_SENDFILE", "")
+MEDIA_SENDFILE_PREFIX = os.getenv("MEDIA_SENDFILE_PREFIX", "/protected-media/")
+
+# Operator license uploads (api/uploads.py)
+LICENSE_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+LICENSE_PREVIEW_SIZE = 160  # thumbnail edge in pixels
+# Unused documents younger than this are left for the daily sweep (api/storage.py)
+DOCUMENT_GC_GRACE_SECONDS = 3600
 
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -127,6 +250,7 @@ REST_FRAMEWORK = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
@@ -134,6 +258,93 @@ JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
 
+# Admin search index (see api/search.py)
+SEARCH_INDEX_BACKEND = "api.search.SQLiteFTSBackend"
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # Operator profile and van lookups (api/operator_cache.py). Local memory is
+    # per process; e.g. OPERATOR_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+    # with OPERATOR_CACHE_LOCATION=redis://127.0.0.1:6379/1 shares it between processes.
+    "operators": {
+        "BACKEND": os.getenv("OPERATOR_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("OPERATOR_CACHE_LOCATION", "operators"),
+    },
+}
+OPERATOR_CACHE_ALIAS = "operators"
+OPERATOR_CACHE_SECONDS = int(os.getenv("OPERATOR_CACHE_SECONDS", "60"))
+# How long other callers wait for the one loading a missing entry
+OPERATOR_CACHE_LOCK_SECONDS = 2
+
+# Seconds the admin changelist facet counts are cached (see api/admin_filters.py)
+ADMIN_FACET_CACHE_SECONDS = 300
+
+
+# Structured logging (see api/log.py). Records are written by a background
+# thread; hot-path loggers like api.location are sampled.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOCATION_LOG_SAMPLE_RATE = float(os.getenv("LOCATION_LOG_SAMPLE_RATE", "0.01"))
+
+# Fraction of requests measured by api.middleware.PerformanceMiddleware (0 = off).
+# Histograms only need a sample; set 1.0 to measure every request.
+PERF_METRICS_SAMPLE_RATE = float(os.getenv("PERF_METRICS_SAMPLE_RATE", "0.1"))
+
+
+# Slow-query log and duplicate-query detector (see api/querylog.py). It walks
+# the stack for every new query shape, so it is only on when asked for.
+# Strict mode turns budget overruns into errors (test failures under manage.py test).
+QUERY_AUDIT_ENABLED = os.getenv("QUERY_AUDIT_ENABLED") == "1"
+QUERY_AUDIT_STRICT = TESTING or os.getenv("QUERY_AUDIT_STRICT") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+DUPLICATE_QUERY_THRESHOLD = int(os.getenv("DUPLICATE_QUERY_THRESHOLD", "5"))
+QUERY_BUDGET_PER_REQUEST = int(os.getenv("QUERY_BUDGET_PER_REQUEST", "50"))
+
+
+# On-demand sampling profiler (see api/profiling.py). Profiles run for paths
+# matching PROFILE_URL_PATTERNS (regexes, comma separated in the env) or for
+# superusers sending "X-Profile: 1"; download them from /admin/profiles/.
+PROFILE_URL_PATTERNS = [p for p in os.getenv("PROFILE_URL_PATTERNS", "").split(",") if p]
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = BASE_DIR / "profiles"
+PROFILE_MAX_FILES = 50
+
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "structured": {"()": "api.log.StructuredFormatter"},
+    },
+    "filters": {
+        "location_sample": {
+            "()": "api.log.SamplingFilter",
+            "rate": LOCATION_LOG_SAMPLE_RATE,
+        },
+        "rate_limit": {
+            "()": "api.log.RateLimitFilter",
+            "per_second": 200,
+        },
+    },
+    "handlers": {
+        "background": {
+            "class": "api.log.BackgroundQueueHandler",
+            "formatter": "structured",
+            "filters": ["rate_limit"],
+        },
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["background"],
+            "level": LOG_LEVEL,
+            "propagate": False,
+        },
+        "api.location": {
+            "filters": ["location_sample"],
+        },
+    },
+}
+
+
 JAZZMIN_SETTINGS = {
     "site_title": "ChargeNow Admin",
     "site_header": "ChargeNow Control Panel",
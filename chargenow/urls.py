@@ -4,14 +4,13 @@ URL configuration for ChargeNow project.
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from api.admin import admin_site
+from api.views.media_views import media_view
 
 urlpatterns = [
     path('admin/', admin_site.urls),
     path('api/', include('api.urls')),
+    # Uploads need a signed-in admin or the owning operator, so they are
+    # never served as plain static files
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", media_view, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
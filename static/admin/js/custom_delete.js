@@ -1,15 +1,17 @@
-$(document).on("click", ".delete-btn", function (e) {
-    e.preventDefault();
+(function ($) {
+    $(document).on("click", ".delete-btn", function (e) {
+        e.preventDefault();
 
-    if (!confirm("Delete this record?")) return;
+        if (!confirm("Delete this record?")) return;
 
-    let btn = $(this);
+        let btn = $(this);
 
-    $.post("/admin/api/delete/", {
-        model: btn.data("model"),
-        id: btn.data("id"),
-        csrfmiddlewaretoken: $("input[name=csrfmiddlewaretoken]").val()
-    }, function () {
-        btn.closest("tr").fadeOut();
+        $.post("/admin/api/delete/", {
+            model: btn.data("model"),
+            id: btn.data("id"),
+            csrfmiddlewaretoken: $("input[name=csrfmiddlewaretoken]").val()
+        }, function () {
+            btn.closest("tr").fadeOut();
+        });
     });
-});
+})(django.jQuery);